@@ -0,0 +1,108 @@
+"""
+TextDot标注解析
+所有标签的正则合并成一个预编译的正则(每个标签是一个命名分组)，每段文字只扫描一次；
+一个group下的所有TextDot都参与解析，同一个标签取第一次匹配到的值；
+结果按标签输出成列: 标签 -> (group index数组, 值数组)，没有匹配的文字直接跳过
+"""
+import re
+from typing import *
+import numpy as np
+from art_3dm_reader.rhino_reader_constant import ANNOTATION_TAGS
+
+# 值类型 -> 输出列的dtype
+_COLUMN_DTYPES = {float: np.float64, int: np.int64, bool: np.bool_}
+
+
+class AnnotationParser:
+    def __init__(self, tags: Dict[str, Tuple[str, type]] = None):
+        """
+        :param tags: 标签名 -> (正则, 值类型)，正则中第一个分组是值(没有分组时取整个匹配)，
+                     值类型为float/int时允许小数逗号(8,3 -> 8.3)；默认使用rhino_reader_constant.ANNOTATION_TAGS
+        """
+        self.tags = dict(ANNOTATION_TAGS if tags is None else tags)
+        parts = []
+        self._value_groups = {}  # 标签名 -> 值所在的分组序号
+        self._converters = {}
+        group_number = 0
+        for name, (pattern, value_type) in self.tags.items():
+            if not name.isidentifier():
+                raise Exception("标签名{}不能作为正则分组名".format(name))
+            inner_groups = re.compile(pattern).groups
+            group_number += 1
+            self._value_groups[name] = group_number + 1 if inner_groups else group_number
+            group_number += inner_groups
+            self._converters[name] = self._make_converter(value_type)
+            parts.append('(?P<{}>{})'.format(name, pattern))
+        self._regex = re.compile('|'.join(parts)) if parts else None
+
+    # 值转换函数，转换失败返回None
+    @staticmethod
+    def _make_converter(value_type: type) -> Callable[[str], Any]:
+        if value_type in (float, int):
+            def convert(text: str):
+                text = text.replace(',', '.')
+                try:
+                    return value_type(float(text)) if value_type is int else float(text)
+                except ValueError:
+                    return None
+            return convert
+
+        def convert(text: str):
+            try:
+                return value_type(text)
+            except ValueError:
+                return None
+        return convert
+
+    # 影响解析结果的配置，用于缓存键
+    @property
+    def cache_key(self) -> tuple:
+        return tuple((name, pattern, value_type.__name__) for name, (pattern, value_type) in self.tags.items())
+
+    def parse_text(self, texts: Iterable[str]) -> Dict[str, Any]:
+        """
+        解析一个group的所有文字
+        :param texts: 文字列表
+        :return: 标签名 -> 值(只包含匹配到的标签)
+        """
+        result = {}
+        if self._regex is None:
+            return result
+        for text in texts:
+            for match in self._regex.finditer(text):
+                name = match.lastgroup
+                if name in result:
+                    continue
+                value = self._converters[name](match.group(self._value_groups[name]))
+                if value is not None:
+                    result[name] = value
+        return result
+
+    def parse(self, text_info: Dict[int, Union[str, List[str]]]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        解析所有group的文字
+        :param text_info: group index -> 文字列表(或者单个文字)
+        :return: 标签名 -> (group index数组, 值数组)，两个数组一一对应
+        """
+        columns = {name: ([], []) for name in self.tags}
+        if self._regex is not None:
+            finditer = self._regex.finditer
+            value_groups, converters = self._value_groups, self._converters
+            for group_index, texts in text_info.items():
+                if isinstance(texts, str):
+                    texts = (texts,)
+                found = set()
+                for text in texts:
+                    for match in finditer(text):
+                        name = match.lastgroup
+                        if name in found:
+                            continue
+                        value = converters[name](match.group(value_groups[name]))
+                        if value is not None:
+                            found.add(name)
+                            column = columns[name]
+                            column[0].append(group_index)
+                            column[1].append(value)
+        return {name: (np.asarray(indexes, dtype=np.int64),
+                       np.asarray(values, dtype=_COLUMN_DTYPES.get(self.tags[name][1], object)))
+                for name, (indexes, values) in columns.items()}
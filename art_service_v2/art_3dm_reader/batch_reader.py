@@ -0,0 +1,145 @@
+"""
+用进程池批量读取一个文件夹里的3dm文件
+子进程负责rhino3dm解析和shapely转换，返回可以pickle的紧凑数据，主进程再组装DataTemplate
+用法: python -m art_3dm_reader.batch_reader <文件夹或3dm文件...> [--workers N] [--in-flight N] [--cache-dir 文件夹]
+                                          [--style-json]
+"""
+import argparse
+import itertools
+import os
+import pathlib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import *
+from art_3dm_reader.parse_cache import ParseCache
+from art_3dm_reader.parse_result import pack_parse_result, unpack_parse_result
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_datastructure.data_structure import DataTemplate
+
+
+@dataclass
+class BatchReadResult:
+    """
+    一个文件的读取结果，出错时template为None，error为错误信息
+    """
+    file_path: str = field(default="")
+    template: DataTemplate = field(default=None)
+    error: str = field(default=None)
+    parse_seconds: float = field(default=0.0)  # 子进程中解析+转换的时间
+
+
+# 子进程里执行: 解析+转换，返回紧凑数据；传入cache_dir时先查解析缓存
+def _parse_in_worker(file_path: str, cache_dir: str = None) -> Tuple[dict, float]:
+    start = time.perf_counter()
+    cache = ParseCache(cache_dir) if cache_dir is not None else None
+    parsed = Read3dmFile(file_path, cache=cache).parse_3dm_file()
+    packed = pack_parse_result(parsed)
+    return packed, time.perf_counter() - start
+
+
+# 找出所有的3dm文件(文件夹会递归查找)
+def collect_3dm_files(paths: Iterable[str]) -> List[str]:
+    file_paths = []
+    for each in paths:
+        path = pathlib.Path(each)
+        if path.is_dir():
+            file_paths.extend(str(item) for item in sorted(path.rglob('*.3dm')))
+        else:
+            file_paths.append(str(path))
+    return file_paths
+
+
+def read_3dm_files(file_paths: Iterable[str], max_workers: int = None, max_in_flight: int = None,
+                   cache_dir: str = None, style_json: bool = False) -> Iterator[BatchReadResult]:
+    """
+    批量读取3dm文件，按完成顺序逐个返回结果
+    :param file_paths: 3dm文件路径
+    :param max_workers: 进程数，默认为cpu核数
+    :param max_in_flight: 同时提交给进程池的文件数上限，默认为进程数的2倍
+    :param cache_dir: 解析缓存文件夹(见ParseCache)，None时不缓存
+    :param style_json: 是否为每个文件生成style.json(写到STYLE_JSON_PATH下)，默认不生成
+    :return: BatchReadResult的生成器，单个文件出错(包括子进程崩溃)不影响其他文件
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or max_workers * 2, 1)
+    pending_paths = iter(file_paths)
+    # 子进程崩溃(比如rhino3dm在损坏的文件上直接退出)时整个进程池不可用，当时正在处理的文件都会失败；
+    # 重建进程池之后把这些文件逐个单独重新提交，单独提交仍然崩溃的才是出错的文件
+    retry_paths = deque()
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    in_flight = {}  # future -> (文件路径, 是否单独提交)
+    try:
+        while True:
+            if retry_paths:
+                if not in_flight:
+                    file_path = retry_paths.popleft()
+                    in_flight[executor.submit(_parse_in_worker, file_path, cache_dir)] = (file_path, True)
+            else:
+                # 补充任务直到达到in-flight上限
+                for file_path in itertools.islice(pending_paths, max(max_in_flight - len(in_flight), 0)):
+                    try:
+                        in_flight[executor.submit(_parse_in_worker, file_path, cache_dir)] = (file_path, False)
+                    except BrokenProcessPool:  # 进程池已经坏了，这个文件还没有执行，之后单独提交
+                        retry_paths.append(file_path)
+                        break
+            if not in_flight:
+                if not retry_paths:
+                    break
+                executor.shutdown(wait=True)
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                file_path, alone = in_flight.pop(future)
+                result = BatchReadResult(file_path=file_path)
+                try:
+                    packed, result.parse_seconds = future.result()
+                    reader = Read3dmFile(file_path, style_json=style_json)
+                    result.template = reader.build_data_template(unpack_parse_result(packed))
+                except BrokenProcessPool as e:
+                    broken = True
+                    if not alone:
+                        retry_paths.append(file_path)
+                        continue
+                    result.error = f'{type(e).__name__}: {e}'
+                except Exception as e:
+                    result.error = f'{type(e).__name__}: {e}'
+                yield result
+            if broken:
+                executor.shutdown(wait=True)
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用进程池批量读取3dm文件')
+    parser.add_argument('paths', nargs='+', help='3dm文件或者包含3dm文件的文件夹')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为cpu核数')
+    parser.add_argument('--in-flight', type=int, default=None, help='同时提交的文件数上限')
+    parser.add_argument('--cache-dir', default=None, help='解析缓存文件夹，不传时不缓存')
+    parser.add_argument('--style-json', action='store_true', help='为每个文件生成style.json')
+    args = parser.parse_args()
+
+    file_paths = collect_3dm_files(args.paths)
+    start = time.perf_counter()
+    failed = 0
+    for result in read_3dm_files(file_paths, max_workers=args.workers, max_in_flight=args.in_flight,
+                                 cache_dir=args.cache_dir, style_json=args.style_json):
+        if result.error is not None:
+            failed += 1
+            print(f'[失败] {result.file_path}: {result.error}')
+        else:
+            print(f'[完成] {result.file_path}: {len(result.template.data_objects)}个物件, '
+                  f'解析{result.parse_seconds:.3f}s')
+    elapsed = time.perf_counter() - start
+    print(f'共{len(file_paths)}个文件, 失败{failed}个, 用时{elapsed:.3f}s, '
+          f'{len(file_paths) / elapsed if elapsed > 0 else 0:.2f}个文件/s')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+非直线/多段线曲线(圆弧、圆、NURBS、PolyCurve)的自适应离散
+按弦高误差(曲线到折线的最大距离)控制顶点数量:
+  - 圆弧/圆: 由半径和误差直接算出分段数，顶点用numpy按角度生成
+  - NURBS: 控制点和节点只跨一次pybind取出，之后用numpy的de Boor算法批量求值；
+           每个节点区间先等分成degree段，再把偏离弦超过误差的区间二分，直到都满足误差
+  - PolyCurve: 逐段离散后首尾相接
+离散结果按(曲线内容的摘要, 误差, 顶点上限)缓存，同一条曲线重复读取或者不同LOD请求同一个误差时不再重新采样
+"""
+import hashlib
+import math
+from collections import OrderedDict
+from typing import *
+import numpy as np
+import rhino3dm
+from art_3dm_reader.rhino_reader_constant import CURVE_TOLERANCE, MAX_CURVE_POINTS
+
+# NURBS二分的最大轮数，每轮每个区间最多分成两半
+MAX_SUBDIVISION_DEPTH = 20
+
+
+class TessellationCache:
+    """
+    离散结果的LRU缓存: (曲线摘要, 误差, 顶点上限) -> 只读的(n, 2)坐标数组
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key) -> Optional[np.ndarray]:
+        points = self._entries.get(key)
+        if points is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return points
+
+    def put(self, key, points: np.ndarray):
+        points.flags.writeable = False
+        self._entries[key] = points
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+# 进程内共用的缓存，重复读取同一批文件时命中
+DEFAULT_CACHE = TessellationCache()
+
+
+# 曲线的身份: 几何序列化内容的摘要，内容相同的曲线(即使在不同文件里)共用离散结果
+def curve_digest(curve) -> bytes:
+    return hashlib.blake2b(curve.Encode()['data'].encode('ascii'), digest_size=16).digest()
+
+
+# 圆弧分段数: 每段圆心角theta满足 r * (1 - cos(theta / 2)) <= tolerance
+def arc_segment_count(radius: float, angle: float, tolerance: float, max_points: int) -> int:
+    if radius <= tolerance:
+        return max(1, min(int(math.ceil(abs(angle) / (math.pi / 2))), max_points - 1))
+    step = 2 * math.acos(1 - tolerance / radius)
+    return max(1, min(int(math.ceil(abs(angle) / step)), max_points - 1))
+
+
+def _tessellate_arc(arc_curve, tolerance: float, max_points: int) -> np.ndarray:
+    arc = arc_curve.Arc
+    plane = arc.Plane
+    origin, x_axis, y_axis = plane.Origin, plane.XAxis, plane.YAxis
+    start, end = arc.StartAngle, arc.EndAngle
+    count = arc_segment_count(arc.Radius, end - start, tolerance, max_points)
+    angles = np.linspace(start, end, count + 1)
+    cos, sin = np.cos(angles) * arc.Radius, np.sin(angles) * arc.Radius
+    points = np.column_stack((origin.X + cos * x_axis.X + sin * y_axis.X, origin.Y + cos * x_axis.Y + sin * y_axis.Y))
+    if arc_curve.IsClosed:
+        points[-1] = points[0]
+    return points
+
+
+class _NurbsEvaluator:
+    """
+    NURBS曲线的numpy求值器，控制点用齐次坐标(x*w, y*w, w)
+    """
+
+    def __init__(self, nurbs_curve):
+        self.degree = nurbs_curve.Degree
+        control_points = nurbs_curve.Points
+        homogeneous = []
+        for i in range(len(control_points)):
+            point = control_points[i]  # rhino3dm返回的是齐次坐标
+            homogeneous.append((point.X, point.Y, point.W))
+        self.control = np.asarray(homogeneous, dtype=np.float64)
+        if not nurbs_curve.IsRational:
+            self.control[:, 2] = 1.0
+        knots = nurbs_curve.Knots
+        knots = [knots[i] for i in range(len(knots))]
+        # opennurbs的节点向量首尾各少一个，补齐成标准形式
+        self.knots = np.asarray([knots[0]] + knots + [knots[-1]], dtype=np.float64)
+        domain = nurbs_curve.Domain
+        self.domain = (domain.T0, domain.T1)
+
+    # 节点区间的分界(去重后落在定义域内的节点)
+    def span_breaks(self) -> np.ndarray:
+        start, end = self.domain
+        breaks = np.unique(self.knots[(self.knots >= start) & (self.knots <= end)])
+        if len(breaks) < 2:
+            breaks = np.array([start, end])
+        return breaks
+
+    # 批量求值，返回(n, 2)
+    def evaluate(self, parameters: np.ndarray) -> np.ndarray:
+        degree, knots, control = self.degree, self.knots, self.control
+        count = len(control)
+        spans = np.clip(np.searchsorted(knots, parameters, side='right') - 1, degree, count - 1)[:, None]
+        # de Boor: d[j] = control[span - degree + j]，每一轮把d[r:]整体更新(用的都是上一轮的值)
+        d = control[spans - degree + np.arange(degree + 1)[None, :]]  # (n, degree+1, 3)
+        t = parameters[:, None]
+        for r in range(1, degree + 1):
+            j = np.arange(r, degree + 1)[None, :]
+            left = knots[spans + j - degree]
+            denominator = knots[spans + 1 + j - r] - left
+            alpha = ((t - left) / np.where(denominator == 0, 1.0, denominator))[:, :, None]
+            d[:, r:] = (1 - alpha) * d[:, r - 1:-1] + alpha * d[:, r:]
+        result = d[:, degree]
+        return result[:, :2] / result[:, 2:3]
+
+
+# 点到线段的距离，全部是(n, 2)数组
+def _segment_distance(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    direction = ends - starts
+    length_squared = np.einsum('ij,ij->i', direction, direction)
+    offset = points - starts
+    t = np.divide(np.einsum('ij,ij->i', offset, direction), length_squared, out=np.zeros(len(points)),
+                  where=length_squared > 0)
+    nearest = starts + np.clip(t, 0, 1)[:, None] * direction
+    return np.hypot(*(points - nearest).T)
+
+
+def _tessellate_nurbs(nurbs_curve, tolerance: float, max_points: int) -> np.ndarray:
+    evaluator = _NurbsEvaluator(nurbs_curve)
+    breaks = evaluator.span_breaks()
+    # 一次曲线的每个节点区间都是直线，不需要细分
+    pieces = evaluator.degree if evaluator.degree > 1 else 1
+    parameters = np.concatenate([np.linspace(breaks[i], breaks[i + 1], pieces + 1)[:-1]
+                                 for i in range(len(breaks) - 1)] + [breaks[-1:]])
+    points = evaluator.evaluate(parameters)
+    if evaluator.degree == 1:
+        return points
+    active = np.ones(len(parameters) - 1, dtype=bool)  # 上一轮新产生的区间，满足误差的区间之后不再检查
+    for _ in range(MAX_SUBDIVISION_DEPTH):
+        checked = np.flatnonzero(active)
+        # 每个区间在1/4、1/2、3/4处检查偏差，只看中点会漏掉区间内有拐点(S形)的情况
+        starts, widths = parameters[checked], parameters[checked + 1] - parameters[checked]
+        samples = evaluator.evaluate(np.concatenate([starts + widths * 0.25, starts + widths * 0.5,
+                                                     starts + widths * 0.75])).reshape(3, -1, 2)
+        chord_starts, chord_ends = points[checked], points[checked + 1]
+        errors = np.max([_segment_distance(each, chord_starts, chord_ends) for each in samples], axis=0)
+        over = errors > tolerance
+        if not over.any():
+            break
+        budget = max_points - len(parameters)
+        if budget <= 0:
+            break
+        if over.sum() > budget:  # 超出顶点上限时只细分误差最大的那些区间
+            over = np.zeros_like(over)
+            over[np.argsort(errors)[::-1][:budget]] = True
+        split = np.zeros(len(active), dtype=bool)
+        split[checked[over]] = True
+        # 把被细分区间的中点插到区间左端点之后，细分出的两半下一轮继续检查
+        insert_at = checked[over] + 1
+        parameters = np.insert(parameters, insert_at, (starts + widths * 0.5)[over])
+        points = np.insert(points, insert_at, samples[1][over], axis=0)
+        active = np.repeat(split, np.where(split, 2, 1))
+    return points
+
+
+class CurveTessellator:
+    def __init__(self, tolerance: float = CURVE_TOLERANCE, max_points: int = MAX_CURVE_POINTS,
+                 cache: TessellationCache = DEFAULT_CACHE):
+        """
+        :param tolerance: 弦高误差(模型单位)，折线到曲线的最大距离
+        :param max_points: 每条曲线的顶点上限
+        :param cache: 离散结果的缓存，None时不缓存
+        """
+        if tolerance <= 0:
+            raise Exception("离散误差必须大于0")
+        self.tolerance = tolerance
+        self.max_points = max(int(max_points), 2)
+        self.cache = cache
+
+    # 影响离散结果的配置，用于解析缓存的键
+    @property
+    def cache_key(self) -> tuple:
+        return ('tessellation', self.tolerance, self.max_points)
+
+    def tessellate(self, curve) -> Optional[np.ndarray]:
+        """
+        把一条rhino曲线离散成折线顶点(只取x, y)
+        :param curve: rhino3dm的Curve
+        :return: (n, 2)只读数组，闭合曲线首尾点相同；无法离散时返回None
+        """
+        key = None
+        if self.cache is not None:
+            key = (curve_digest(curve), self.tolerance, self.max_points)
+            points = self.cache.get(key)
+            if points is not None:
+                return points
+        points = self._tessellate(curve)
+        if points is None or len(points) < 2:
+            return None
+        if curve.IsClosed:
+            points[-1] = points[0]
+        if key is not None:
+            self.cache.put(key, points)
+        else:
+            points.flags.writeable = False
+        return points
+
+    def _tessellate(self, curve) -> Optional[np.ndarray]:
+        if isinstance(curve, rhino3dm.ArcCurve):
+            return _tessellate_arc(curve, self.tolerance, self.max_points)
+        if isinstance(curve, rhino3dm.PolyCurve):
+            return self._tessellate_poly_curve(curve)
+        if curve.IsLinear():
+            start, end = curve.PointAtStart, curve.PointAtEnd
+            return np.array([(start.X, start.Y), (end.X, end.Y)], dtype=np.float64)
+        if curve.IsPolyline():
+            polyline = curve.ToPolyline()
+            return np.array([(polyline[i].X, polyline[i].Y) for i in range(polyline.Count)], dtype=np.float64)
+        nurbs_curve = curve if isinstance(curve, rhino3dm.NurbsCurve) else curve.ToNurbsCurve()
+        if nurbs_curve is None:
+            return None
+        return _tessellate_nurbs(nurbs_curve, self.tolerance, self.max_points)
+
+    # PolyCurve逐段离散，相邻段共用连接点
+    def _tessellate_poly_curve(self, poly_curve) -> Optional[np.ndarray]:
+        parts = []
+        for i in range(poly_curve.SegmentCount):
+            points = self._tessellate(poly_curve.SegmentCurve(i))
+            if points is None:
+                return None
+            parts.append(points if not parts else points[1:])
+        if not parts:
+            return None
+        return np.concatenate(parts)
@@ -1,11 +1,34 @@
 """
 for reading or writing data to json or from json
 """
+import base64
+import itertools
+import logging
 import pathlib
 import json
+from uuid import UUID
 from typing import *
+import numpy as np
+import shapely
+from shapely.geometry import shape
 from art_3dm_reader.rhino_reader_constant import STYLE_JSON_PATH
 from art_3dm_reader.data_to_json.style_json_template import OBJ_STYLE_TEMPLATE
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+from art_datastructure.element_store import ElementStore
+from art_datastructure.hierarchy import Hierarchy
+
+try:  # 安装了orjson时用它编码/解码，快很多
+    import orjson
+except ImportError:
+    orjson = None
+
+# 整个DataTemplate导出格式的版本
+TEMPLATE_JSON_VERSION = 1
+# 每批转换的几何数量，导出时内存只和这个值有关
+EXPORT_CHUNK_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
 
 def input_json(file_path: str) -> Dict:  # 读取json文件
     """
@@ -21,7 +44,7 @@ def input_json(file_path: str) -> Dict:  # 读取json文件
 def output_json(data, file_path: str):  # write your data to json file
     with open(file_path, 'w') as f:
         json.dump(data,f)
-        print('->>>>>>>>>>>json文件写入完毕')
+    logger.debug('json文件写入完毕: %s', file_path)
 
 
 class JsonFileProcessor:
@@ -34,7 +57,7 @@ class JsonFileProcessor:
         style_json_name = file_name.split('.')[0]+'.json'
         path = pathlib.Path(f'{STYLE_JSON_PATH}/{style_json_name}')
         if path.is_file():   # 如果已经存在该文件跳过
-            print(f'指定路径中已经存在{style_json_name}!')
+            logger.debug('指定路径中已经存在%s', style_json_name)
         else:      # 这个地方开始创建所有的对象)
             all_layers = set([each['layer'] for each in data])
             style_dict = {}
@@ -43,3 +66,177 @@ class JsonFileProcessor:
             output_json(data=style_dict, file_path=f'{STYLE_JSON_PATH}/{style_json_name}')
 
 
+# 编码成紧凑的json字节串
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 一个物件的属性(不含元素)
+def _object_record(one_object: DataObject, parent, sibling: int = None) -> dict:
+    return {'index': one_object.index, 'id': str(one_object.id), 'name': one_object.name, 'parent': parent,
+            'sibling': sibling, 'floor': one_object.floor, 'height': one_object.height,
+            'annotations': one_object.annotations, 'zorder': one_object.zorder, 'attributes': one_object.attributes}
+
+
+# 按data_objects的顺序列出物件和它在树中的父节点id、在兄弟节点中的序号，不在树中的物件父节点为None
+def _iter_object_records(template: DataTemplate) -> Iterator[dict]:
+    tree = template.tree
+    sibling_ranks = tree.sibling_ranks() if tree is not None else {}
+    for one_object in template.data_objects or []:
+        parent = sibling = None
+        if tree is not None and tree.contains(one_object.index):
+            parent = tree.parent(one_object.index).identifier
+            sibling = sibling_ranks.get(one_object.index)
+        yield _object_record(one_object, parent, sibling)
+
+
+# 把一批元素编码成feature行
+def _encode_features(chunk: List[tuple], geometry_format: str) -> List[bytes]:
+    geometries = np.empty(len(chunk), dtype=object)
+    geometries[:] = [element.geometry for element, _ in chunk]
+    if geometry_format == 'wkb':
+        encoded = [b'null' if each is None else b'{"wkb":"' + base64.b64encode(each) + b'"}'
+                   for each in shapely.to_wkb(geometries)]
+    else:
+        encoded = [b'null' if each is None else each.encode('utf-8') for each in shapely.to_geojson(geometries)]
+    lines = []
+    for (element, owner), geometry in zip(chunk, encoded):
+        properties = {'id': str(element.id), 'layer': element.type, 'object': owner.index,
+                      'group_list': list(element.group_list) if element.group_list is not None else None}
+        lines.append(b'{"type":"Feature","geometry":' + geometry + b',"properties":' + _dumps(properties) + b'}')
+    return lines
+
+
+def export_template_json(template: DataTemplate, file_path: str, geometry_format: str = 'coordinates',
+                         chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    把整个DataTemplate流式写成GeoJSON FeatureCollection，给前端使用
+    物件和层级关系写在"objects"里，每个元素是"features"里的一个Feature；
+    每个物件/Feature单独一行，元素按chunk_size分批编码，内存占用和元素总数无关
+    :param template: DataTemplate
+    :param file_path: 输出文件
+    :param geometry_format: 'coordinates'写GeoJSON坐标数组，'wkb'写base64编码的WKB(更小，解析更快)
+    :param chunk_size: 每批编码的元素数量
+    :return:
+    """
+    if geometry_format not in ('coordinates', 'wkb'):
+        raise Exception("geometry_format只能是'coordinates'或者'wkb'")
+    tree = template.tree
+    header = {'version': TEMPLATE_JSON_VERSION, 'geometry_format': geometry_format,
+              'root': tree.root if tree is not None else None,
+              'root_tag': tree[tree.root].tag if tree is not None and tree.root is not None else None}
+    with open(file_path, 'wb') as f:
+        f.write(b'{"type":"FeatureCollection","art_template":' + _dumps(header) + b',\n"objects":[\n')
+        separator = b''
+        for record in _iter_object_records(template):
+            f.write(separator + _dumps(record) + b'\n')
+            separator = b','
+        f.write(b'],"features":[\n')
+        separator = b''
+        pairs = ((element, one_object) for one_object in template.data_objects or [] for element in one_object.elements)
+        while True:
+            chunk = list(itertools.islice(pairs, chunk_size))
+            if not chunk:
+                break
+            for line in _encode_features(chunk, geometry_format):
+                f.write(separator + line + b'\n')
+                separator = b','
+        f.write(b']}\n')
+
+
+# 逐行读出export_template_json写的文件 -> (段名, 内容)，段名是'header'/'objects'/'features'
+def _iter_template_json(file_path: str) -> Iterator[Tuple[str, Any]]:
+    section = None
+    with open(file_path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if section is None:
+                if not line.startswith(b'{"type":"FeatureCollection","art_template":'):
+                    raise Exception("{}不是export_template_json导出的文件".format(file_path))
+                yield 'header', _loads(line[len(b'{"type":"FeatureCollection","art_template":'):-1])
+                section = 'header'
+            elif line == b'"objects":[':
+                section = 'objects'
+            elif line == b'],"features":[':
+                section = 'features'
+            elif line == b']}' or not line:
+                continue
+            else:
+                yield section, _loads(line.lstrip(b','))
+
+
+def load_template_json(file_path: str, columnar: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> DataTemplate:
+    """
+    逐行读取export_template_json导出的文件，重建DataTemplate
+    :param file_path: 文件路径
+    :param columnar: 元素是否存进ElementStore
+    :param chunk_size: 每批创建的几何数量
+    :return: DataTemplate
+    """
+    header, tree, data_objects, parents, siblings = None, Hierarchy(), {}, {}, {}
+    element_store = ElementStore() if columnar else None
+    chunk = []
+
+    # 一批feature一起创建几何，再放进所属物件
+    def flush():
+        if header['geometry_format'] == 'wkb':
+            wkb = [base64.b64decode(each['geometry']['wkb']) if each['geometry'] is not None else None
+                   for each in chunk]
+            geometries = shapely.from_wkb(np.array(wkb, dtype=object)).tolist()
+        else:
+            geometries = [shape(each['geometry']) if each['geometry'] is not None else None for each in chunk]
+        properties = [each['properties'] for each in chunk]
+        group_lists = [tuple(each['group_list']) if each['group_list'] is not None else None for each in properties]
+        ids = [UUID(each['id']) for each in properties]
+        if element_store is not None:
+            elements = element_store.extend(geometries, [each['layer'] for each in properties], group_lists, ids)
+        else:
+            elements = [DataElement(geometry=geometry, id=element_id, type=each['layer'], group_list=group_list)
+                        for geometry, element_id, each, group_list in zip(geometries, ids, properties, group_lists)]
+        for element, each in zip(elements, properties):
+            data_objects[each['object']].elements.append(element)
+        chunk.clear()
+
+    for section, item in _iter_template_json(file_path):
+        if section == 'header':
+            header = item
+            if header['version'] != TEMPLATE_JSON_VERSION:
+                raise Exception("不支持的文件版本{}".format(header['version']))
+            if header['root'] is not None:
+                tree.create_node(header['root_tag'], header['root'])
+        elif section == 'objects':
+            one_object = DataObject(id=UUID(item['id']), index=item['index'], name=item['name'], global_tree=tree,
+                                    floor=item['floor'], height=item['height'], annotations=item['annotations'],
+                                    zorder=item['zorder'], attributes=item.get('attributes') or {})
+            data_objects[one_object.index] = one_object
+            if item['parent'] is not None:
+                parents[one_object.index] = item['parent']
+                siblings[one_object.index] = item.get('sibling') or 0
+        else:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                flush()
+    if chunk:
+        flush()
+
+    # 物件读完后从根节点往下建树，父节点一定先于子节点创建，子节点按写出时的顺序(旧文件没有序号时按物件顺序)
+    children = {}
+    for index, parent in parents.items():
+        children.setdefault(parent, []).append(index)
+    for each in children.values():
+        each.sort(key=siblings.get)
+    stack = [header['root']] if header['root'] is not None else []
+    while stack:
+        parent = stack.pop()
+        for index in children.get(parent, []):
+            tree.create_node(index, index, parent=parent, data=data_objects[index])
+            stack.append(index)
+    return DataTemplate(tree=tree, data_objects=list(data_objects.values()), element_store=element_store)
@@ -0,0 +1,101 @@
+"""
+批量把rhino曲线转换成shapely几何
+扫描时只把顶点坐标追加到一个扁平的坐标缓冲区里(加上offset数组)，
+最后一次性调用shapely.linestrings / shapely.polygons在C层创建全部几何
+圆弧、NURBS等其他曲线由CurveTessellator按误差离散成顶点后同样放进缓冲区
+"""
+from itertools import chain
+from operator import attrgetter
+from typing import List
+import numpy as np
+import shapely
+from art_3dm_reader.curve_tessellation import CurveTessellator
+
+_point_xy = attrgetter('X', 'Y')
+
+
+class CurveBatchConverter:
+    def __init__(self, tessellator: CurveTessellator = None):
+        """
+        :param tessellator: 其他曲线的离散器，None时只转换直线和多段线
+        """
+        self.tessellator = tessellator
+        self.coords = []  # 扁平坐标缓冲区 x0, y0, x1, y1, ...
+        self.offsets = [0]  # 第i条曲线的顶点是 coords[offsets[i]:offsets[i+1]] (以点为单位)
+        self.closed = []  # 第i条曲线是否转换成polygon
+        self.slots = []  # 第i条曲线在输出数组中的位置
+
+    def __len__(self):
+        return len(self.slots)
+
+    # 把一条rhino曲线的顶点放进缓冲区，无法转换的曲线返回False
+    def add_curve(self, rhino_geometry, slot: int) -> bool:
+        coords = self.coords
+        # 两个点的直线->直线
+        if rhino_geometry.IsLinear():
+            start_point = rhino_geometry.PointAtStart
+            end_point = rhino_geometry.PointAtEnd
+            coords.extend((start_point.X, start_point.Y, end_point.X, end_point.Y))
+            is_closed = False
+        # 多段线: 闭合->polygon, 不闭合->多段线
+        elif rhino_geometry.IsPolyline():
+            # 按下标取点比迭代Polyline少一次pybind异常开销
+            polyline = rhino_geometry.ToPolyline()
+            points = map(polyline.__getitem__, range(polyline.Count))
+            coords.extend(chain.from_iterable(map(_point_xy, points)))
+            is_closed = bool(rhino_geometry.IsClosed)
+        # 圆弧、圆、NURBS等按误差离散
+        elif self.tessellator is not None:
+            points = self.tessellator.tessellate(rhino_geometry)
+            if points is None:
+                return False
+            coords.extend(points.ravel().tolist())
+            is_closed = bool(rhino_geometry.IsClosed) and len(points) >= 4
+        else:
+            return False
+        self.offsets.append(len(coords) // 2)
+        self.closed.append(is_closed)
+        self.slots.append(slot)
+        return True
+
+    def build(self, size: int) -> np.ndarray:
+        """
+        一次性创建所有几何
+        :param size: 输出数组的长度，没有放进缓冲区的位置为None
+        :return: 长度为size的shapely几何数组
+        """
+        out = np.full(size, None, dtype=object)
+        if len(self.slots) == 0:
+            return out
+        coords = np.asarray(self.coords, dtype=np.float64).reshape(-1, 2)
+        offsets = np.asarray(self.offsets, dtype=np.int64)
+        counts = np.diff(offsets)
+        closed = np.asarray(self.closed, dtype=bool)
+        slots = np.asarray(self.slots, dtype=np.int64)
+        # 每个顶点属于哪一条曲线
+        curve_of_point = np.repeat(np.arange(len(slots)), counts)
+        closed_point_mask = closed[curve_of_point]
+
+        # 不闭合的曲线 -> LineString
+        open_point_mask = ~closed_point_mask
+        if open_point_mask.any():
+            shapely.linestrings(coords[open_point_mask], indices=slots[curve_of_point[open_point_mask]], out=out)
+        # 闭合的曲线 -> LinearRing -> Polygon
+        if closed.any():
+            ring_of_point = np.cumsum(closed)[curve_of_point[closed_point_mask]] - 1
+            rings = shapely.linearrings(coords[closed_point_mask], indices=ring_of_point)
+            shapely.polygons(rings, indices=slots[closed], out=out)
+        return out
+
+    @staticmethod
+    def convert(rhino_geometries: List, tessellator: CurveTessellator = None) -> np.ndarray:
+        """
+        批量转换一组rhino曲线
+        :param rhino_geometries: rhino曲线列表
+        :param tessellator: 其他曲线的离散器，None时只转换直线和多段线
+        :return: 与输入一一对应的shapely几何数组，无法转换的为None
+        """
+        converter = CurveBatchConverter(tessellator)
+        for slot, rhino_geometry in enumerate(rhino_geometries):
+            converter.add_curve(rhino_geometry, slot)
+        return converter.build(len(rhino_geometries))
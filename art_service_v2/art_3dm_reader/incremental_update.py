@@ -0,0 +1,222 @@
+"""
+增量重新导入: 同一个3dm文件修改保存之后，和已经加载的DataTemplate比较，只把变化应用到这个DataTemplate上
+  - 元素按rhino对象的Attributes.Id匹配，比较几何(逐坐标完全相等)、图层和编组
+  - 物件按group index匹配，比较名字、标注、高度、层数、其他标签和group的Id，父节点由元素的编组重新推出
+变化通过DataTemplate的增删改接口应用: 元素索引、名字索引、空间索引(补丁)、子树聚合缓存只更新受影响的部分，
+属性索引和阴影在下次使用时重建；之前建好的其他物件和元素对象保持不变
+"""
+import time
+from dataclasses import dataclass, field
+from typing import *
+from uuid import UUID
+import numpy as np
+import shapely
+from art_3dm_reader.parse_result import object_fields
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate, group_parent_map
+
+# 增量比较的物件字段(id单独处理，update_object不能修改id)
+OBJECT_FIELDS = ('name', 'annotations', 'height', 'floor', 'attributes')
+
+
+@dataclass
+class ChangeSet:
+    """
+    一次重新导入的变化
+    """
+    added_objects: List[int] = field(default_factory=list)  # 新增物件的index
+    removed_objects: List[int] = field(default_factory=list)
+    modified_objects: List[int] = field(default_factory=list)  # 名字/标注/高度/层数/标签/group Id变化
+    moved_objects: List[int] = field(default_factory=list)  # 父节点变化(包括挂到树上或者从树上摘下)
+    added_elements: List[UUID] = field(default_factory=list)  # 新增元素的id(rhino对象的Id)
+    removed_elements: List[UUID] = field(default_factory=list)
+    modified_elements: List[UUID] = field(default_factory=list)  # 几何/图层/编组变化
+    diff_seconds: float = field(default=0.0)
+    apply_seconds: float = field(default=0.0)
+
+    def is_empty(self) -> bool:
+        return not (self.added_objects or self.removed_objects or self.modified_objects or self.moved_objects or
+                    self.added_elements or self.removed_elements or self.modified_elements)
+
+    # 各类变化的数量
+    def summary(self) -> dict:
+        return {'added_objects': len(self.added_objects), 'removed_objects': len(self.removed_objects),
+                'modified_objects': len(self.modified_objects), 'moved_objects': len(self.moved_objects),
+                'added_elements': len(self.added_elements), 'removed_elements': len(self.removed_elements),
+                'modified_elements': len(self.modified_elements), 'diff_s': self.diff_seconds,
+                'apply_s': self.apply_seconds}
+
+
+@dataclass
+class _Plan:
+    """
+    比较的中间结果，应用变化时使用
+    """
+    changes: ChangeSet = field(default=None)
+    new_rows: dict = field(default=None)  # 元素id -> 新的中间数据(只包括有编组的对象)
+    new_fields: dict = field(default=None)  # 物件index -> 新的字段
+    new_parents: dict = field(default=None)  # 物件index -> 新的父节点(按父节点在前的顺序)
+    old_parents: dict = field(default=None)  # 物件index -> 原来的父节点，不在树中为None
+
+
+# 树中每个物件的父节点，根节点下的物件父节点为"root"
+def _tree_parents(template: DataTemplate) -> dict:
+    tree = template.tree
+    parents = {}
+    if tree is None or tree.root is None:
+        return parents
+    for index in template._object_index:
+        if tree.contains(index):
+            parents[index] = tree.parent(index).identifier
+    return parents
+
+
+# 几何是否完全相同(都为None也算相同)
+def _same_geometries(old_geometries: list, new_geometries: list) -> np.ndarray:
+    old_array = np.array(old_geometries, dtype=object)
+    new_array = np.array(new_geometries, dtype=object)
+    if len(old_array) == 0:
+        return np.zeros(0, dtype=bool)
+    both_missing = shapely.is_missing(old_array) & shapely.is_missing(new_array)
+    return both_missing | shapely.equals_exact(old_array, new_array, tolerance=0)
+
+
+def _diff(template: DataTemplate, parsed: dict) -> _Plan:
+    changes = ChangeSet()
+    # ---------- 元素 ----------
+    # 没有编组的对象不会放进任何物件，读取时也不在DataTemplate中
+    new_rows = {obj['id']: obj for obj in parsed['raw_data'] if len(obj['group_index']) > 0}
+    old_elements = template._element_index
+    changes.removed_elements = [element_id for element_id in old_elements if element_id not in new_rows]
+    common, candidates = [], []
+    for element_id, obj in new_rows.items():
+        old = old_elements.get(element_id)
+        if old is None:
+            changes.added_elements.append(element_id)
+            continue
+        element = old[0]
+        if element.type != obj['layer'] or tuple(element.group_list or ()) != tuple(obj['group_index']):
+            changes.modified_elements.append(element_id)
+        else:
+            common.append(element_id)
+            candidates.append(element)
+    # 几何批量比较
+    same = _same_geometries([element.geometry for element in candidates],
+                            [new_rows[element_id]['geometry'] for element_id in common])
+    changes.modified_elements.extend(common[i] for i in np.flatnonzero(~same).tolist())
+    # ---------- 物件 ----------
+    new_fields = object_fields(parsed['groups_info'], parsed['text_info'], parsed['annotation_info'],
+                               parsed.get('group_ids'))
+    old_objects = template._object_index
+    changes.added_objects = [index for index in new_fields if index not in old_objects]
+    changes.removed_objects = [index for index in old_objects if index not in new_fields]
+    for index, values in new_fields.items():
+        one_object = old_objects.get(index)
+        if one_object is None:
+            continue
+        if any(getattr(one_object, key) != values[key] for key in OBJECT_FIELDS) or \
+                ('id' in values and one_object.id != values['id']):
+            changes.modified_objects.append(index)
+    new_parents = group_parent_map(tuple(obj['group_index']) for obj in new_rows.values())
+    old_parents = _tree_parents(template)
+    changes.moved_objects = [index for index in new_fields if index in old_objects and
+                             new_parents.get(index) != old_parents.get(index)]
+    return _Plan(changes=changes, new_rows=new_rows, new_fields=new_fields, new_parents=new_parents,
+                 old_parents=old_parents)
+
+
+# 由中间数据创建元素: 列式存储时追加到DataTemplate的ElementStore
+def _create_elements(template: DataTemplate, rows: List[dict]) -> list:
+    if template.element_store is not None:
+        return template.element_store.extend(geometries=[obj['geometry'] for obj in rows],
+                                             layers=[obj['layer'] for obj in rows],
+                                             group_lists=[obj['group_index'] for obj in rows],
+                                             ids=[obj['id'] for obj in rows])
+    elements = []
+    for obj in rows:
+        elements.append(DataElement(geometry=obj['geometry'], id=obj['id'], type=obj['layer'],
+                                    group_list=obj['group_index']))
+    return elements
+
+
+def _apply(template: DataTemplate, plan: _Plan):
+    changes = plan.changes
+    new_fields, new_parents, old_parents = plan.new_fields, plan.new_parents, plan.old_parents
+    added_objects = set(changes.added_objects)
+    removed_objects = set(changes.removed_objects)
+    # 1. 新增物件、挂到树上、移动: 按new_parents的顺序，父节点总是先处理
+    for index in changes.added_objects:
+        if index not in new_parents:
+            template.add_object(DataObject(index=index, **new_fields[index]), None)
+    for index, parent in new_parents.items():
+        if index in added_objects:
+            template.add_object(DataObject(index=index, **new_fields[index]), parent)
+        elif old_parents.get(index) is None:
+            template.attach_object(index, parent)
+        elif old_parents[index] != parent:
+            template.move_object(index, parent)
+    # 2. 不再在树中的物件从树上摘下(子树一起摘下，子树中的物件也都不在新树中或者被删除)
+    for index, parent in old_parents.items():
+        if index not in new_parents and index not in removed_objects and template.tree.contains(index):
+            template.detach_object(index)
+    # 3. 删除的物件，子树中剩下的都是同样被删除的物件
+    for index in changes.removed_objects:
+        if index in template._object_index:
+            template.delete_object(index)
+    # 4. 物件字段
+    for index in changes.modified_objects:
+        values = dict(new_fields[index])
+        group_id = values.pop('id', None)
+        template.update_object(index, **values)
+        if group_id is not None:
+            template.find_object(index).id = group_id
+    # 5. 元素: 所属物件变化的按删除再添加，其余原地修改
+    new_rows = plan.new_rows
+    moved_elements, updated_elements = [], []
+    for element_id in changes.modified_elements:
+        element, owner = template.find_element(element_id)
+        if owner is None or owner.index != new_rows[element_id]['group_index'][0]:
+            moved_elements.append(element_id)
+        else:
+            updated_elements.append(element_id)
+    template.remove_elements([element_id for element_id in changes.removed_elements + moved_elements
+                              if element_id in template._element_index])
+    for element_id in updated_elements:
+        obj = new_rows[element_id]
+        template.update_element(element_id, geometry=obj['geometry'], type=obj['layer'],
+                                group_list=obj['group_index'])
+    rows_by_owner = {}
+    for element_id in changes.added_elements + moved_elements:
+        obj = new_rows[element_id]
+        rows_by_owner.setdefault(obj['group_index'][0], []).append(obj)
+    for owner_index, rows in rows_by_owner.items():
+        template.add_elements(owner_index, _create_elements(template, rows))
+
+
+def diff_template(template: DataTemplate, parsed: dict) -> ChangeSet:
+    """
+    只比较，不修改template
+    :param template: 已经加载的DataTemplate
+    :param parsed: 修改之后的文件的Read3dmFile.parse_3dm_file结果
+    :return: 变化集合
+    """
+    start = time.perf_counter()
+    changes = _diff(template, parsed).changes
+    changes.diff_seconds = time.perf_counter() - start
+    return changes
+
+
+def update_template(template: DataTemplate, parsed: dict) -> ChangeSet:
+    """
+    比较并把变化应用到template上
+    :param template: 已经加载的DataTemplate，元素id必须是rhino对象的Id(由Read3dmFile组装)
+    :param parsed: 修改之后的文件的Read3dmFile.parse_3dm_file结果
+    :return: 变化集合
+    """
+    start = time.perf_counter()
+    plan = _diff(template, parsed)
+    plan.changes.diff_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    if not plan.changes.is_empty():
+        _apply(template, plan)
+    plan.changes.apply_seconds = time.perf_counter() - start
+    return plan.changes
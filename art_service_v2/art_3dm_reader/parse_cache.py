@@ -0,0 +1,114 @@
+"""
+3dm解析结果的磁盘缓存
+缓存键由文件内容哈希(或者mtime+size)和读取选项组成，缓存内容是parse_result打包后的紧凑数据；
+写入时先写临时文件再原子替换，多个进程同时写同一个键也不会读到半个文件；
+按最近访问时间(文件mtime)做LRU淘汰，总大小不超过max_bytes
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import *
+
+# 缓存格式版本，格式变化时修改，旧的缓存自然失效
+CACHE_FORMAT_VERSION = 3
+CACHE_SUFFIX = '.parse'
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30, key_mode: str = 'hash'):
+        """
+        :param cache_dir: 缓存文件夹
+        :param max_bytes: 缓存总大小上限
+        :param key_mode: 'hash'按文件内容哈希，'mtime'按路径+mtime+size(更快，但文件被原样复制时不能命中)
+        """
+        if key_mode not in ('hash', 'mtime'):
+            raise Exception("key_mode只能是'hash'或者'mtime'")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.key_mode = key_mode
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # 根据文件和读取选项生成缓存键，data不为None时(从内存读取)按data的内容哈希
+    def make_key(self, file_path: str, options: tuple = (), data: bytes = None) -> str:
+        digest = hashlib.sha256()
+        digest.update(repr((CACHE_FORMAT_VERSION, self.key_mode, options)).encode('utf-8'))
+        if data is not None:
+            digest.update(data)
+        elif self.key_mode == 'hash':
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(file_path)
+            digest.update(repr((os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    # 读取缓存，没有命中返回None；缓存文件损坏(写了一半、其他版本写的)也当作没有命中，并删掉这个文件
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                packed = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        # 更新访问时间，用于LRU
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return packed
+
+    # 写入缓存: 临时文件写完再原子替换
+    def put(self, key: str, packed: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(packed, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    # LRU淘汰: 按mtime从旧到新删除，直到总大小不超过上限
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:  # 被其他进程删掉了
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    # 清空缓存
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
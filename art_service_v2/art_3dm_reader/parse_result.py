@@ -0,0 +1,87 @@
+"""
+Read3dmFile.parse_3dm_file中间数据的紧凑格式
+几何存成WKB数组，图层名编码成图层表+int数组，编组信息存成扁平int数组+offset，id存成定长16字节
+打包后的数据可以直接pickle，用于进程间传输
+"""
+from uuid import UUID
+import numpy as np
+import shapely
+
+# 不需要转换、原样保留的表
+TABLE_KEYS = ('groups_info', 'group_ids', 'text_info', 'annotation_info')
+# 标注标签中直接对应DataObject字段的部分
+OBJECT_ANNOTATION_FIELDS = ('height', 'floor')
+
+
+def pack_parse_result(parsed: dict) -> dict:
+    """
+    把parse_3dm_file的结果打包成紧凑格式
+    :param parsed: {'raw_data': [...], 'groups_info': {...}, ...}
+    :return: 紧凑格式的dict
+    """
+    raw_data = parsed['raw_data']
+    layer_table = list(dict.fromkeys(obj['layer'] for obj in raw_data))
+    layer_codes = {name: code for code, name in enumerate(layer_table)}
+    group_lists = [obj['group_index'] for obj in raw_data]
+    packed = {key: parsed[key] for key in TABLE_KEYS}
+    packed['ids'] = b''.join(obj['id'].bytes for obj in raw_data)
+    packed['geometry_wkb'] = shapely.to_wkb(np.array([obj['geometry'] for obj in raw_data], dtype=object))
+    packed['layer_table'] = layer_table
+    packed['layer_codes'] = np.array([layer_codes[obj['layer']] for obj in raw_data], dtype=np.int32)
+    packed['group_flat'] = np.array([index for each in group_lists for index in each], dtype=np.int32)
+    packed['group_offsets'] = np.cumsum([0] + [len(each) for each in group_lists], dtype=np.int64)
+    return packed
+
+
+def unpack_parse_result(packed: dict) -> dict:
+    """
+    把紧凑格式还原成parse_3dm_file的结果
+    :param packed: pack_parse_result的结果
+    :return: {'raw_data': [...], 'groups_info': {...}, ...}
+    """
+    geometries = shapely.from_wkb(packed['geometry_wkb'])
+    layer_table = packed['layer_table']
+    ids = packed['ids']
+    group_flat = packed['group_flat'].tolist()
+    group_offsets = packed['group_offsets'].tolist()
+    raw_data = []
+    for i, (geometry, layer_code) in enumerate(zip(geometries.tolist(), packed['layer_codes'].tolist())):
+        group_list = tuple(group_flat[group_offsets[i]:group_offsets[i + 1]])
+        raw_data.append({'id': UUID(bytes=ids[i * 16:(i + 1) * 16]),
+                         'geometry': geometry,
+                         'layer': layer_table[layer_code],
+                         'group_index': group_list,
+                         'group_depth': len(group_list)})
+    parsed = {key: packed[key] for key in TABLE_KEYS}
+    parsed['raw_data'] = raw_data
+    return parsed
+
+
+def object_fields(groups_info: dict, text_info: dict, annotation_info: dict, group_ids: dict = None) -> dict:
+    """
+    由解析结果得到每个DataObject的字段，组装DataTemplate和增量更新共用
+    :param groups_info: group index->group名
+    :param text_info: group index->该group所有TextDot的文字
+    :param annotation_info: AnnotationParser.parse的结果
+    :param group_ids: group index->group的Id
+    :return: group index->{'name', 'annotations', 'height', 'floor', 'attributes'(, 'id')}
+    """
+    fields = {}
+    for i, name in groups_info.items():
+        values = {'name': name, 'annotations': None, 'height': 0.0, 'floor': 0, 'attributes': {}}
+        if group_ids is not None and i in group_ids:
+            values['id'] = group_ids[i]
+        if i in text_info:
+            values['annotations'] = '\n'.join(text_info[i])
+        fields[i] = values
+    # 按列写入解析出的标注: DataObject已有的字段(height/floor)直接赋值，其他标签放进attributes
+    for tag, (group_indexes, values) in annotation_info.items():
+        for group_index, value in zip(group_indexes.tolist(), values.tolist()):
+            values_of_group = fields.get(group_index)
+            if values_of_group is None:
+                continue
+            if tag in OBJECT_ANNOTATION_FIELDS:
+                values_of_group[tag] = value
+            else:
+                values_of_group['attributes'][tag] = value
+    return fields
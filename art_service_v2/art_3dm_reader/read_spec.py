@@ -0,0 +1,69 @@
+"""
+部分读取的条件: 只读取指定图层、对象类型、编组中的对象
+扫描doc.Objects时就按条件跳过对象，被过滤掉的对象不做几何转换，不创建DataElement，也不进入关系树；
+TextDot不受图层和对象类型限制(标注要挂到编组上)，最后只保留仍有对象的编组和它们的标注；
+指定编组时，为了保持树结构会保留它们的上层编组，但上层编组的TextDot不在指定编组中，不会读取。
+3dm文件本身(File3dm.Read)仍然要整体读取，按条件跳过的是之后的转换和组装
+"""
+from dataclasses import dataclass, field
+from typing import *
+from rhino3dm import ObjectType
+from art_3dm_reader.rhino_reader_constant import READABLE_OBJ
+
+
+@dataclass(frozen=True)
+class ReadSpec:
+    """
+    各条件之间是"且"的关系，某个条件为None表示不限
+    """
+    layers: Optional[FrozenSet[str]] = field(default=None)  # 图层名
+    object_types: Optional[Tuple[ObjectType, ...]] = field(default=None)  # 对象类型，None时为READABLE_OBJ
+    groups: Optional[FrozenSet[Union[int, str]]] = field(default=None)  # 编组index或者编组名，包括嵌套在其中的编组
+
+    def __post_init__(self):
+        # 允许传list/set/单个值，统一成不可变的集合，便于做缓存键
+        for name in ('layers', 'groups'):
+            value = getattr(self, name)
+            if value is not None:
+                object.__setattr__(self, name, frozenset([value] if isinstance(value, (str, int)) else value))
+        if self.object_types is not None:
+            types = [self.object_types] if isinstance(self.object_types, ObjectType) else self.object_types
+            object.__setattr__(self, 'object_types', tuple(sorted(set(types), key=lambda each: each.value)))
+
+    # 是否会过滤掉对象(只限制对象类型时不需要裁剪编组)
+    @property
+    def is_partial(self) -> bool:
+        return self.layers is not None or self.groups is not None
+
+    # 扫描时读取的对象类型
+    def readable_types(self) -> FrozenSet[ObjectType]:
+        return frozenset(READABLE_OBJ if self.object_types is None else self.object_types)
+
+    # 影响解析结果的配置，用于解析缓存的键
+    @property
+    def cache_key(self) -> tuple:
+        return (tuple(each.name for each in sorted(self.readable_types(), key=lambda each: each.value)),
+                None if self.layers is None else tuple(sorted(self.layers)),
+                None if self.groups is None else tuple(sorted(self.groups, key=repr)))
+
+    def layer_indexes(self, layers_info: dict) -> Optional[FrozenSet[int]]:
+        """
+        把图层名换成图层index，扫描时只比较整数
+        :param layers_info: 图层index->图层名
+        :return: 图层index集合，不限图层时为None
+        """
+        if self.layers is None:
+            return None
+        return frozenset(index for index, name in layers_info.items() if name in self.layers)
+
+    def group_indexes(self, groups_info: dict) -> Optional[FrozenSet[int]]:
+        """
+        把编组名换成编组index
+        :param groups_info: 编组index->编组名
+        :return: 编组index集合，不限编组时为None
+        """
+        if self.groups is None:
+            return None
+        names = {each for each in self.groups if isinstance(each, str)}
+        return frozenset([each for each in self.groups if isinstance(each, int)] +
+                         [index for index, name in groups_info.items() if name in names])
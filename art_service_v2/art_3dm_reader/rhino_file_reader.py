@@ -2,20 +2,77 @@
 读取rhino的3dm文件
 并封装成对应data structure
 """
+from contextlib import nullcontext
 from dataclasses import dataclass, field
-from typing import Tuple, List, Any
-import re
+from typing import Tuple, List, Any, Iterator, Optional, FrozenSet, Union, BinaryIO
 import rhino3dm
-from rhino3dm._rhino3dm import File3dm, TextDot
+from rhino3dm._rhino3dm import File3dm, ObjectType
 from shapely.geometry import Polygon, LineString, Point
-from art_3dm_reader.rhino_reader_constant import HEIGHT_PATTERN, FLOOR_PATTERN, READ_OPTION, READABLE_OBJ
+from art_3dm_reader.annotation_parser import AnnotationParser
+from art_3dm_reader.curve_tessellation import CurveTessellator
+from art_3dm_reader.geometry_converter import CurveBatchConverter
+from art_3dm_reader.incremental_update import ChangeSet, update_template
+from art_3dm_reader.parse_cache import ParseCache
+from art_3dm_reader.parse_result import object_fields, pack_parse_result, unpack_parse_result
+from art_3dm_reader.read_spec import ReadSpec
+from art_3dm_reader.rhino_reader_constant import READ_OPTION
 from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+from art_datastructure.element_store import ElementStore
+from art_datastructure.metrics import MetricsCollector, StageMetric
 from art_3dm_reader.data_to_json.data_json_exchange import JsonFileProcessor
 
 
+# 不统计时共用的空上下文
+_NO_STAGE = nullcontext(StageMetric(name=''))
+
+
 class Read3dmFile():
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, batch_convert: bool = True, read_option: int = None, columnar: bool = False,
+                 cache: ParseCache = None, metrics: MetricsCollector = None,
+                 annotation_parser: AnnotationParser = None, tessellator: CurveTessellator = None,
+                 read_spec: ReadSpec = None, data: bytes = None, style_json: bool = True):
+        # data不为None时file_path只作为名字(style.json的文件名)，不读取磁盘
         self.file_path = file_path
+        # 内存中的3dm文件内容，见from_bytes
+        self.data = data
+        # 批量模式: 曲线顶点先放进坐标缓冲区，扫描结束后一次性创建shapely几何
+        self.batch_convert = batch_convert
+        # 读取模式，不传时使用rhino_reader_constant.READ_OPTION
+        self.read_option = read_option
+        # 列式存储: DataElement存进ElementStore，每个元素只是一个轻量视图
+        self.columnar = columnar
+        # 解析结果的磁盘缓存，命中时不再调用rhino3dm
+        self.cache = cache
+        # 各阶段的耗时/数量/内存统计，组装出的DataTemplate也使用它，None时不统计
+        self.metrics = metrics
+        # TextDot标注解析，不传时使用rhino_reader_constant.ANNOTATION_TAGS
+        self.annotation_parser = annotation_parser if annotation_parser is not None else AnnotationParser()
+        # 圆弧、NURBS等曲线的离散，不传时使用rhino_reader_constant.CURVE_TOLERANCE
+        self.tessellator = tessellator if tessellator is not None else CurveTessellator()
+        # 部分读取的条件(图层/对象类型/编组)，不传时读取所有READABLE_OBJ对象
+        self.read_spec = read_spec if read_spec is not None else ReadSpec()
+        # 组装DataTemplate时是否在STYLE_JSON_PATH下生成该文件的style.json
+        self.style_json = style_json
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview, BinaryIO], file_name: str = 'memory.3dm',
+                   **kwargs) -> 'Read3dmFile':
+        """
+        从内存读取3dm文件(比如上传请求的body)，不需要先写临时文件
+        :param data: 3dm文件内容，或者有read()的文件对象
+        :param file_name: 文件名，用于style.json的名字
+        :param kwargs: 其他参数同__init__
+        :return: Read3dmFile
+        """
+        if hasattr(data, 'read'):
+            data = data.read()
+        return cls(file_name, data=bytes(data), **kwargs)
+
+    # 统计一个阶段，不统计时返回一个空的上下文
+    def _stage(self, name: str, count: int = None):
+        if self.metrics is None:
+            return _NO_STAGE
+        return self.metrics.stage(name, count)
 
     # 导出该3dm文件中所有的group的index以及其名字，并返回
     def __export_file_groups(self, doc: File3dm) -> dict:
@@ -24,6 +81,10 @@ class Read3dmFile():
         groups_info = dict(map(lambda index, name: (index, name), group_index, group_name))
         return groups_info
 
+    # 导出所有group的Id，增量更新时用来判断同一个index上的group是否被替换
+    def __export_file_group_ids(self, doc: File3dm) -> dict:
+        return {each.Index: each.Id for each in doc.Groups}
+
     # 导出该3dm文件中所有layer的名字以及其index,并返回
     def __export_file_layers(self, doc: File3dm) -> dict:
         layer_index = [each.Index for each in doc.Layers]
@@ -31,38 +92,16 @@ class Read3dmFile():
         layer_info = dict(map(lambda index, name: (index, name), layer_index, layer_name))
         return layer_info
 
-    # 导出该3dm文件中所有文字(文字对应的group上)
-    def __export_file_text(self, doc: File3dm) -> dict:
-        text_info = {}
-        rhino_objects = doc.Objects
-        for obj in rhino_objects:
-            group_depth = obj.Attributes.GroupCount
-            group_indexes = obj.Attributes.GetGroupList()
-            geometry = obj.Geometry
-            if isinstance(geometry, TextDot) and group_depth > 0:
-                text_info[int(group_indexes[0])] = geometry.Text.replace(" ", "")
-        return text_info
-
-    # 处理文本中跟高度相关的信息
-    def __text_processor(self, text_info: dict, pattern: str) -> dict:
-        text_res = {}
-        for index, text in text_info.items():
-            pattern = re.compile(pattern)
-            text = pattern.findall(text)
-            num = re.findall(r'[-+]?\d*\.\d+|\d+', text[0])[0]
-            text_res[index] = float(num if num != 0 else 0)
-        return text_res
-
     # 将rhino的对象转换成shapely的几何对象
-    def __convert_rhino_obj_to_shapely_obj(self,
-                                           obj: rhino3dm._rhino3dm.ObjectType) -> None or Point or LineString or Polygon:
-        rhino_geometry = obj.Geometry
+    def __convert_rhino_obj_to_shapely_obj(self, rhino_geometry: rhino3dm._rhino3dm.GeometryBase,
+                                           object_type: ObjectType) -> None or Point or LineString or Polygon:
         # 处理 curve
-        if str(rhino_geometry.ObjectType) == 'ObjectType.Curve':
+        if object_type == ObjectType.Curve:
             # 两个点的直线->直线
             if rhino_geometry.IsLinear():
-                shapely_geometry = LineString([(rhino_geometry.Line.PointAt(0).X, rhino_geometry.Line.PointAt(0).Y),
-                                               (rhino_geometry.Line.PointAt(1).X, rhino_geometry.Line.PointAt(1).Y)])
+                start_point = rhino_geometry.PointAtStart
+                end_point = rhino_geometry.PointAtEnd
+                shapely_geometry = LineString([(start_point.X, start_point.Y), (end_point.X, end_point.Y)])
                 return shapely_geometry
             # 闭合曲线->polygon
             elif rhino_geometry.IsPolyline() and rhino_geometry.IsClosed:
@@ -74,21 +113,28 @@ class Read3dmFile():
                 polyline_points = [l for l in rhino_geometry.ToPolyline()]
                 shapely_geometry = LineString([(point.X, point.Y) for point in polyline_points])
                 return shapely_geometry
+            # 圆弧、圆、NURBS等按误差离散: 闭合->polygon, 不闭合->多段线
             else:
-                return None
+                points = self.tessellator.tessellate(rhino_geometry)
+                if points is None:
+                    return None
+                if rhino_geometry.IsClosed and len(points) >= 4:
+                    return Polygon(points)
+                return LineString(points)
         # 处理点
-        elif str(rhino_geometry.ObjectType) == 'ObjectType.Point3d':
-            shapely_geometry = Point((rhino_geometry.X, rhino_geometry.Y))
+        elif object_type == ObjectType.Point:
+            point = rhino_geometry.Location
+            shapely_geometry = Point((point.X, point.Y))
             return shapely_geometry
 
         # 把TextDot转换成点，渲染的时候把文字渲染到对应的位置上
-        elif str(rhino_geometry.ObjectType) == 'ObjectType.TextDot':
+        elif object_type == ObjectType.TextDot:
             shapely_geometry = Point(
                 (rhino_geometry.GetBoundingBox().Center.X, rhino_geometry.GetBoundingBox().Center.Y))
             return shapely_geometry
 
         # 把文字对象转换成点，渲染的时候把文字渲染到对应的位置上
-        elif str(rhino_geometry.ObjectType) == 'ObjectType.Annotation':
+        elif object_type == ObjectType.Annotation:
             # 暂时无法处理这个东西
             pass
 
@@ -97,86 +143,211 @@ class Read3dmFile():
         else:
             return None
 
-    # 读取和转换所有的rhino对象
-    def __rhino_objects_processor(self, doc: File3dm, layers_info: dict) -> list:
-        res = []
-        rhino_objects = doc.Objects
-        valid_objs = list(filter(lambda each: str(each.Geometry.ObjectType) in READABLE_OBJ, rhino_objects))
-        for obj in valid_objs:
-            # 给每个对象创建对应的字典
-            obj_structure = {}
-            # 一些属性
-            obj_id = obj.Attributes.Id
-            obj_group_depth = obj.Attributes.GroupCount
-            obj_group_index = obj.Attributes.GetGroupList()
-            obj_layer = layers_info[obj.Attributes.LayerIndex]
-            obj_geometry = self.__convert_rhino_obj_to_shapely_obj(obj)
+    # 一次遍历doc.Objects: 按ObjectType枚举分拣对象，同时收集文字标注、编组、图层和可转换的几何
+    def __iter_rhino_objects(self, doc: File3dm, layers_info: dict, text_info: dict,
+                             batch: CurveBatchConverter = None, layer_indexes: FrozenSet[int] = None,
+                             group_indexes: FrozenSet[int] = None) -> Iterator[dict]:
+        """
+        逐个产出可读取对象的中间数据，每个对象只跨一次pybind取Attributes和Geometry
+        :param doc: 3dm文档
+        :param layers_info: 图层index->图层名
+        :param text_info: 扫描过程中把文字写进这个字典(group index->该group所有TextDot的文字)
+        :param batch: 不为None时曲线只放进批量转换器，产出的geometry为None，由调用方统一创建
+        :param layer_indexes: 只读取这些图层中的对象，None时不限
+        :param group_indexes: 只读取属于这些编组(包括嵌套在其中的编组)的对象，None时不限
+        :return: 中间数据的生成器
+        """
+        readable_types = self.read_spec.readable_types()
+        count = 0
+        for obj in doc.Objects:
+            attributes = obj.Attributes
+            group_list = attributes.GetGroupList()
+            # 部分读取: 不在指定编组中的对象(包括它们的TextDot)连Geometry都不取
+            if group_indexes is not None and group_indexes.isdisjoint(group_list):
+                continue
+            geometry = obj.Geometry
+            object_type = geometry.ObjectType
+            # 文字挂在它所属的第一个group上，一个group可以有多个TextDot
+            if object_type == ObjectType.TextDot:
+                if len(group_list) > 0:
+                    text_info.setdefault(int(group_list[0]), []).append(geometry.Text.replace(" ", ""))
+            if object_type not in readable_types:
+                continue
+            # 部分读取: 不在指定图层中的对象在转换几何之前跳过(TextDot不受图层限制，上面已经收集)
+            layer_index = attributes.LayerIndex
+            if layer_indexes is not None and layer_index not in layer_indexes:
+                continue
             # 组装中间过程的数据结构
-            obj_structure['id'] = obj_id
-            obj_structure['geometry'] = obj_geometry
-            obj_structure['layer'] = obj_layer
-            obj_structure['group_index'] = obj_group_index
-            obj_structure['group_depth'] = obj_group_depth
-            res.append(obj_structure)
-        return res
+            obj_structure = {}
+            obj_structure['id'] = attributes.Id
+            if batch is not None and object_type == ObjectType.Curve:
+                batch.add_curve(geometry, count)
+                obj_structure['geometry'] = None
+            else:
+                obj_structure['geometry'] = self.__convert_rhino_obj_to_shapely_obj(geometry, object_type)
+            obj_structure['layer'] = layers_info[layer_index]
+            obj_structure['group_index'] = group_list
+            obj_structure['group_depth'] = len(group_list)
+            count += 1
+            yield obj_structure
+
+    # 单次扫描所有rhino对象，返回(raw_data, text_info)
+    def __scan_rhino_objects(self, doc: File3dm, layers_info: dict, groups_info: dict) -> Tuple[list, dict]:
+        text_info = {}
+        batch = CurveBatchConverter(self.tessellator) if self.batch_convert else None
+        with self._stage('scan') as stage:
+            raw_data = list(self.__iter_rhino_objects(doc, layers_info, text_info, batch,
+                                                      layer_indexes=self.read_spec.layer_indexes(layers_info),
+                                                      group_indexes=self.read_spec.group_indexes(groups_info)))
+            stage.count = len(raw_data)
+        # 批量创建曲线对应的shapely几何
+        if batch is not None and len(batch) > 0:
+            with self._stage('convert', len(batch)):
+                geometries = batch.build(len(raw_data))
+                for slot in batch.slots:
+                    raw_data[slot]['geometry'] = geometries[slot]
+        return raw_data, text_info
 
     # 用DataElements和DataObject封装我们的数据
-    def __data_structure_processor(self, raw_data: list, groups_info: dict, text_info: dict, height_info: dict,
-                                   floor_info: dict) -> List[DataObject]:
-        # 先组装DataElement
-        data_elements = []
-        for obj in raw_data:
-            cur_data_element = DataElement()
-            cur_data_element.geometry = obj['geometry']
-            cur_data_element.type = obj['layer']
-            cur_data_element.group_list = obj['group_index']
-            data_elements.append(cur_data_element)
-        # 先根据group的名字创建DataObject
-        data_objects = {}
-        for i in range(len(groups_info)):
-            cur_data_object = DataObject()
-            cur_data_object.index = i
-            cur_data_object.name = groups_info[i]
-            if i in floor_info.keys():
-                cur_data_object.floor = int(floor_info[i])
-            if i in height_info.keys():
-                cur_data_object.height = height_info[i]
-            if i in text_info.keys():
-                cur_data_object.annotations = text_info[i]
-            data_objects[cur_data_object.index] = cur_data_object
+    def __data_structure_processor(self, raw_data: list, groups_info: dict, text_info: dict,
+                                   annotation_info: dict, group_ids: dict = None) -> List[DataObject]:
+        # 先组装DataElement，元素id使用rhino对象的Attributes.Id(重新导入时用来匹配)
+        element_store = None
+        if self.columnar:  # 列式存储，元素是ElementStore的轻量视图
+            element_store = ElementStore(capacity=len(raw_data))
+            data_elements = element_store.extend(geometries=[obj['geometry'] for obj in raw_data],
+                                                 layers=[obj['layer'] for obj in raw_data],
+                                                 group_lists=[obj['group_index'] for obj in raw_data],
+                                                 ids=[obj['id'] for obj in raw_data])
+        else:
+            data_elements = []
+            for obj in raw_data:
+                cur_data_element = DataElement()
+                cur_data_element.id = obj['id']
+                cur_data_element.geometry = obj['geometry']
+                cur_data_element.type = obj['layer']
+                cur_data_element.group_list = obj['group_index']
+                data_elements.append(cur_data_element)
+        # 先根据group的名字、标注创建DataObject
+        data_objects = {i: DataObject(index=i, **values)
+                        for i, values in object_fields(groups_info, text_info, annotation_info, group_ids).items()}
         # 然后根据group list来把对应的data element放到data object里面
         for element in data_elements:
             if len(element.group_list) > 0:
                 data_object_index = element.group_list[0]
                 data_objects[data_object_index].elements.append(element)
         # 这里创建关系树，并放到每个data_objects中
-        data_template = DataTemplate().assemble_tree(data_elements=data_elements, data_objects=data_objects)
+        data_template = DataTemplate(element_store=element_store, metrics=self.metrics).assemble_tree(
+            data_elements=data_elements, data_objects=data_objects)
 
         # 这里把当前文件创建一个style.json
-        JsonFileProcessor.create_style_json(file_path=self.file_path, data=raw_data)
+        if self.style_json:
+            with self._stage('style_json'):
+                JsonFileProcessor.create_style_json(file_path=self.file_path, data=raw_data)
 
         # 返回一个包含所有data object的list
         return data_template
 
-    # 直接调用该函数读取3dm文件
-    def read_3dm_file(self):
+    # 读取3dm文档
+    def __read_doc(self) -> File3dm:
+        if self.data is not None:
+            doc = rhino3dm.File3dm.FromByteArray(self.data)
+        else:
+            doc = rhino3dm.File3dm.Read(self.file_path)
+        if doc is None:
+            raise Exception("无法读取3dm文件{}".format(self.file_path))
+        return doc
+
+    # 读取并转换3dm文件，返回中间数据(还没有组装成DataTemplate)
+    def parse_3dm_file(self) -> dict:
+        if self.cache is None:
+            return self.__parse_doc()
+        # 缓存键包含影响解析结果的选项
+        options = (self.read_spec.cache_key, self.annotation_parser.cache_key, self.tessellator.cache_key)
+        with self._stage('cache_get') as stage:
+            key = self.cache.make_key(self.file_path, options, data=self.data)
+            packed = self.cache.get(key)
+            stage.extra['hit'] = packed is not None
+        if packed is not None:
+            with self._stage('cache_unpack'):
+                return unpack_parse_result(packed)
+        parsed = self.__parse_doc()
+        with self._stage('cache_put'):
+            self.cache.put(key, pack_parse_result(parsed))
+        return parsed
+
+    def __parse_doc(self) -> dict:
         # 读取文档
-        doc = rhino3dm.File3dm.Read(self.file_path)
+        with self._stage('read_doc'):
+            doc = self.__read_doc()
         # 解包所有的groups
-        groups_info = self.__export_file_groups(doc=doc)
+        with self._stage('groups') as stage:
+            groups_info = self.__export_file_groups(doc=doc)
+            group_ids = self.__export_file_group_ids(doc=doc)
+            stage.count = len(groups_info)
+        with self._stage('layers') as stage:
+            layers_info = self.__export_file_layers(doc=doc)
+            stage.count = len(layers_info)
+        # 一次遍历读取并转换所有的rhino对象，同时收集文字
+        raw_data, text_info = self.__scan_rhino_objects(doc=doc, layers_info=layers_info, groups_info=groups_info)
+        # 部分读取时只保留仍有对象的编组(包括它们的上层编组)和它们的标注，后面的组装只处理这些编组
+        if self.read_spec.is_partial:
+            with self._stage('prune_groups') as stage:
+                kept = set()
+                for obj in raw_data:
+                    kept.update(obj['group_index'])
+                groups_info = {index: name for index, name in groups_info.items() if index in kept}
+                group_ids = {index: group_id for index, group_id in group_ids.items() if index in kept}
+                text_info = {index: texts for index, texts in text_info.items() if index in kept}
+                stage.count = len(groups_info)
+        # 一次解析所有标注中的高度、层数等标签
+        with self._stage('text', len(text_info)):
+            annotation_info = self.annotation_parser.parse(text_info)
+        return {'raw_data': raw_data, 'groups_info': groups_info, 'group_ids': group_ids, 'text_info': text_info,
+                'annotation_info': annotation_info}
+
+    # 用parse_3dm_file的结果组装DataTemplate
+    def build_data_template(self, parsed: dict) -> DataTemplate:
+        with self._stage('build_template', len(parsed['raw_data'])):
+            return self.__data_structure_processor(raw_data=parsed['raw_data'], groups_info=parsed['groups_info'],
+                                                   text_info=parsed['text_info'],
+                                                   annotation_info=parsed['annotation_info'],
+                                                   group_ids=parsed.get('group_ids'))
+
+    def update_data_template(self, template: DataTemplate) -> ChangeSet:
+        """
+        增量重新导入: 重新解析文件，只把和template不同的部分应用到template上
+        :param template: 之前由同一个文件(修改之前)读取的DataTemplate
+        :return: 变化集合
+        """
+        with self._stage('parse') as stage:
+            parsed = self.parse_3dm_file()
+            stage.count = len(parsed['raw_data'])
+        with self._stage('update_template', len(parsed['raw_data'])):
+            return update_template(template, parsed)
+
+    # 流式读取: 每转换完一个对象就产出一条中间数据，不在内存中保留整个列表
+    def iter_3dm_file(self) -> Iterator[dict]:
+        doc = self.__read_doc()
         layers_info = self.__export_file_layers(doc=doc)
-        text_info = self.__export_file_text(doc=doc)
-        # 处理文本中的高度信息
-        height_info = self.__text_processor(text_info=text_info, pattern=HEIGHT_PATTERN)
-        floor_info = self.__text_processor(text_info=text_info, pattern=FLOOR_PATTERN)
-        # 读取并转换所有的rhino对象
-        raw_data = self.__rhino_objects_processor(doc=doc, layers_info=layers_info)
+        groups_info = self.__export_file_groups(doc=doc) if self.read_spec.groups is not None else {}
+        yield from self.__iter_rhino_objects(doc=doc, layers_info=layers_info, text_info={},
+                                             layer_indexes=self.read_spec.layer_indexes(layers_info),
+                                             group_indexes=self.read_spec.group_indexes(groups_info))
+
+    # 直接调用该函数读取3dm文件
+    def read_3dm_file(self):
+        read_option = READ_OPTION if self.read_option is None else self.read_option
         # 根据选项输出不同的数据
-        if READ_OPTION == 0:  # 使用我们的数据结构打包
-            return self.__data_structure_processor(raw_data=raw_data, groups_info=groups_info, text_info=text_info,
-                                                   height_info=height_info, floor_info=floor_info)
+        if read_option == 2:  # 流式输出中间数据
+            return self.iter_3dm_file()
+        with self._stage('parse') as stage:
+            parsed = self.parse_3dm_file()
+            stage.count = len(parsed['raw_data'])
+        if read_option == 0:  # 使用我们的数据结构打包
+            return self.build_data_template(parsed)
         else:
-            return raw_data
+            return parsed['raw_data']
 
 
 # some test for rhino 3dm reader
@@ -1,10 +1,21 @@
-# 读取模式0为直接自动转换成art的数据结构，1为把所有信息原汁原味写成包含若干个字典的list
+from rhino3dm import ObjectType
+
+# 读取模式0为直接自动转换成art的数据结构，1为把所有信息原汁原味写成包含若干个字典的list，2为逐条产出这些字典的生成器
+# (Read3dmFile的read_option参数可以覆盖这里的默认值)
 READ_OPTION = 0
-# 用于匹配高度值
-HEIGHT_PATTERN = r'[H][=][0-9]*.[0-9]*(?=[m])'
-# 用于匹配楼层数
-FLOOR_PATTERN = r'[0-9]*[F]'
-# 暂时可以转换的3dm数据
-READABLE_OBJ = ['ObjectType.Curve']
+# 用于匹配高度值，分组中是数值(允许小数逗号，比如H = 8,3m)
+HEIGHT_PATTERN = r'H\s*=\s*([0-9]+(?:[.,][0-9]+)?)\s*m'
+# 用于匹配楼层数，分组中是数值
+FLOOR_PATTERN = r'([0-9]+)\s*F'
+# TextDot标注中要解析的标签: 标签名 -> (正则, 值类型)，可以按项目追加，比如 'far': (r'FAR\s*=\s*([0-9.]+)', float)
+ANNOTATION_TAGS = {
+    'height': (HEIGHT_PATTERN, float),
+    'floor': (FLOOR_PATTERN, int),
+}
+# 圆弧、NURBS等曲线离散的弦高误差(模型单位)，以及每条曲线的顶点上限
+CURVE_TOLERANCE = 0.01
+MAX_CURVE_POINTS = 4096
+# 暂时可以转换的3dm数据(ObjectType枚举，扫描时直接比较枚举，不再拼字符串)
+READABLE_OBJ = [ObjectType.Curve]
 # 指定style.json保存的文件夹
 STYLE_JSON_PATH = './'
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+DataTemplate.assemble_tree的回归对比和规模测试
+旧实现每一层group都要重建一次全部节点的tag列表(平方复杂度)，这里保留一份作为对照
+用法: python -m art_benchmark.bench_assemble_tree [group数量...]
+"""
+import sys
+import time
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+from art_datastructure.hierarchy import Hierarchy
+
+# 旧实现太慢，超过这个规模就不再跑
+LEGACY_MAX_GROUPS = 2000
+
+
+# 旧的assemble_tree组树方式
+def legacy_assemble_tree(data_elements, data_objects: dict) -> Hierarchy:
+    group_info = [each.group_list for each in data_elements]
+    group_info = list(set(filter(lambda each: len(each) > 0, group_info)))
+    global_tree = Hierarchy()
+    global_tree.create_node("global_tree", "root")
+    for each in group_info:
+        cur_order = list(each)
+        cur_order.reverse()
+        for i in range(len(cur_order)):
+            all_node_tag = [node.tag for node in global_tree.all_nodes()]
+            if i == 0 and cur_order[i] not in all_node_tag:
+                global_tree.create_node(cur_order[i], cur_order[i], parent="root", data=data_objects[cur_order[i]])
+            elif i != 0 and cur_order[i] not in all_node_tag:
+                global_tree.create_node(cur_order[i], cur_order[i], parent=cur_order[i - 1],
+                                        data=data_objects[cur_order[i]])
+    return global_tree
+
+
+# 生成group_count个叶子group，每branching个group再往上编一层，直到只剩一个
+def make_grouped_elements(group_count: int, branching: int = 4):
+    chains = [[leaf] for leaf in range(group_count)]
+    next_index = group_count
+    level_start, level_size = 0, group_count
+    while level_size > 1:
+        parent_size = (level_size + branching - 1) // branching
+        for chain in chains:
+            position = chain[-1] - level_start
+            chain.append(next_index + position // branching)
+        level_start, level_size = next_index, parent_size
+        next_index += parent_size
+    # 再加一些只挂在中间层的element，让group list长短不一
+    data_elements = [DataElement(group_list=tuple(chain)) for chain in chains]
+    data_elements.extend(DataElement(group_list=tuple(chain[1:])) for chain in chains[::7])
+    data_elements.append(DataElement(group_list=()))
+    data_objects = {index: DataObject(index=index) for index in range(next_index)}
+    return data_elements, data_objects
+
+
+# 比较两棵树: 节点、父子关系以及子节点顺序都要一致
+def same_tree(tree_a: Hierarchy, tree_b: Hierarchy) -> bool:
+    if set(tree_a.nodes) != set(tree_b.nodes):
+        return False
+    for nid in tree_a.nodes:
+        if tree_a[nid].data is not tree_b[nid].data:
+            return False
+        if tree_a.is_branch(nid) != tree_b.is_branch(nid):  # 子节点以及它们的顺序
+            return False
+    return True
+
+
+def run(group_counts):
+    for count in group_counts:
+        data_elements, data_objects = make_grouped_elements(count)
+        start = time.perf_counter()
+        template = DataTemplate().assemble_tree(data_elements=data_elements, data_objects=data_objects)
+        new_time = time.perf_counter() - start
+        line = f'groups={len(data_objects):>8}  nodes={len(template.tree.nodes):>8}  linear={new_time:8.3f}s'
+        if count <= LEGACY_MAX_GROUPS:
+            start = time.perf_counter()
+            legacy_tree = legacy_assemble_tree(data_elements, data_objects)
+            legacy_time = time.perf_counter() - start
+            assert same_tree(template.tree, legacy_tree), '新旧assemble_tree结果不一致'
+            line += f'  legacy={legacy_time:8.3f}s  same_tree=True'
+        else:
+            line += '  legacy=skipped'
+        print(line)
+
+
+if __name__ == "__main__":
+    run([int(each) for each in sys.argv[1:]] or [1000, 10000, 100000])
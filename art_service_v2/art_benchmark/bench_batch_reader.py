@@ -0,0 +1,34 @@
+"""
+批量读取的进程数扩展性测试，默认使用test_files/3dm_files里的文件
+用法: python -m art_benchmark.bench_batch_reader [--dir 文件夹] [--repeat N] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import time
+from art_3dm_reader.batch_reader import collect_3dm_files, read_3dm_files
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files', '3dm_files')
+
+
+def run(directory: str, repeat: int, worker_counts):
+    # 同一批文件重复repeat次，模拟一个项目文件夹
+    file_paths = collect_3dm_files([directory]) * repeat
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        results = list(read_3dm_files(file_paths, max_workers=workers))
+        elapsed = time.perf_counter() - start
+        failed = sum(result.error is not None for result in results)
+        throughput = len(file_paths) / elapsed
+        baseline = baseline or throughput
+        print(f'workers={workers:>3}  files={len(file_paths):>5}  failed={failed}  time={elapsed:8.3f}s  '
+              f'files/s={throughput:8.2f}  scaling={throughput / baseline:5.2f}x')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', default=DEFAULT_DIR)
+    parser.add_argument('--repeat', type=int, default=64)
+    parser.add_argument('--workers', default=','.join(str(2 ** i) for i in range(4) if 2 ** i <= os.cpu_count()))
+    args = parser.parse_args()
+    run(args.dir, args.repeat, [int(each) for each in args.workers.split(',')])
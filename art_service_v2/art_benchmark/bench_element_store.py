@@ -0,0 +1,61 @@
+"""
+对比dataclass的DataElement和ElementStore+ElementView的单元素内存占用以及图层/编组扫描的耗时
+几何对象两边共用，不计入内存
+用法: python -m art_benchmark.bench_element_store [元素数量]
+"""
+import sys
+import time
+import tracemalloc
+import numpy as np
+from shapely.geometry import Point
+from art_datastructure.data_structure import DataElement
+from art_datastructure.element_store import ElementStore
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def run(count: int):
+    geometries = [Point(i, i) for i in range(count)]
+    layers = [f'layer_{i % 8}' for i in range(count)]
+    group_lists = [(i // 4, count + i // 16, 2 * count + i // 64) for i in range(count)]
+
+    def build_dataclass():
+        return [DataElement(geometry=geometry, type=layer, group_list=tuple(list(group_list)))
+                for geometry, layer, group_list in zip(geometries, layers, group_lists)]
+
+    def build_store():
+        store = ElementStore(capacity=count)
+        store.extend(geometries, layers, group_lists)
+        return store
+
+    elements, dataclass_bytes, dataclass_time = measure(build_dataclass)
+    store, store_bytes, store_time = measure(build_store)
+    views, view_bytes, _ = measure(lambda: [store.view(row) for row in range(count)])
+    print(f'elements={count}')
+    print(f'  dataclass     {dataclass_bytes / count:7.1f} B/element  build={dataclass_time:.3f}s')
+    print(f'  store         {store_bytes / count:7.1f} B/element  build={store_time:.3f}s  '
+          f'({dataclass_bytes / store_bytes:.1f}x smaller)')
+    print(f'  store+views   {(store_bytes + view_bytes) / count:7.1f} B/element  '
+          f'({dataclass_bytes / (store_bytes + view_bytes):.1f}x smaller)')
+
+    start = time.perf_counter()
+    slow = [each for each in elements if each.type == 'layer_3' and count + 5 in each.group_list]
+    scan_time = time.perf_counter() - start
+    np.intersect1d(store.rows_with_layer('layer_3'), store.rows_in_group(count + 5))  # 预热
+    start = time.perf_counter()
+    rows = np.intersect1d(store.rows_with_layer('layer_3'), store.rows_in_group(count + 5))
+    vector_time = time.perf_counter() - start
+    assert len(slow) == len(rows)
+    print(f'  layer+group scan  python={scan_time * 1000:8.2f}ms  vectorized={vector_time * 1000:8.2f}ms')
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,43 @@
+"""
+对比逐个创建shapely对象和CurveBatchConverter批量创建的耗时
+用法: python -m art_benchmark.bench_geometry_conversion [对象数量...]
+"""
+import os
+import sys
+import tempfile
+import rhino3dm
+import shapely
+from rhino3dm import ObjectType
+from art_3dm_reader.geometry_converter import CurveBatchConverter
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.bench_object_scan import best_of
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+def run(object_counts, vertex_count: int = 32):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for count in object_counts:
+            file_path = create_synthetic_3dm(os.path.join(tmp_dir, f'convert_{count}.3dm'), object_count=count,
+                                             vertex_count=vertex_count)
+            doc = rhino3dm.File3dm.Read(file_path)
+            curves = [obj.Geometry for obj in doc.Objects if obj.Geometry.ObjectType == ObjectType.Curve]
+            convert_one = Read3dmFile(file_path)._Read3dmFile__convert_rhino_obj_to_shapely_obj
+
+            per_object = [convert_one(curve, ObjectType.Curve) for curve in curves]
+            batched = CurveBatchConverter.convert(curves)
+            assert all(shapely.equals_exact(per_object, batched, tolerance=0))
+
+            per_object_time = best_of(lambda: [convert_one(curve, ObjectType.Curve) for curve in curves])
+            batched_time = best_of(lambda: CurveBatchConverter.convert(curves))
+            # 单独统计缓冲区填满之后创建shapely几何的时间(C层循环)
+            converter = CurveBatchConverter()
+            for slot, curve in enumerate(curves):
+                converter.add_curve(curve, slot)
+            build_time = best_of(lambda: converter.build(len(curves)))
+            print(f'curves={len(curves):>8}  vertices={vertex_count}  per-object={per_object_time:8.3f}s  '
+                  f'batched={batched_time:8.3f}s (build {build_time:6.3f}s)  '
+                  f'speedup={per_object_time / batched_time:5.2f}x')
+
+
+if __name__ == "__main__":
+    run([int(each) for each in sys.argv[1:]] or [10000, 100000, 300000])
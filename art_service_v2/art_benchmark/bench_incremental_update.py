@@ -0,0 +1,94 @@
+"""
+增量重新导入和整体重新读取的对比: 修改一个大文件中的少量对象(移动、删除、新增、改标注)之后，
+分别统计 重新解析 / 比较+应用变化 / 整体组装新的DataTemplate 的耗时，并检查增量结果和整体读取一致
+用法: python -m art_benchmark.bench_incremental_update [对象数量...] [--edits 20]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import rhino3dm
+from art_3dm_reader.incremental_update import update_template
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+# 复制一份文件并做edits处小修改: 移动曲线、删除对象、在已有编组中新增曲线、修改一个TextDot
+def edit_copy(source: str, target: str, edits: int, seed: int = 0):
+    rng = random.Random(seed)
+    doc = rhino3dm.File3dm.Read(source)
+    objects = list(doc.Objects)
+    curves = [each for each in objects if each.Geometry.ObjectType == rhino3dm.ObjectType.Curve]
+    for each in rng.sample(curves, edits):
+        each.Geometry.Translate(rhino3dm.Vector3d(rng.uniform(-5, 5), rng.uniform(-5, 5), 0))
+    for each in rng.sample(curves, edits):
+        doc.Objects.Delete(each.Attributes.Id)
+    for k in range(edits):
+        attributes = rhino3dm.ObjectAttributes()
+        for group_index in rng.choice(curves).Attributes.GetGroupList():
+            attributes.AddToGroup(group_index)
+        doc.Objects.AddLine(rhino3dm.Point3d(k, 0, 0), rhino3dm.Point3d(k, 10, 0), attributes)
+    for each in objects:
+        if each.Geometry.ObjectType == rhino3dm.ObjectType.TextDot:
+            each.Geometry.Text = 'H = 99.9m, 33F'
+            break
+    doc.Write(target, 7)
+
+
+# 用于比较的模板内容: 物件字段和父节点、元素几何/图层/所属物件
+def template_state(template) -> tuple:
+    tree = template.tree
+    objects = {each.index: (each.name, each.annotations, each.height, each.floor,
+                            tree.parent(each.index).identifier if tree.contains(each.index) else None)
+               for each in template.data_objects}
+    elements = {element.id: (None if element.geometry is None else element.geometry.wkb, element.type, owner.index)
+                for element, owner in template._element_index.values()}
+    return objects, elements
+
+
+def run(object_count: int, edits: int, tmp_dir: str):
+    source = create_synthetic_3dm(os.path.join(tmp_dir, f'plan_{object_count}.3dm'), object_count=object_count)
+    target = os.path.join(tmp_dir, f'plan_{object_count}_edited.3dm')
+    edit_copy(source, target, edits)
+    template = Read3dmFile(source).read_3dm_file()
+    # 预先建好索引和聚合缓存，增量更新需要维护它们
+    len(template.spatial_index)
+    len(template.attribute_index)
+    template.tree.order
+
+    reader = Read3dmFile(target)
+    start = time.perf_counter()
+    parsed = reader.parse_3dm_file()
+    parse_time = time.perf_counter() - start
+    start = time.perf_counter()
+    rebuilt = reader.build_data_template(parsed)
+    len(rebuilt.spatial_index)
+    len(rebuilt.attribute_index)
+    rebuild_time = time.perf_counter() - start
+    changes = update_template(template, parsed)
+    consistent = template_state(template) == template_state(rebuilt)
+    summary = changes.summary()
+    print(f'objects={object_count:>7}  parse={parse_time:7.3f}s  rebuild={rebuild_time:7.3f}s  '
+          f'diff={changes.diff_seconds * 1000:8.2f}ms  apply={changes.apply_seconds * 1000:7.2f}ms  '
+          f'consistent={consistent}')
+    print('    ' + ', '.join(f'{key}={value}' for key, value in summary.items() if not key.endswith('_s')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='增量重新导入')
+    parser.add_argument('counts', type=int, nargs='*', default=[20000, 100000])
+    parser.add_argument('--edits', type=int, default=20, help='移动/删除/新增的对象数量')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)  # style.json写到临时文件夹
+        try:
+            for count in args.counts:
+                run(count, args.edits, tmp_dir)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+几何多级简化(GeometryPyramid)每一级的数据量: 顶点数、WKB字节数、GeoJSON字节数，以及简化误差和计算耗时
+另外统计整张图的视口查询(query_lod)在不同比例下返回的数据量，和建好各级之后增删改元素的耗时
+合成文件的每条曲线有vertex_count个顶点，模拟离散之后的密集曲线
+用法: python -m art_benchmark.bench_lod [对象数量...] [--vertices 64]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.bench_object_scan import best_of
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+# 一组几何的GeoJSON字节数(和服务返回的格式一致)
+def geojson_bytes(geometries) -> int:
+    return len(json.dumps([mapping(each) for each in geometries]).encode('utf-8'))
+
+
+def run(object_count: int, vertex_count: int, tmp_dir: str, check: int = 500):
+    file_path = create_synthetic_3dm(os.path.join(tmp_dir, f'lod_{object_count}.3dm'), object_count=object_count,
+                                     vertex_count=vertex_count)
+    template = Read3dmFile(file_path).read_3dm_file()
+    pyramid = template.geometry_pyramid
+    _, original = pyramid.level_geometries(0)
+    sample = np.arange(0, len(original), max(1, len(original) // check))
+    base_coords = int(shapely.get_num_coordinates(original).sum())
+    base_wkb = int(sum(map(len, shapely.to_wkb(original))))
+    base_json = geojson_bytes(original[sample])
+    print(f'objects={object_count:>7}  vertices/curve={vertex_count}  elements={len(original)}')
+    print(f'    {"level":>5s} {"tol":>6s} {"build s":>8s} {"coords":>10s} {"wkb MB":>8s} {"json(sample)":>12s} '
+          f'{"max err":>8s}')
+    for level, tolerance in enumerate(pyramid.tolerances):
+        start = time.perf_counter()
+        _, geometries = pyramid.level_geometries(level)
+        build_time = time.perf_counter() - start
+        coords = int(shapely.get_num_coordinates(geometries).sum())
+        wkb = int(sum(map(len, shapely.to_wkb(geometries))))
+        json_size = geojson_bytes(geometries[sample])
+        error = float(shapely.hausdorff_distance(original[sample], geometries[sample]).max())
+        print(f'    {level:>5d} {tolerance:>6.2f} {build_time:>8.3f} {coords:>10d} ({coords / base_coords:5.1%}) '
+              f'{wkb / 1e6:>8.2f} {json_size / base_json:>12.1%} {error:>8.3f}')
+
+    # 整张图的视口查询: 视口宽度固定为1000像素
+    min_x, min_y, max_x, max_y = shapely.total_bounds(original)
+    for zoom in (1, 4, 16, 64):
+        width = (max_x - min_x) / zoom
+        viewport = (min_x, min_y, min_x + width, min_y + width)
+        scale = width / 1000
+        hits = template.query_lod(*viewport, scale)
+        query_time = best_of(lambda: template.query_lod(*viewport, scale))
+        coords = int(sum(shapely.get_num_coordinates(geometry) for geometry, _, _ in hits))
+        full = int(sum(shapely.get_num_coordinates(element.geometry) for _, element, _ in hits))
+        print(f'    zoom={zoom:>3d}  units/px={scale:8.3f}  level={pyramid.level_for_scale(scale)}  '
+              f'elements={len(hits):>7d}  coords={coords:>9d} ({coords / max(full, 1):5.1%})  '
+              f'query={query_time * 1000:7.2f}ms')
+
+    # 各级都建好之后修改元素几何: 只重新简化这一个元素
+    element = next(each for each in template.data_objects if each.elements).elements[0]
+    update_time = best_of(lambda: template.update_element(
+        element.id, geometry=shapely.affinity.translate(element.geometry, 1.0, 0.0)))
+    print(f'    update_element with {len(pyramid.tolerances) - 1} levels built: {update_time * 1000:.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='几何多级简化')
+    parser.add_argument('counts', type=int, nargs='*', default=[20000, 100000])
+    parser.add_argument('--vertices', type=int, default=64, help='每条曲线的顶点数')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)  # style.json写到临时文件夹
+        try:
+            for count in args.counts:
+                run(count, args.vertices, tmp_dir)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
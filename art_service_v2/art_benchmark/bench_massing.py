@@ -0,0 +1,78 @@
+"""
+体量指标(基底面积/建筑面积/体积/容积率)的耗时: 逐个物件all_objects()重新求并集的做法 和 MassingEngine的对比
+MassingEngine分别统计 第一次计算 / 缓存命中 / 修改一个物件的高度 / 修改一个元素的几何 之后的场地指标耗时
+用法: python -m art_benchmark.bench_massing [对象数量...]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.bench_object_scan import best_of
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+# 原来的做法: 每个物件取子树中的所有物件，逐个求基底轮廓再累加
+def naive_metrics(template) -> dict:
+    result = {}
+    for one_object in template.data_objects:
+        area = gross_floor_area = volume = 0.0
+        for each in one_object.all_objects():
+            polygons = [element.geometry for element in each.elements if isinstance(element.geometry, Polygon)]
+            if polygons:
+                footprint_area = shapely.union_all(polygons).area
+                area += footprint_area
+                gross_floor_area += footprint_area * each.floor
+                volume += footprint_area * each.height
+        result[one_object.index] = (area, gross_floor_area, volume)
+    return result
+
+
+def run(object_count: int, tmp_dir: str):
+    file_path = create_synthetic_3dm(os.path.join(tmp_dir, f'massing_{object_count}.3dm'), object_count=object_count)
+    template = Read3dmFile(file_path).read_3dm_file()
+    naive_time = best_of(lambda: naive_metrics(template), repeat=1)
+    expected = naive_metrics(template)
+
+    start = time.perf_counter()
+    report = template.site_report()
+    cold_time = time.perf_counter() - start
+    warm_time = best_of(lambda: template.site_report())
+    rollup = template.massing_engine.all_subtree_metrics()
+    consistent = all(np.allclose(values, (rollup[index].footprint_area, rollup[index].gross_floor_area,
+                                          rollup[index].volume)) for index, values in expected.items())
+
+    # 修改之后重新取场地指标: 物件属性只重新累加，元素几何只重新计算该物件的轮廓
+    buildings = [each for each in template.data_objects if each.elements and each.height > 0]
+
+    def after_update_object():
+        template.update_object(buildings[0].index, height=buildings[0].height + 1.0)
+        return template.site_report()
+
+    def after_update_element():
+        element = next(each for each in buildings[1].elements if isinstance(each.geometry, Polygon))
+        template.update_element(element.id, geometry=shapely.affinity.translate(element.geometry, 1.0, 0.0))
+        return template.site_report()
+
+    object_time = best_of(after_update_object)
+    element_time = best_of(after_update_element)
+    print(f'objects={object_count:>7}  groups={len(template.data_objects):>6}  naive={naive_time:7.3f}s  '
+          f'cold={cold_time * 1000:8.2f}ms  warm={warm_time * 1e6:7.1f}us  '
+          f'update_object={object_time * 1000:7.2f}ms  update_element={element_time * 1000:7.2f}ms  '
+          f'consistent={consistent}')
+    print(f'    site_area={report.site_area:.0f}  FAR={report.floor_area_ratio:.4f}  '
+          f'coverage={report.coverage_ratio:.2%}  buildings={report.totals.building_count}')
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)  # style.json写到临时文件夹
+        try:
+            for count in [int(each) for each in sys.argv[1:]] or [20000, 100000]:
+                run(count, tmp_dir)
+        finally:
+            os.chdir(cwd)
@@ -0,0 +1,77 @@
+"""
+对比旧的多次遍历doc.Objects(字符串比较ObjectType)和新的单次扫描
+用法: python -m art_benchmark.bench_object_scan [对象数量...]
+"""
+import os
+import sys
+import tempfile
+import time
+import rhino3dm
+from shapely.geometry import Polygon, LineString
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+# 旧的实现: 先扫一遍文字，再过滤一遍对象，每个对象都拼ObjectType字符串
+def legacy_multi_pass(doc, layers_info: dict):
+    text_info = {}
+    for obj in doc.Objects:
+        group_depth = obj.Attributes.GroupCount
+        group_indexes = obj.Attributes.GetGroupList()
+        geometry = obj.Geometry
+        if isinstance(geometry, rhino3dm.TextDot) and group_depth > 0:
+            text_info[int(group_indexes[0])] = geometry.Text.replace(" ", "")
+    res = []
+    valid_objs = list(filter(lambda each: str(each.Geometry.ObjectType) in ['ObjectType.Curve'], doc.Objects))
+    for obj in valid_objs:
+        rhino_geometry = obj.Geometry
+        shapely_geometry = None
+        if str(rhino_geometry.ObjectType) == 'ObjectType.Curve':
+            if rhino_geometry.IsLinear():
+                shapely_geometry = LineString([(rhino_geometry.Line.PointAt(0).X, rhino_geometry.Line.PointAt(0).Y),
+                                               (rhino_geometry.Line.PointAt(1).X, rhino_geometry.Line.PointAt(1).Y)])
+            elif rhino_geometry.IsPolyline() and rhino_geometry.IsClosed:
+                shapely_geometry = Polygon([(point.X, point.Y) for point in rhino_geometry.ToPolyline()])
+            elif rhino_geometry.IsPolyline():
+                shapely_geometry = LineString([(point.X, point.Y) for point in rhino_geometry.ToPolyline()])
+        res.append({'id': obj.Attributes.Id,
+                    'geometry': shapely_geometry,
+                    'layer': layers_info[obj.Attributes.LayerIndex],
+                    'group_index': obj.Attributes.GetGroupList(),
+                    'group_depth': obj.Attributes.GroupCount})
+    return res, text_info
+
+
+def best_of(func, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(object_counts):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for count in object_counts:
+            file_path = create_synthetic_3dm(os.path.join(tmp_dir, f'scan_{count}.3dm'), object_count=count)
+            doc = rhino3dm.File3dm.Read(file_path)
+            layers_info = {each.Index: each.Name for each in doc.Layers}
+            reader = Read3dmFile(file_path)
+            groups_info = reader._Read3dmFile__export_file_groups(doc)
+            fused_scan = reader._Read3dmFile__scan_rhino_objects
+
+            legacy_data, legacy_text = legacy_multi_pass(doc, layers_info)
+            fused_data, fused_text = fused_scan(doc, layers_info, groups_info)
+            # 旧实现每个group只保留最后一个TextDot
+            assert legacy_text == {group: texts[-1] for group, texts in fused_text.items()}
+            assert len(legacy_data) == len(fused_data)
+
+            legacy_time = best_of(lambda: legacy_multi_pass(doc, layers_info))
+            fused_time = best_of(lambda: fused_scan(doc, layers_info, groups_info))
+            print(f'objects={count:>8}  multi-pass={legacy_time:8.3f}s  single-pass={fused_time:8.3f}s  '
+                  f'speedup={legacy_time / fused_time:5.2f}x')
+
+
+if __name__ == "__main__":
+    run([int(each) for each in sys.argv[1:]] or [10000, 50000, 100000])
@@ -0,0 +1,48 @@
+"""
+部分读取(ReadSpec)的耗时和读取全部对象的对比，以及从内存读取(from_bytes)和从文件读取的对比
+合成文件有8个图层，对象按建筑轮流放在各图层中，读取k个图层时返回约k/8的对象
+用法: python -m art_benchmark.bench_partial_read [对象数量...]
+"""
+import os
+import sys
+import tempfile
+from art_3dm_reader.read_spec import ReadSpec
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.bench_object_scan import best_of
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+def run(object_counts, layer_count: int = 8):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)  # style.json写到临时文件夹
+        try:
+            for count in object_counts:
+                file_path = create_synthetic_3dm(os.path.join(tmp_dir, f'partial_{count}.3dm'), object_count=count,
+                                                 layer_count=layer_count)
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                full_time = best_of(lambda: Read3dmFile(file_path).read_3dm_file())
+                bytes_time = best_of(lambda: Read3dmFile.from_bytes(data, 'partial.3dm').read_3dm_file())
+                full = Read3dmFile(file_path).read_3dm_file()
+                print(f'objects={count:>7}  full={full_time:7.3f}s ({len(full.data_objects)} groups)  '
+                      f'from_bytes={bytes_time:7.3f}s')
+                for kept in (1, 2, 4):
+                    spec = ReadSpec(layers=[f'layer_{i}' for i in range(kept)])
+                    part_time = best_of(lambda: Read3dmFile(file_path, read_spec=spec).read_3dm_file())
+                    part = Read3dmFile(file_path, read_spec=spec).read_3dm_file()
+                    print(f'    layers={kept}/{layer_count}  {part_time:7.3f}s ({part_time / full_time:5.1%} of full)  '
+                          f'{len(part.data_objects)} groups, {sum(len(each.elements) for each in part.data_objects)} '
+                          f'elements')
+                # 只读取一栋建筑所在的上层编组
+                spec = ReadSpec(groups=['group_2_0'])
+                part_time = best_of(lambda: Read3dmFile(file_path, read_spec=spec).read_3dm_file())
+                part = Read3dmFile(file_path, read_spec=spec).read_3dm_file()
+                print(f'    groups=group_2_0  {part_time:7.3f}s ({part_time / full_time:5.1%} of full)  '
+                      f'{len(part.data_objects)} groups')
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    run([int(each) for each in sys.argv[1:]] or [10000, 100000])
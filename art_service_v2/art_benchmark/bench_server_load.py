@@ -0,0 +1,228 @@
+"""
+art_server的压力测试: 多个keep-alive连接并发发送find/filter/spatial请求，统计吞吐和延迟分位数
+先并发发送--concurrent-loads个同一文件的加载请求，检查它们共享了同一次解析
+不传--port时在子进程里启动一个本地服务，测完关闭
+用法: python -m art_benchmark.bench_server_load [--file a.3dm] [--port 8765] [--connections 16] [--requests 5000]
+                                                [--mix find=5,filter=2,spatial=3] [--objects 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import *
+from urllib.parse import quote
+import numpy as np
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+
+class HttpClient:
+    """
+    一个keep-alive连接上的最简HTTP/1.1客户端
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method: str, path: str, body: dict = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        head = f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(payload)}\r\n\r\n'
+        self._writer.write(head.encode('latin-1') + payload)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).strip(), 16)
+                data = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(data[:-2])
+            return status, b''.join(chunks)
+        return status, await self._reader.readexactly(int(headers.get('content-length', 0)))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+# 找一个空闲端口
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# 在子进程里启动服务，等到端口可以连接；服务的工作目录是cwd(style json会写到这里)
+def start_server(port: int, cwd: str) -> subprocess.Popen:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    process = subprocess.Popen([sys.executable, '-m', 'art_server.http_server', '--port', str(port)], cwd=cwd,
+                               env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise Exception("服务没有在30秒内启动")
+
+
+# 并发加载同一个文件，返回(各请求的解析耗时, 总耗时)
+async def concurrent_loads(host: str, port: int, file_path: str, count: int) -> Tuple[List[dict], float]:
+    clients = [HttpClient(host, port) for _ in range(count)]
+    await asyncio.gather(*(client.connect() for client in clients))
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.request('POST', '/templates', {'path': file_path, 'reload': True})
+                                       if i == 0 else client.request('POST', '/templates', {'path': file_path})
+                                       for i, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(client.close() for client in clients))
+    infos = []
+    for status, body in responses:
+        if status != 200:
+            raise Exception("加载失败: {}".format(body.decode('utf-8')))
+        infos.append(json.loads(body))
+    return infos, elapsed
+
+
+# 按比例生成请求路径
+def make_paths(template_id: str, objects: List[dict], bounds: Tuple[float, ...], mix: Dict[str, int], count: int,
+               seed: int = 0) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    min_x, min_y, max_x, max_y = bounds
+    span = max(max_x - min_x, max_y - min_y) * 0.02
+    paths = []
+    for kind in kinds:
+        if kind == 'find':
+            target = rng.choice(objects)
+            key = target['index'] if rng.random() < 0.5 else quote(target['name'])
+            path = f'/templates/{template_id}/objects/{key}'
+        elif kind == 'filter':
+            low = rng.uniform(0, 30)
+            path = f'/templates/{template_id}/objects?min_height={low:.1f}&max_height={low + 5:.1f}&limit=50'
+        else:
+            x, y = rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)
+            path = f'/templates/{template_id}/spatial?bbox={x},{y},{x + span},{y + span}&geometry=0&limit=100'
+        paths.append((kind, path))
+    return paths
+
+
+# 每个连接按顺序发送分给它的请求
+async def run_load(host: str, port: int, paths: List[Tuple[str, str]], connections: int) -> Tuple[dict, float]:
+    clients = [HttpClient(host, port) for _ in range(connections)]
+    await asyncio.gather(*(client.connect() for client in clients))
+    latencies = {kind: [] for kind, _ in paths}
+    errors = {kind: 0 for kind, _ in paths}
+
+    async def worker(client: HttpClient, assigned: List[Tuple[str, str]]):
+        for kind, path in assigned:
+            start = time.perf_counter()
+            status, _ = await client.request('GET', path)
+            latencies[kind].append(time.perf_counter() - start)
+            if status != 200:
+                errors[kind] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client, paths[i::connections]) for i, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(client.close() for client in clients))
+    report = {}
+    for kind, values in latencies.items():
+        values = np.array(values) * 1000
+        report[kind] = {'count': len(values), 'errors': errors[kind], 'mean_ms': float(values.mean()),
+                        'p50_ms': float(np.percentile(values, 50)), 'p95_ms': float(np.percentile(values, 95)),
+                        'p99_ms': float(np.percentile(values, 99)), 'max_ms': float(values.max())}
+    return report, elapsed
+
+
+async def main_async(args, port: int, file_path: str):
+    host = args.host
+    infos, load_elapsed = await concurrent_loads(host, port, file_path, args.concurrent_loads)
+    # 共享同一次解析时，所有请求拿到的是同一个模板(loaded_at相同)
+    shared = len({each['loaded_at'] for each in infos}) == 1
+    template_id = infos[0]['id']
+    print(f"加载: {args.concurrent_loads}个并发请求, {infos[0]['objects']}个物件, {infos[0]['elements']}个元素, "
+          f"解析{infos[0]['parse_s']:.3f}s, 组装{infos[0]['build_s']:.3f}s, 总耗时{load_elapsed:.3f}s, "
+          f"共享解析: {shared}")
+
+    client = HttpClient(host, port)
+    await client.connect()
+    _, body = await client.request('GET', f'/templates/{template_id}/objects?limit=100000')
+    objects = json.loads(body)['objects']
+    bounds = [each['bounds'] for each in objects if each['bounds'] is not None]
+    total_bounds = (min(each[0] for each in bounds), min(each[1] for each in bounds),
+                    max(each[2] for each in bounds), max(each[3] for each in bounds))
+    await client.close()
+
+    mix = {}
+    for each in args.mix.split(','):
+        kind, _, weight = each.partition('=')
+        mix[kind] = int(weight or 1)
+    paths = make_paths(template_id, objects, total_bounds, mix, args.requests)
+    report, elapsed = await run_load(host, port, paths, args.connections)
+    print(f'请求: {args.requests}个, {args.connections}个连接, 用时{elapsed:.3f}s, {args.requests / elapsed:.0f}个/s')
+    for kind, each in report.items():
+        print(f"  {kind:8s} count={each['count']:6d} errors={each['errors']:4d} mean={each['mean_ms']:7.2f}ms "
+              f"p50={each['p50_ms']:7.2f}ms p95={each['p95_ms']:7.2f}ms p99={each['p99_ms']:7.2f}ms "
+              f"max={each['max_ms']:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='art_server压力测试')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help='已经在运行的服务端口，不传时启动一个本地服务')
+    parser.add_argument('--file', default=None, help='3dm文件，不传时生成一个合成文件')
+    parser.add_argument('--objects', type=int, default=20000, help='合成文件的物件数')
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrent-loads', type=int, default=8)
+    parser.add_argument('--mix', default='find=5,filter=2,spatial=3', help='请求类型和权重')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = args.file
+        if file_path is None:
+            file_path = os.path.join(tmp_dir, f'load_{args.objects}.3dm')
+            create_synthetic_3dm(file_path, object_count=args.objects)
+        process = None
+        port = args.port
+        if port is None:
+            port = free_port()
+            process = start_server(port, tmp_dir)
+        try:
+            asyncio.run(main_async(args, port, os.path.abspath(file_path)))
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+
+if __name__ == "__main__":
+    main()
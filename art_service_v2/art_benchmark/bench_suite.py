@@ -0,0 +1,220 @@
+"""
+分阶段的读取/DataTemplate操作基准测试，结果输出为json，用于跨版本对比
+每组参数先用synthetic_3dm生成一个3dm文件，然后:
+  1. 分别计时read_3dm_file的各个阶段(读文档、group、layer、扫描+几何转换、文字解析、组装、style json)以及整体耗时
+  2. 在组装好的DataTemplate上计时find/add/insert/move/delete/all_elements
+用法: python -m art_benchmark.bench_suite [--objects 10000,100000] [--depth 3] [--vertices 8] [--text-density 0.5]
+                                          [--output result.json] [--compare baseline.json --threshold 1.2]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import *
+import numpy as np
+import rhino3dm
+import shapely
+from shapely.geometry import Polygon
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_3dm_reader.data_to_json.data_json_exchange import JsonFileProcessor
+from art_datastructure.data_structure import DataElement, DataObject
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+
+RESULT_FORMAT_VERSION = 1
+
+
+# 重复repeat次取最快的一次，返回(耗时, 最后一次的返回值)
+def best_of(func: Callable, repeat: int = 3, setup: Callable = None) -> Tuple[float, Any]:
+    best, result = None, None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# 当前代码的git提交，不在git仓库中时为None
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# 读取流程的各个阶段分别计时(调用Read3dmFile的私有阶段)
+def time_read_stages(file_path: str, repeat: int) -> Dict[str, float]:
+    reader = Read3dmFile(file_path)
+    stages = {}
+    stages['read_doc'], doc = best_of(lambda: reader._Read3dmFile__read_doc(), repeat)
+    stages['groups'], groups_info = best_of(lambda: reader._Read3dmFile__export_file_groups(doc), repeat)
+    stages['layers'], layers_info = best_of(lambda: reader._Read3dmFile__export_file_layers(doc), repeat)
+    stages['scan_and_convert'], (raw_data, text_info) = best_of(
+        lambda: reader._Read3dmFile__scan_rhino_objects(doc, layers_info, groups_info), repeat)
+    stages['text'], annotation_info = best_of(lambda: reader.annotation_parser.parse(text_info), repeat)
+
+    # style json单独计时；组装阶段计时的时候style json已经存在，只剩一次文件存在性检查
+    style_path = os.path.join('.', os.path.basename(file_path).split('.')[0] + '.json')
+
+    def remove_style_json():
+        if os.path.exists(style_path):
+            os.remove(style_path)
+
+    stages['style_json'], _ = best_of(lambda: JsonFileProcessor.create_style_json(file_path, raw_data), repeat,
+                                      setup=remove_style_json)
+    stages['assembly'], _ = best_of(lambda: reader._Read3dmFile__data_structure_processor(
+        raw_data, groups_info, text_info, annotation_info), repeat)
+    stages['read_3dm_file'], _ = best_of(lambda: Read3dmFile(file_path, read_option=0).read_3dm_file(), repeat)
+    return stages
+
+
+# 计时一组操作，返回总耗时和单次耗时(微秒)
+def time_operation(func: Callable, arguments: list) -> dict:
+    start = time.perf_counter()
+    for each in arguments:
+        func(each)
+    elapsed = time.perf_counter() - start
+    return {'count': len(arguments), 'total_s': elapsed,
+            'per_op_us': elapsed / len(arguments) * 1e6 if arguments else None}
+
+
+# DataTemplate操作计时，每种操作做op_count次
+def time_template_operations(file_path: str, op_count: int, seed: int = 0) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    template = Read3dmFile(file_path, read_option=0).read_3dm_file()
+    tree = template.tree
+    indexes = [each.index for each in template.data_objects if tree.contains(each.index)]
+    names = [each.name for each in template.data_objects if tree.contains(each.index)]
+    top_level = tree.is_branch(tree.root)
+    operations = {}
+    operations['find_by_index'] = time_operation(template.find_object, rng.choices(indexes, k=op_count))
+    operations['find_by_name'] = time_operation(template.find_object, rng.choices(names, k=op_count))
+    # all_elements: 第一次计算子树聚合，第二次命中缓存
+    targets = [template.find_object(each) for each in rng.choices(top_level, k=op_count)]
+    template._subtree_cache.clear()
+    operations['all_elements_cold'] = time_operation(lambda each: each.all_elements(), targets[:1])
+    operations['all_elements_warm'] = time_operation(lambda each: each.all_elements(), targets)
+    # 属性组合查询: 高度区间 + 图层，第一次查询时建索引
+    layers = sorted({element.type for each in template.data_objects for element in each.elements})
+    queries = [dict(height=(low, low + 5), layer=rng.choice(layers)) for low in
+               (rng.uniform(0, 30) for _ in range(op_count))] if layers else []
+    operations['query_objects'] = time_operation(lambda each: template.query_objects(**each), queries)
+
+    next_index = max(each.index for each in template.data_objects) + 1
+    footprint = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+    new_objects = [DataObject(index=next_index + i, elements=[DataElement(geometry=footprint)], global_tree=tree)
+                   for i in range(2 * op_count)]
+    added, inserted = new_objects[:op_count], new_objects[op_count:]
+    operations['add_object'] = time_operation(
+        lambda each: template.add_object(each, rng.choice(indexes)), added)
+    # 插入: 在一个物件和它的一个子物件之间插入新物件
+    pairs = []
+    for each in inserted:
+        parent = rng.choice(indexes)
+        children = tree.is_branch(parent)
+        pairs.append((each, parent, children[0] if children else None))
+    operations['insert_object'] = time_operation(
+        lambda pair: template.insert_object(*pair) if pair[2] is not None else template.add_object(*pair[:2]), pairs)
+    # 移动: 新加的物件挂到随机的顶层物件下
+    operations['move_object'] = time_operation(
+        lambda each: template.move_object(each.index, rng.choice(top_level)), added)
+    operations['all_elements_after_edit'] = time_operation(lambda each: each.all_elements(), targets)
+    operations['delete_object'] = time_operation(lambda each: template.delete_object(each.index), added)
+    return operations
+
+
+def run_case(object_count: int, group_depth: int, vertex_count: int, text_density: float, repeat: int,
+             op_count: int, tmp_dir: str) -> dict:
+    file_path = os.path.join(tmp_dir, f'suite_{object_count}_{group_depth}_{vertex_count}.3dm')
+    start = time.perf_counter()
+    create_synthetic_3dm(file_path, object_count=object_count, group_depth=group_depth, vertex_count=vertex_count,
+                         text_density=text_density)
+    generate_time = time.perf_counter() - start
+    return {
+        'config': {'object_count': object_count, 'group_depth': group_depth, 'vertex_count': vertex_count,
+                   'text_density': text_density, 'repeat': repeat, 'op_count': op_count},
+        'file_bytes': os.path.getsize(file_path),
+        'generate_s': generate_time,
+        'stages_s': time_read_stages(file_path, repeat),
+        'operations': time_template_operations(file_path, op_count),
+    }
+
+
+# 和基准结果对比，返回变慢超过threshold倍的项
+def compare_results(result: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    baseline_cases = {json.dumps(case['config'], sort_keys=True): case for case in baseline['cases']}
+    for case in result['cases']:
+        old = baseline_cases.get(json.dumps(case['config'], sort_keys=True))
+        if old is None:
+            continue
+        label = f"objects={case['config']['object_count']}"
+        for stage, seconds in case['stages_s'].items():
+            old_seconds = old['stages_s'].get(stage)
+            if old_seconds and seconds > old_seconds * threshold:
+                regressions.append(f'{label} stage {stage}: {old_seconds:.4f}s -> {seconds:.4f}s')
+        for name, operation in case['operations'].items():
+            old_us = old['operations'].get(name, {}).get('per_op_us')
+            if old_us and operation['per_op_us'] and operation['per_op_us'] > old_us * threshold:
+                regressions.append(f"{label} op {name}: {old_us:.1f}us -> {operation['per_op_us']:.1f}us")
+    return regressions
+
+
+def run(object_counts: List[int], group_depth: int, vertex_count: int, text_density: float, repeat: int,
+        op_count: int) -> dict:
+    result = {
+        'format_version': RESULT_FORMAT_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count(), 'rhino3dm': getattr(rhino3dm, '__version__', None),
+                        'shapely': shapely.__version__, 'numpy': np.__version__},
+        'cases': [],
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)  # style json写到当前目录，放进临时目录
+        try:
+            for count in object_counts:
+                result['cases'].append(run_case(count, group_depth, vertex_count, text_density, repeat, op_count,
+                                                tmp_dir))
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', default='10000,100000')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--vertices', type=int, default=8)
+    parser.add_argument('--text-density', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--ops', type=int, default=200)
+    parser.add_argument('--output', help='结果json的路径，不传时输出到标准输出')
+    parser.add_argument('--compare', help='作为基准的结果json')
+    parser.add_argument('--threshold', type=float, default=1.2, help='比基准慢多少倍算作退化')
+    args = parser.parse_args()
+    result = run([int(each) for each in args.objects.split(',')], args.depth, args.vertices, args.text_density,
+                 args.repeat, args.ops)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare_results(result, json.load(f), args.threshold)
+        for each in regressions:
+            print('REGRESSION', each, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
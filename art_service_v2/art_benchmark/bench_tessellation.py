@@ -0,0 +1,91 @@
+"""
+对比固定步长(每条曲线PointAt取固定数量的点)和CurveTessellator自适应离散的顶点数、误差和耗时
+自适应离散分别统计冷缓存(第一次离散)和热缓存(重复读取同样的曲线)
+用法: python -m art_benchmark.bench_tessellation [曲线数量] [--segments 64] [--tolerance 0.01]
+"""
+import argparse
+import random
+import time
+from typing import *
+import numpy as np
+import rhino3dm
+import shapely
+from art_3dm_reader.curve_tessellation import CurveTessellator, TessellationCache
+from art_benchmark.bench_object_scan import best_of
+
+
+# 生成各种类型的曲线: 圆弧、圆、三次NURBS、直线+圆弧组成的PolyCurve
+def make_curves(count: int, seed: int = 0) -> Dict[str, List]:
+    rng = random.Random(seed)
+    curves = {'arc': [], 'circle': [], 'nurbs': [], 'polycurve': []}
+    for _ in range(count):
+        x, y = rng.uniform(0, 1000), rng.uniform(0, 1000)
+        radius = rng.choice([0.5, 2, 10, 50])
+        start = rng.uniform(0, np.pi)
+        arc_points = [rhino3dm.Point3d(x + radius * np.cos(start + i), y + radius * np.sin(start + i), 0)
+                      for i in range(3)]
+        curves['arc'].append(rhino3dm.ArcCurve.CreateFromArc(rhino3dm.Arc(*arc_points)))
+        circle = rhino3dm.Circle(rhino3dm.Point3d(x, y, 0), radius)
+        curves['circle'].append(rhino3dm.ArcCurve.CreateFromCircle(circle))
+        points = [rhino3dm.Point3d(x + i * radius, y + rng.uniform(-radius, radius), 0) for i in range(8)]
+        curves['nurbs'].append(rhino3dm.NurbsCurve.Create(False, 3, points))
+        poly_curve = rhino3dm.PolyCurve()
+        poly_curve.Append(rhino3dm.LineCurve(rhino3dm.Point3d(x, y, 0), rhino3dm.Point3d(x + radius, y, 0)))
+        poly_curve.Append(rhino3dm.Arc(rhino3dm.Point3d(x + radius, y, 0),
+                                       rhino3dm.Point3d(x + 2 * radius, y + radius, 0),
+                                       rhino3dm.Point3d(x + 3 * radius, y, 0)))
+        poly_curve.Append(rhino3dm.LineCurve(rhino3dm.Point3d(x + 3 * radius, y, 0), rhino3dm.Point3d(x, y, 0)))
+        curves['polycurve'].append(poly_curve)
+    return curves
+
+
+# 固定步长离散: 在定义域上等分取segments+1个点
+def fixed_step(curve, segments: int) -> np.ndarray:
+    domain = curve.Domain
+    points = [curve.PointAt(t) for t in np.linspace(domain.T0, domain.T1, segments + 1)]
+    return np.array([(point.X, point.Y) for point in points])
+
+
+# 离散结果到曲线的最大距离，用密集采样近似
+def max_deviation(curve, points: np.ndarray, samples: int = 500) -> float:
+    reference = shapely.points(fixed_step(curve, samples))
+    return float(shapely.distance(shapely.linestrings(points), reference).max())
+
+
+def run(count: int, segments: int, tolerance: float, check: int = 50):
+    curves = make_curves(count)
+    print(f'{"type":10s} {"curves":>7s} | {"fixed pts":>9s} {"fixed err":>9s} {"fixed s":>8s} | '
+          f'{"adapt pts":>9s} {"adapt err":>9s} {"cold s":>8s} {"warm s":>8s}')
+    for kind, group in curves.items():
+        fixed_time = best_of(lambda: [fixed_step(curve, segments) for curve in group])
+        fixed = [fixed_step(curve, segments) for curve in group]
+
+        # 冷缓存: 每轮用新的缓存；热缓存: 先离散一遍再计时
+        def cold():
+            tessellator = CurveTessellator(tolerance, cache=TessellationCache())
+            return [tessellator.tessellate(curve) for curve in group]
+
+        cold_time = best_of(cold)
+        tessellator = CurveTessellator(tolerance, cache=TessellationCache())
+        adaptive = [tessellator.tessellate(curve) for curve in group]
+        warm_time = best_of(lambda: [tessellator.tessellate(curve) for curve in group])
+
+        fixed_error = max(max_deviation(curve, points) for curve, points in zip(group[:check], fixed[:check]))
+        adaptive_error = max(max_deviation(curve, points) for curve, points in zip(group[:check], adaptive[:check]))
+        print(f'{kind:10s} {len(group):>7d} | {sum(map(len, fixed)):>9d} {fixed_error:>9.4f} {fixed_time:>8.3f} | '
+              f'{sum(map(len, adaptive)):>9d} {adaptive_error:>9.4f} {cold_time:>8.3f} {warm_time:>8.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='曲线离散对比')
+    parser.add_argument('count', type=int, nargs='?', default=2000, help='每种曲线的数量')
+    parser.add_argument('--segments', type=int, default=64, help='固定步长的分段数')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='自适应离散的弦高误差')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    run(args.count, args.segments, args.tolerance)
+    print(f'total {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == "__main__":
+    main()
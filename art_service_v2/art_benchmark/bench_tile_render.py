@@ -0,0 +1,67 @@
+"""
+瓦片渲染(TileRenderer): 整张图的缩放金字塔冷启动渲染在不同进程数下的耗时，全部命中缓存时的耗时，
+以及修改少量元素之后需要重新渲染的瓦片数和耗时
+用法: python -m art_benchmark.bench_tile_render [对象数量...] [--zooms 0 5] [--workers 1 2 4]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import shapely
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_benchmark.synthetic_3dm import create_synthetic_3dm
+from art_render.tile_renderer import TileRenderer
+
+
+def run(object_count: int, zooms: range, workers_list: list, tmp_dir: str, edit_count: int = 10):
+    file_path = create_synthetic_3dm(os.path.join(tmp_dir, f'tiles_{object_count}.3dm'), object_count=object_count)
+    template = Read3dmFile(file_path).read_3dm_file()
+    print(f'objects={object_count:>7}  elements={len(template._element_index)}  zooms={zooms.start}-{zooms.stop - 1}'
+          f'  cpus={os.cpu_count()}')
+    cache_dir = os.path.join(tmp_dir, 'tile_cache')
+    base_time = None
+    for workers in workers_list:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        renderer = TileRenderer(template, cache_dir=cache_dir, max_workers=workers)
+        start = time.perf_counter()
+        result = renderer.render(zooms)
+        seconds = time.perf_counter() - start
+        base_time = base_time or seconds
+        print(f'    cold  workers={workers:>2d}  tiles={result.rendered:>6d}  plan={result.plan_seconds:6.2f}s  '
+              f'render={result.render_seconds:6.2f}s  total={seconds:6.2f}s  speedup={base_time / seconds:4.2f}x')
+
+    # 全部命中缓存: 只有选元素和计算缓存键
+    start = time.perf_counter()
+    result = renderer.render(zooms)
+    print(f'    warm  tiles={len(result.tiles):>6d}  cached={result.cached:>6d}  '
+          f'total={time.perf_counter() - start:6.2f}s')
+
+    # 修改少量元素之后只有包含它们的瓦片需要重新渲染
+    elements = [element for element, _ in template._element_index.values() if element.geometry is not None]
+    for element in elements[::max(1, len(elements) // edit_count)][:edit_count]:
+        template.update_element(element.id, geometry=shapely.affinity.translate(element.geometry, 1.0, 0.0))
+    start = time.perf_counter()
+    result = renderer.render(zooms)
+    print(f'    edit {edit_count} elements  rendered={result.rendered:>6d} ({result.rendered / len(result.tiles):5.1%})'
+          f'  total={time.perf_counter() - start:6.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='瓦片渲染')
+    parser.add_argument('counts', type=int, nargs='*', default=[20000])
+    parser.add_argument('--zooms', type=int, nargs=2, default=[0, 5], metavar=('MIN', 'MAX'))
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)  # style.json写到临时文件夹
+        try:
+            for count in args.counts:
+                run(count, range(args.zooms[0], args.zooms[1] + 1), args.workers, tmp_dir)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+用rhino3dm生成测试用的合成3dm文件
+每一栋"建筑"是一个叶子group，里面有若干条曲线和可选的TextDot标注，叶子group逐级嵌套到上层group中
+"""
+import math
+import random
+import rhino3dm
+
+
+def create_synthetic_3dm(file_path: str, object_count: int = 10000, group_depth: int = 3, vertex_count: int = 8,
+                         text_density: float = 0.5, objects_per_group: int = 4, branching: int = 4,
+                         layer_count: int = 8, seed: int = 0) -> str:
+    """
+    生成一个合成的3dm文件
+    :param file_path: 输出路径
+    :param object_count: 曲线对象的数量(不包括TextDot)
+    :param group_depth: 编组嵌套深度(1表示只有叶子group)
+    :param vertex_count: 每条多段线的顶点数
+    :param text_density: 叶子group带TextDot标注的概率
+    :param objects_per_group: 每个叶子group中的曲线数量
+    :param branching: 每个上层group下面的子group数量
+    :param layer_count: 图层数量
+    :param seed: 随机种子
+    :return: file_path
+    """
+    rng = random.Random(seed)
+    doc = rhino3dm.File3dm()
+    for i in range(layer_count):
+        layer = rhino3dm.Layer()
+        layer.Name = f'layer_{i}'
+        doc.Layers.Add(layer)
+
+    # (层级, 该层级内的序号) -> group index
+    group_indexes = {}
+
+    def get_group(level: int, number: int) -> int:
+        key = (level, number)
+        if key not in group_indexes:
+            group = rhino3dm.Group()
+            group.Name = f'group_{level}_{number}'
+            doc.Groups.Add(group)
+            group_indexes[key] = len(group_indexes)
+        return group_indexes[key]
+
+    building_count = max(1, math.ceil(object_count / objects_per_group))
+    side = math.ceil(math.sqrt(building_count))
+    created = 0
+    for building in range(building_count):
+        # group list: 叶子group在前，上层group在后
+        attributes = rhino3dm.ObjectAttributes()
+        attributes.LayerIndex = building % layer_count
+        for level in range(group_depth):
+            attributes.AddToGroup(get_group(level, building // branching ** level))
+        origin_x = (building % side) * 100.0
+        origin_y = (building // side) * 100.0
+        for k in range(min(objects_per_group, object_count - created)):
+            radius = 10.0 + 5.0 * k + rng.random()
+            points = rhino3dm.Point3dList()
+            for v in range(vertex_count):
+                angle = 2 * math.pi * v / vertex_count
+                points.Add(origin_x + radius * math.cos(angle), origin_y + radius * math.sin(angle), 0)
+            if k == 0:
+                # 第一条是闭合的建筑轮廓
+                points.Add(origin_x + radius, origin_y, 0)
+                doc.Objects.AddPolyline(points, attributes)
+            elif k % 2 == 1:
+                doc.Objects.AddPolyline(points, attributes)
+            else:
+                doc.Objects.AddLine(rhino3dm.Point3d(origin_x, origin_y, 0),
+                                    rhino3dm.Point3d(origin_x + radius, origin_y + radius, 0), attributes)
+            created += 1
+        if rng.random() < text_density:
+            height = round(rng.uniform(3.0, 100.0), 1)
+            floor = max(1, int(height // 3))
+            doc.Objects.AddTextDot(f'H = {height}m, {floor}F', rhino3dm.Point3d(origin_x, origin_y, 0), attributes)
+    doc.Write(file_path, 7)
+    return file_path
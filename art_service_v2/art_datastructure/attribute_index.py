@@ -0,0 +1,238 @@
+"""
+@ART DataObject属性的索引，用于按高度、层数、图层、名字、子树组合查询
+物件按data_objects的顺序编号成行，每一列是一个数组:
+  - 高度/层数: 列数组 + 排好序的(值, 行号)，范围查询用二分查找
+  - 名字: 名字 -> 行号数组的哈希表，通配符只对去重后的名字匹配一次
+  - 图层: 图层 -> 有该图层元素的物件行号(有序)
+  - 子树: 行号 -> 树中的位置，子树是先序数组中连续的一段(Hierarchy的entry/exit)
+查询时先用各条件的索引估计命中数量，从最少的那个条件取候选行，其余条件直接在候选行上按列判断
+物件/元素增删时整体失效，下次查询时重建；移动物件不需要重建(位置不变，entry/exit查询时从树上取)
+直接修改物件的height/floor/name之后需要调用invalidate(DataTemplate.update_object会自动处理)
+"""
+import fnmatch
+import re
+from typing import *
+import numpy as np
+
+# 名字中包含这些字符时按通配符匹配
+WILDCARD_CHARS = '*?['
+
+
+# 范围条件统一成(下界, 上界)，标量表示等于
+def _as_range(value) -> Tuple[Optional[float], Optional[float]]:
+    if isinstance(value, (tuple, list)):
+        if len(value) != 2:
+            raise Exception("范围条件必须是(下界, 上界)")
+        return value[0], value[1]
+    return value, value
+
+
+# 有序数组中是否包含每个值
+def _sorted_contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+
+class _RangeColumn:
+    """
+    一列数值以及它的排序索引
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.order = np.argsort(values, kind='stable')
+        self.sorted_values = values[self.order]
+
+    # 命中行在排序数组中的区间
+    def span(self, low, high) -> Tuple[int, int]:
+        start = 0 if low is None else int(np.searchsorted(self.sorted_values, low, side='left'))
+        stop = len(self.sorted_values) if high is None else int(np.searchsorted(self.sorted_values, high,
+                                                                                  side='right'))
+        return start, max(start, stop)
+
+    def rows(self, low, high) -> np.ndarray:
+        start, stop = self.span(low, high)
+        return self.order[start:stop]
+
+    def test(self, rows: np.ndarray, low, high) -> np.ndarray:
+        values = self.values[rows]
+        mask = np.ones(len(rows), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+
+class AttributeIndex:
+    def __init__(self, template):
+        """
+        :param template: 所属的DataTemplate
+        """
+        self._template = template
+        self._objects = []  # 行号 -> DataObject
+        self._height = self._floor = None  # _RangeColumn
+        self._name_rows = {}  # 名字 -> 行号数组
+        self._name_codes = None  # 行号 -> 名字编号
+        self._name_table = []  # 名字编号 -> 名字
+        self._layer_rows = {}  # 图层 -> 有序的行号数组
+        self._positions = None  # 行号 -> 树中的位置，不在树中为-1
+        self._row_of_position = None  # 树中的位置 -> 行号，没有对应物件为-1
+        self._dirty = True
+
+    def __len__(self):
+        self._refresh()
+        return len(self._objects)
+
+    # 下次查询时整体重建
+    def invalidate(self):
+        self._dirty = True
+
+    def _refresh(self):
+        if self._dirty:
+            self._rebuild()
+
+    def _rebuild(self):
+        template = self._template
+        objects = list(template.data_objects or [])
+        self._objects = objects
+        self._height = _RangeColumn(np.array([each.height for each in objects], dtype=np.float64))
+        self._floor = _RangeColumn(np.array([each.floor for each in objects], dtype=np.int64))
+        # 名字编码成整数列
+        name_codes, name_table = {}, []
+        codes = np.empty(len(objects), dtype=np.int64)
+        for row, each in enumerate(objects):
+            code = name_codes.get(each.name)
+            if code is None:
+                code = name_codes[each.name] = len(name_table)
+                name_table.append(each.name)
+            codes[row] = code
+        self._name_codes, self._name_table = codes, name_table
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(name_table) + 1))
+        self._name_rows = {name: order[bounds[code]:bounds[code + 1]] for code, name in enumerate(name_table)}
+        # 图层 -> 物件行号，行号按顺序加入所以天然有序
+        layer_rows = {}
+        for row, each in enumerate(objects):
+            for layer in {element.type for element in each.elements}:
+                layer_rows.setdefault(layer, []).append(row)
+        self._layer_rows = {layer: np.asarray(rows, dtype=np.int64) for layer, rows in layer_rows.items()}
+        # 树中的位置: 先让树完成重建(可能重新编号)，再记录位置
+        tree = template.tree
+        self._positions = np.full(len(objects), -1, dtype=np.int64)
+        if tree is not None and tree.root is not None:
+            tree.order
+            for row, each in enumerate(objects):
+                if tree.contains(each.index):
+                    self._positions[row] = tree.position(each.index)
+            self._row_of_position = np.full(len(tree.parent_array), -1, dtype=np.int64)
+            in_tree = np.flatnonzero(self._positions >= 0)
+            self._row_of_position[self._positions[in_tree]] = in_tree
+        else:
+            self._row_of_position = np.empty(0, dtype=np.int64)
+        self._dirty = False
+
+    # 名字条件对应的名字编号，通配符对去重后的名字匹配
+    def _name_code_set(self, name: str) -> np.ndarray:
+        if any(char in name for char in WILDCARD_CHARS):
+            pattern = re.compile(fnmatch.translate(name))
+            return np.array([code for code, each in enumerate(self._name_table)
+                             if each is not None and pattern.match(each)], dtype=np.int64)
+        rows = self._name_rows.get(name)
+        if rows is None:
+            return np.empty(0, dtype=np.int64)
+        return np.array([self._name_codes[rows[0]]], dtype=np.int64)
+
+    # 图层条件(一个或多个图层，满足任意一个)对应的有序行号
+    def _layer_union(self, layer: Union[str, Iterable[str]]) -> np.ndarray:
+        layers = [layer] if isinstance(layer, str) else list(layer)
+        parts = [self._layer_rows[each] for each in layers if each in self._layer_rows]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+    # 子树在先序数组中的区间，不在树中时为None
+    def _scope_span(self, within) -> Optional[Tuple[int, int]]:
+        tree = self._template.tree
+        if tree is None or not tree.contains(within):
+            return None
+        position = tree.position(within)
+        return int(tree.entry[position]), int(tree.exit[position])
+
+    def query_rows(self, height=None, floor=None, name: str = None, layer: Union[str, Iterable[str]] = None,
+                   within=None) -> np.ndarray:
+        """
+        满足所有条件的物件行号(有序)
+        :param height: 高度，(下界, 上界)闭区间，某一端为None表示不限；标量表示等于
+        :param floor: 层数，同height
+        :param name: 名字，包含*?[时按通配符匹配
+        :param layer: 图层名或者图层名列表，物件自己的元素中有其中任意一个图层
+        :param within: 物件index，只在它的子树(包含自己)中查找
+        :return: 行号数组
+        """
+        self._refresh()
+        # 每个条件: (估计的命中数量, 取候选行的函数, 在候选行上判断的函数)
+        conditions = []
+        for value, column in ((height, self._height), (floor, self._floor)):
+            if value is None:
+                continue
+            low, high = _as_range(value)
+            start, stop = column.span(low, high)
+            conditions.append((stop - start, lambda column=column, low=low, high=high: column.rows(low, high),
+                               lambda rows, column=column, low=low, high=high: column.test(rows, low, high)))
+        if name is not None:
+            codes = self._name_code_set(name)
+            table = self._name_table
+            count = sum(len(self._name_rows[table[code]]) for code in codes.tolist())
+            conditions.append((count, lambda codes=codes: np.concatenate(
+                [self._name_rows[table[code]] for code in codes.tolist()] or [np.empty(0, dtype=np.int64)]),
+                               lambda rows, codes=codes: np.isin(self._name_codes[rows], codes)))
+        if layer is not None:
+            layer_rows = self._layer_union(layer)
+            conditions.append((len(layer_rows), lambda: layer_rows,
+                               lambda rows: _sorted_contains(layer_rows, rows)))
+        if within is not None:
+            span = self._scope_span(within)
+            if span is None:
+                return np.empty(0, dtype=np.int64)
+            tree = self._template.tree
+            start, stop = span
+
+            def scope_rows():
+                rows = self._row_of_position[tree.order[start:stop]]
+                return rows[rows >= 0]
+
+            def scope_test(rows):
+                positions = self._positions[rows]
+                entry = np.where(positions >= 0, tree.entry[np.maximum(positions, 0)], -1)
+                return (entry >= start) & (entry < stop)
+
+            conditions.append((stop - start, scope_rows, scope_test))
+        if not conditions:
+            return np.arange(len(self._objects), dtype=np.int64)
+        # 命中最少的条件取候选，其余条件逐个过滤
+        conditions.sort(key=lambda each: each[0])
+        rows = conditions[0][1]()
+        for _, _, test in conditions[1:]:
+            if len(rows) == 0:
+                break
+            rows = rows[test(rows)]
+        return np.sort(rows)
+
+    # 满足条件的物件，按data_objects的顺序
+    def query_objects(self, **conditions) -> List:
+        rows = self.query_rows(**conditions)  # 先查询(可能重建)再取物件列表
+        objects = self._objects
+        return [objects[row] for row in rows.tolist()]
+
+    # 满足条件的物件中满足图层条件的元素 -> [(DataElement, DataObject)]
+    def query_elements(self, **conditions) -> List[Tuple]:
+        layer = conditions.get('layer')
+        layers = None if layer is None else ({layer} if isinstance(layer, str) else set(layer))
+        result = []
+        for one_object in self.query_objects(**conditions):
+            result.extend((element, one_object) for element in one_object.elements
+                          if layers is None or element.type in layers)
+        return result
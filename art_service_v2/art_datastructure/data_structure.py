@@ -1,11 +1,23 @@
 """
 @ART 基础数据数据结构
 """
+import logging
 from uuid import uuid1, UUID
 from dataclasses import dataclass, field
 from typing import *
+import numpy as np
+import shapely
 from shapely.geometry import Point, LineString, Polygon
-from treelib import Tree
+from art_datastructure.attribute_index import AttributeIndex
+from art_datastructure.hierarchy import Hierarchy
+from art_datastructure.metrics import MetricsCollector, instrumented
+from art_datastructure.spatial_index import SpatialIndex
+from art_datastructure.element_store import ElementStore, ElementView
+from art_datastructure.shadow import ShadowEngine
+from art_datastructure.massing import MassingEngine, MassingMetrics, SiteReport
+from art_datastructure.geometry_pyramid import GeometryPyramid
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(order=True, unsafe_hash=True)
@@ -25,6 +37,37 @@ class DataElement:
     has_shadow: bool = field(default=False)  # 几何对象是否有阴影
 
 
+# 一组元素几何的总外包框，没有几何时为None
+def _geometry_bounds(elements: List[DataElement]) -> Optional[Tuple[float, float, float, float]]:
+    geometries = [each.geometry for each in elements if each.geometry is not None]
+    if not geometries:
+        return None
+    return tuple(shapely.total_bounds(np.array(geometries, dtype=object)).tolist())
+
+
+# 合并两个外包框
+def _merge_bounds(bounds_a, bounds_b):
+    if bounds_a is None:
+        return bounds_b
+    if bounds_b is None:
+        return bounds_a
+    return (min(bounds_a[0], bounds_b[0]), min(bounds_a[1], bounds_b[1]),
+            max(bounds_a[2], bounds_b[2]), max(bounds_a[3], bounds_b[3]))
+
+
+# 由元素的group list得到每个group的父节点: group list是从下往上排的，倒过来从最上层开始；
+# 字典的插入顺序保证父节点先于子节点，最上层group的父节点是"root"
+def group_parent_map(group_lists: Iterable[tuple]) -> dict:
+    parent_map = {}
+    for each in set(filter(lambda each: len(each) > 0, group_lists)):
+        parent = "root"
+        for group_index in reversed(each):
+            if group_index not in parent_map:
+                parent_map[group_index] = parent
+            parent = group_index
+    return parent_map
+
+
 @dataclass(order=True, unsafe_hash=True)
 class DataObject:
     """
@@ -39,14 +82,18 @@ class DataObject:
     id: str = field(default_factory=uuid1)  # 物件ID
     index: int = field(default=0)  # 組索引
     name: str = field(default=None)  # 编组名字
-    global_tree: Tree = field(default_factory=Tree)  # 全局树
+    global_tree: Hierarchy = field(default_factory=Hierarchy)  # 全局树
     floor: int = field(default=0)  # 层数
     height: float = field(default=0.0)  # 高度
     annotations: str = field(default=None)  # 所有文字标注
+    attributes: dict = field(default_factory=dict)  # 从文字标注中解析出的其他标签
 
     # 基准渲染层级
     zorder: int = field(default=0)
 
+    # 所属的DataTemplate，用于同步它的索引
+    template: Any = field(default=None, repr=False, compare=False)
+
     @property
     def tree(self):
         if self.index in self.global_tree.nodes:
@@ -54,43 +101,311 @@ class DataObject:
         else:
             return None
 
+    # 所属DataTemplate的操作统计
+    @property
+    def metrics(self) -> Optional[MetricsCollector]:
+        return self.template.metrics if self.template is not None else None
+
+    # 在DataTemplate的树中时，使用它缓存的子树聚合结果
+    def _subtree_aggregate(self) -> Optional[tuple]:
+        if self.template is not None and self.template.tree is not None and self.template.tree.contains(self.index):
+            return self.template._subtree_aggregate(self.index)
+        return None
+
+    # 遍历自己+下级的所有DataObject，子树是先序数组中连续的一段，不复制子树
+    def iter_subtree(self) -> Iterator['DataObject']:
+        if self.index not in self.global_tree.nodes:
+            return
+        for nid in self.global_tree.subtree_identifiers(self.index):
+            yield self.global_tree[nid].data
+
     # 自己+下级的所有DataElement
+    @instrumented('all_elements', count=len)
     def all_elements(self) -> List[DataElement]:
+        aggregate = self._subtree_aggregate()
+        if aggregate is not None:
+            return list(aggregate[0])
         elements = []
-        object_nodes = self.tree.all_nodes()
-        for node in object_nodes:
-            elements.extend(node.data.elements)
+        for each in self.iter_subtree():
+            elements.extend(each.elements)
         return elements
 
     # 自己+下级的所有DataObject
+    @instrumented('all_objects', count=len)
     def all_objects(self) -> List[DataElement]:
-        objects = []
-        object_nodes = self.tree.all_nodes()
-        for node in object_nodes:
-            objects.append(node.data)
-        return objects
+        aggregate = self._subtree_aggregate()
+        if aggregate is not None:
+            return list(aggregate[1])
+        return list(self.iter_subtree())
+
+    # 自己+下级的DataElement数量
+    def element_count(self) -> int:
+        aggregate = self._subtree_aggregate()
+        if aggregate is not None:
+            return len(aggregate[0])
+        return len(self.all_elements())
+
+    # 自己+下级所有DataElement的总外包框(min_x, min_y, max_x, max_y)，没有几何时为None
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        aggregate = self._subtree_aggregate()
+        if aggregate is not None:
+            return aggregate[2]
+        return _geometry_bounds(self.all_elements())
 
     # 添加element
-    def add_element(self, element: DataElement):
-        if isinstance(element, DataElement) and element.geometry is not None:
+    def add_element(self, element: Union[DataElement, ElementView]):
+        if isinstance(element, (DataElement, ElementView)) and element.geometry is not None:
             self.elements.append(element)
+            if self.template is not None:
+                self.template._register_element(element, self)
         else:
             raise Exception("物件中没有输入的元素ID")
 
     # 删除element
     def delete_element(self, element_id: str):
-        if element_id in [item.id for item in self.elements]:
-            index = max(self.elements, key=lambda x: x.id == element_id)
-            self.elements.remove(index)
-        else:
+        element, owner = None, None
+        if self.template is not None:
+            element, owner = self.template._element_index.get(element_id, (None, None))
+        # 不在索引中(比如直接往elements里append的)再扫一遍自己的元素
+        if owner is not self:
+            element = next((item for item in self.elements if item.id == element_id), None)
+        if element is None:
             raise Exception("物件中没有输入的元素ID")
+        # 按对象身份定位，不走dataclass的逐字段比较
+        position = list(map(id, self.elements)).index(id(element))
+        del self.elements[position]
+        if owner is self:
+            self.template._unregister_element(element_id)
 
 
 class DataTemplate:
-    def __init__(self, tree=None, data_objects=None):
+    def __init__(self, tree=None, data_objects=None, element_store: ElementStore = None,
+                 metrics: MetricsCollector = None):
         self.tree = tree
+        self.metrics = metrics  # 操作统计，None时不统计
         self.data_objects = data_objects
+        self.element_store = element_store  # 列式存储时元素的ElementStore
+        # 哈希索引，增删改物件和元素时同步维护
+        self._object_index = {}  # 物件index -> DataObject
+        self._name_index = {}  # 物件名字 -> [DataObject]
+        self._element_index = {}  # 元素id -> (DataElement, 所属DataObject)
+        self._spatial_index = None  # 第一次空间查询时再建
+        self._attribute_index = None  # 第一次属性查询时再建
+        self._shadow_engine = None  # 第一次计算阴影时再建
+        self._massing_engine = None  # 第一次计算体量指标时再建
+        self._geometry_pyramid = None  # 第一次按比例查询时再建
+        # 子树聚合缓存 物件index -> (所有元素, 所有物件, 总外包框)
+        # 父节点有缓存时子节点一定也有缓存，失效时从节点沿祖先链往上清除
+        self._subtree_cache = {}
+        if data_objects is not None:
+            for each in data_objects:
+                self._index_object(each)
+
+    # 把物件和它的元素放进索引
+    def _index_object(self, one_object: DataObject):
+        self._object_index[one_object.index] = one_object
+        self._invalidate_attribute_index()
+        self._name_index.setdefault(one_object.name, []).append(one_object)
+        self._register_elements(one_object.elements, one_object)
+        self._invalidate_massing()
+        one_object.template = self
+
+    # 把物件和它的元素从索引中移除
+    def _unindex_object(self, one_object: DataObject):
+        if self._object_index.get(one_object.index) is one_object:
+            del self._object_index[one_object.index]
+        same_name = self._name_index.get(one_object.name, [])
+        same_name[:] = [each for each in same_name if each is not one_object]
+        if not same_name:
+            self._name_index.pop(one_object.name, None)
+        self._invalidate_attribute_index()
+        for element in one_object.elements:
+            if self._element_index.get(element.id, (None, None))[1] is one_object:
+                self._unregister_element(element.id)
+        self._invalidate_massing()
+        one_object.template = None
+
+    # 元素索引和空间索引同步登记
+    def _register_element(self, element: DataElement, owner: DataObject):
+        self._element_index[element.id] = (element, owner)
+        self._invalidate_subtree_cache(owner.index)
+        self._invalidate_attribute_index()
+        if self._spatial_index is not None:
+            self._spatial_index.add(element)
+        if self._geometry_pyramid is not None:
+            self._geometry_pyramid.add(element)
+        if self._shadow_engine is not None:
+            self._shadow_engine.invalidate()
+        self._invalidate_massing(owner.index, footprint=True)
+
+    # 批量登记同一个物件的元素，缓存和阴影只失效一次
+    def _register_elements(self, elements: List[DataElement], owner: DataObject):
+        if not elements:
+            return
+        self._element_index.update((element.id, (element, owner)) for element in elements)
+        self._invalidate_subtree_cache(owner.index)
+        self._invalidate_attribute_index()
+        if self._spatial_index is not None:
+            for element in elements:
+                self._spatial_index.add(element)
+        if self._geometry_pyramid is not None:
+            self._geometry_pyramid.extend(elements)
+        if self._shadow_engine is not None:
+            self._shadow_engine.invalidate()
+        self._invalidate_massing(owner.index, footprint=True)
+
+    def _unregister_element(self, element_id):
+        _, owner = self._element_index.pop(element_id)
+        self._invalidate_subtree_cache(owner.index)
+        self._invalidate_attribute_index()
+        if self._spatial_index is not None:
+            self._spatial_index.remove(element_id)
+        if self._geometry_pyramid is not None:
+            self._geometry_pyramid.remove(element_id)
+        if self._shadow_engine is not None:
+            self._shadow_engine.invalidate()
+        self._invalidate_massing(owner.index, footprint=True)
+
+    # 计算(或者从缓存中取)一个物件子树的聚合结果
+    def _subtree_aggregate(self, index) -> tuple:
+        cache = self._subtree_cache
+        if index in cache:
+            return cache[index]
+        # 迭代的后序遍历，子节点先算完再算父节点；子节点顺序和expand_tree的先序一致
+        stack = [(index, False)]
+        while stack:
+            nid, children_done = stack.pop()
+            if nid in cache:
+                continue
+            children = self.tree.sorted_children(nid)
+            if not children_done:
+                stack.append((nid, True))
+                stack.extend((child, False) for child in reversed(children) if child not in cache)
+                continue
+            one_object = self.tree[nid].data
+            elements = list(one_object.elements)
+            objects = [one_object]
+            bounds = _geometry_bounds(one_object.elements)
+            for child in children:
+                child_elements, child_objects, child_bounds = cache[child]
+                elements.extend(child_elements)
+                objects.extend(child_objects)
+                bounds = _merge_bounds(bounds, child_bounds)
+            cache[nid] = (elements, objects, bounds)
+        return cache[index]
+
+    # 清除一个物件以及它所有祖先的聚合缓存
+    def _invalidate_subtree_cache(self, index):
+        nid = index
+        while nid in self._subtree_cache:
+            del self._subtree_cache[nid]
+            parent = self.tree.parent(nid)
+            nid = parent.identifier if parent is not None else None
+
+    # 体量指标失效: 物件index为None表示物件增删或者树结构改变，footprint表示物件的元素改变
+    def _invalidate_massing(self, object_index=None, footprint: bool = False):
+        if self._massing_engine is not None:
+            self._massing_engine.invalidate(object_index, footprint=footprint)
+
+    # 物件或者元素增删之后属性索引整体失效
+    def _invalidate_attribute_index(self):
+        if self._attribute_index is not None:
+            self._attribute_index.invalidate()
+
+    # 空间索引，第一次访问时创建
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self._element_index)
+        return self._spatial_index
+
+    # 属性索引，第一次访问时创建
+    @property
+    def attribute_index(self) -> AttributeIndex:
+        if self._attribute_index is None:
+            self._attribute_index = AttributeIndex(self)
+        return self._attribute_index
 
+    # 阴影计算，第一次访问时创建
+    @property
+    def shadow_engine(self) -> ShadowEngine:
+        if self._shadow_engine is None:
+            self._shadow_engine = ShadowEngine(self)
+        return self._shadow_engine
+
+    # 计算一个太阳位置下每个物件的阴影，并写回DataElement.shadow -> {物件index: 阴影}
+    @instrumented('compute_shadows', count=len)
+    def compute_shadows(self, azimuth: float, altitude: float) -> Dict[int, Any]:
+        return self.shadow_engine.compute(azimuth, altitude)
+
+    # 体量指标，第一次访问时创建
+    @property
+    def massing_engine(self) -> MassingEngine:
+        if self._massing_engine is None:
+            self._massing_engine = MassingEngine(self)
+        return self._massing_engine
+
+    # 物件子树汇总的基底面积/建筑面积/体积
+    @instrumented('object_massing')
+    def object_massing(self, object_index: int) -> MassingMetrics:
+        return self.massing_engine.subtree_metrics(object_index)
+
+    # 整个场地的总指标、容积率和建筑密度，site_area/site_layer见MassingEngine.site_report
+    @instrumented('site_report')
+    def site_report(self, site_area: float = None, site_layer: str = None) -> SiteReport:
+        return self.massing_engine.site_report(site_area=site_area, site_layer=site_layer)
+
+    # 几何的多级简化，第一次访问时创建，各级在第一次使用时再计算
+    @property
+    def geometry_pyramid(self) -> GeometryPyramid:
+        if self._geometry_pyramid is None:
+            self._geometry_pyramid = GeometryPyramid(self._element_index)
+        return self._geometry_pyramid
+
+    # 视口内的元素以及适合该比例的简化几何 units_per_pixel: 每个像素对应的图纸长度
+    # -> [(简化后的几何, DataElement, DataObject)]
+    @instrumented('query_lod', count=len)
+    def query_lod(self, min_x: float, min_y: float, max_x: float, max_y: float,
+                  units_per_pixel: float) -> List[Tuple]:
+        pyramid = self.geometry_pyramid
+        return pyramid.simplified(self.spatial_index.query_bbox(min_x, min_y, max_x, max_y),
+                                  pyramid.level_for_scale(units_per_pixel))
+
+    # 外包框与bbox相交的元素 -> [(DataElement, DataObject)]
+    @instrumented('query_bbox', count=len)
+    def query_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Tuple]:
+        return self.spatial_index.query_bbox(min_x, min_y, max_x, max_y)
+
+    # 与geometry相交的元素 -> [(DataElement, DataObject)]
+    @instrumented('query_intersects', count=len)
+    def query_intersects(self, geometry) -> List[Tuple]:
+        return self.spatial_index.query_intersects(geometry)
+
+    # 与geometry距离不超过distance的元素 -> [(DataElement, DataObject)]
+    @instrumented('query_within_distance', count=len)
+    def query_within_distance(self, geometry, distance: float) -> List[Tuple]:
+        return self.spatial_index.query_within_distance(geometry, distance)
+
+    # 离geometry最近的k个元素 -> [(DataElement, DataObject)]
+    @instrumented('query_nearest', count=len)
+    def query_nearest(self, geometry, k: int = 1) -> List[Tuple]:
+        return self.spatial_index.query_nearest(geometry, k)
+
+    # 按属性组合查询物件，条件之间是"且"的关系，结果按data_objects的顺序
+    # height/floor: (下界, 上界)闭区间或者标量; name: 名字或通配符; layer: 图层名或列表; within: 子树根的物件index
+    @instrumented('query_objects', count=len)
+    def query_objects(self, height=None, floor=None, name: str = None, layer: Union[str, Iterable[str]] = None,
+                      within: int = None) -> List[DataObject]:
+        return self.attribute_index.query_objects(height=height, floor=floor, name=name, layer=layer, within=within)
+
+    # 按属性组合查询元素(条件同query_objects，layer同时过滤元素) -> [(DataElement, DataObject)]
+    @instrumented('query_elements', count=len)
+    def query_elements(self, height=None, floor=None, name: str = None, layer: Union[str, Iterable[str]] = None,
+                       within: int = None) -> List[Tuple]:
+        return self.attribute_index.query_elements(height=height, floor=floor, name=name, layer=layer,
+                                                   within=within)
+
+    @instrumented('assemble_tree', count=lambda template: len(template.data_objects))
     def assemble_tree(self, data_elements: List[DataElement], data_objects: dict):
         """
         用于组装data_objects的关系树，传入是目前已有的element元素以及obj字典
@@ -98,31 +413,23 @@ class DataTemplate:
         :param data_objects:
         :return:
         """
-        group_info = [each.group_list for each in data_elements]
-        group_info = list(set(filter(lambda each: len(each) > 0, group_info)))
+        # 先用字典记录每个group的父节点: 字典本身就是成员索引，插入顺序保证父节点先于子节点
+        parent_map = group_parent_map(tuple(each.group_list) for each in data_elements)
 
-        # 先构造一个全局的树，包含所有的树结构和层级
-        global_tree = Tree()  # 全局树
+        # 再构造一个全局的树，包含所有的树结构和层级
+        global_tree = Hierarchy()  # 全局树
         global_tree.create_node("global_tree", "root")
-        # 组装树
-        for each in group_info:
-            cur_order = list(each)
-            cur_order.reverse()
-            for i in range(len(cur_order)):
-                all_node_tag = [node.tag for node in global_tree.all_nodes()]
-                if i == 0 and cur_order[i] not in all_node_tag:
-                    global_tree.create_node(cur_order[i], cur_order[i], parent="root", data=data_objects[cur_order[i]])
-                elif i != 0 and cur_order[i] not in all_node_tag:
-                    global_tree.create_node(cur_order[i], cur_order[i], parent=cur_order[i - 1],
-                                            data=data_objects[cur_order[i]])
+        for group_index, parent in parent_map.items():
+            global_tree.create_node(group_index, group_index, parent=parent, data=data_objects[group_index])
 
         # 创建DataTemplate
         self.tree = global_tree
         self.data_objects = [value for value in data_objects.values()]
 
-        # 遍历全部data_objects对象，把全局树先放进去
+        # 遍历全部data_objects对象，把全局树先放进去，同时建立索引
         for each in data_objects.values():
             each.global_tree = self.tree
+            self._index_object(each)
         return self
 
     # # 查找指定物件
@@ -142,23 +449,28 @@ class DataTemplate:
     #     return target_object
 
     # 查找指定物件
+    @instrumented('find_object')
     def find_object(self, arg):
+        target_object = None
         if isinstance(arg, int):
-            target = self.tree.expand_tree(filter=lambda x: x.identifier == arg)  # 这里还需要需要修改一下！！！
-            for i in target:
-                target_object = i
-            print("找到物件index, 物件{}".format(target_object))
+            target_object = self._object_index.get(arg)
         elif isinstance(arg, str):
-            print(self.tree)
-            target = self.tree.expand_tree(filter=lambda x: x.data.name == arg)  # 这里还需要需要修改一下！！！
-            for i in target:
-                target_object = i
-            print("找到物件name, 物件{}".format(target_object))
-        else:
-            target_object = None
-            print("没有找到任何信息为{}的物件".format(arg))
+            same_name = self._name_index.get(arg)
+            if same_name:
+                target_object = same_name[0]
+        if target_object is None:
+            logger.debug("没有找到任何信息为%s的物件", arg)
         return target_object
 
+    # 按名字查找所有同名物件
+    @instrumented('find_objects_by_name', count=len)
+    def find_objects_by_name(self, name: str) -> List[DataObject]:
+        return list(self._name_index.get(name, []))
+
+    # 按元素id查找元素以及它所属的物件
+    def find_element(self, element_id) -> Tuple[DataElement, DataObject]:
+        return self._element_index.get(element_id, (None, None))
+
     # # 查找指定物件
     # def find_object(self, arg):
     #     if isinstance(arg, int):
@@ -179,36 +491,156 @@ class DataTemplate:
 
     # 查重object
     def _check_repetition(self, one_object: DataObject):
-        for node in self.tree.all_nodes():
-            if one_object.index == node.identifier:
-                raise Exception("输入物件已经包含在一个副物件中")
-            else:
-                pass
+        if one_object.index in self._object_index:
+            raise Exception("输入物件已经包含在一个副物件中")
 
-    # 添加object
-    def add_object(self, one_object: DataObject, parent_index: int):
+    # 添加object，parent_index为None时物件不放进树中(和没有元素的group一样)
+    @instrumented('add_object')
+    def add_object(self, one_object: DataObject, parent_index: Optional[int]):
         self._check_repetition(one_object)
-        self.tree.create_node(tag=one_object.index, identifier=one_object.index, parent=parent_index, data=one_object)
+        if parent_index is not None:
+            self.tree.create_node(tag=one_object.index, identifier=one_object.index, parent=parent_index,
+                                  data=one_object)
+            self._invalidate_subtree_cache(parent_index)
         self.data_objects.append(one_object)
+        one_object.global_tree = self.tree
+        self._index_object(one_object)
 
     # 插入object
+    @instrumented('insert_object')
     def insert_object(self, one_object: DataObject, parent_index: int, child_index: int):
         self._check_repetition(one_object)
         self.add_object(one_object, parent_index)
         self.move_object(child_index, one_object.index)
 
     # 删除object
+    @instrumented('delete_object')
     def delete_object(self, arg):
         obj = self.find_object(arg)
         if obj is not None:
-            removed_objects = obj.all_objects()
             if self.tree.contains(obj.index):
+                removed_objects = obj.all_objects()
+                parent = self.tree.parent(obj.index)
+                if parent is not None:
+                    self._invalidate_subtree_cache(parent.identifier)
+                for each in removed_objects:
+                    self._subtree_cache.pop(each.index, None)
                 self.tree.remove_node(obj.index)
-            for i in removed_objects:
-                self.data_objects.remove(i)
+            else:
+                removed_objects = [obj]
+            removed_ids = set(map(id, removed_objects))
+            self.data_objects[:] = [each for each in self.data_objects if id(each) not in removed_ids]
+            for each in removed_objects:
+                self._unindex_object(each)
         else:
             raise Exception("找不到要删除的物件")
 
-    # 移动object
+    # 修改物件的属性(name/height/floor/zorder...)，同步名字索引和属性索引
+    @instrumented('update_object')
+    def update_object(self, object_index: int, **values):
+        one_object = self._object_index.get(object_index)
+        if one_object is None:
+            raise Exception("找不到要修改的物件")
+        for key in values:
+            if key in ('index', 'id', 'elements', 'global_tree', 'template') or not hasattr(one_object, key):
+                raise Exception("物件的{}属性不能修改".format(key))
+        if 'name' in values and values['name'] != one_object.name:
+            same_name = self._name_index.get(one_object.name, [])
+            same_name[:] = [each for each in same_name if each is not one_object]
+            if not same_name:
+                self._name_index.pop(one_object.name, None)
+            self._name_index.setdefault(values['name'], []).append(one_object)
+        for key, value in values.items():
+            setattr(one_object, key, value)
+        self._invalidate_attribute_index()
+        self._invalidate_massing(object_index)
+        # 阴影引擎缓存了每个轮廓的高度
+        if 'height' in values and self._shadow_engine is not None:
+            self._shadow_engine.invalidate()
+
+    # 移动object, 只改变父子关系，索引不受影响，新旧父节点的聚合缓存失效
+    @instrumented('move_object')
     def move_object(self, object_index: int, new_parent_index: int):
-        self.tree.move_node(object_index, new_parent_index)
\ No newline at end of file
+        old_parent = self.tree.parent(object_index)
+        if old_parent is not None:
+            self._invalidate_subtree_cache(old_parent.identifier)
+        self._invalidate_subtree_cache(new_parent_index)
+        self.tree.move_node(object_index, new_parent_index)
+        self._invalidate_massing()
+
+    # 把不在树中的物件挂到树上
+    @instrumented('attach_object')
+    def attach_object(self, object_index: int, parent_index):
+        one_object = self._object_index.get(object_index)
+        if one_object is None:
+            raise Exception("找不到要挂到树上的物件")
+        self.tree.create_node(tag=object_index, identifier=object_index, parent=parent_index, data=one_object)
+        one_object.global_tree = self.tree
+        self._invalidate_subtree_cache(parent_index)
+        self._invalidate_attribute_index()
+        self._invalidate_massing()
+
+    # 把物件连同子树从树上摘下，物件和元素仍然保留在DataTemplate中
+    @instrumented('detach_object')
+    def detach_object(self, object_index: int):
+        if not self.tree.contains(object_index):
+            return
+        parent = self.tree.parent(object_index)
+        if parent is not None:
+            self._invalidate_subtree_cache(parent.identifier)
+        for nid in self.tree.subtree_identifiers(object_index):
+            self._subtree_cache.pop(nid, None)
+        self.tree.remove_node(object_index)
+        self._invalidate_attribute_index()
+        self._invalidate_massing()
+
+    # 给物件批量添加元素(几何可以为None，和读取时一致)，同步元素索引、空间索引和聚合缓存
+    @instrumented('add_elements', count=len)
+    def add_elements(self, object_index: int, elements: List[Union[DataElement, ElementView]]) -> List:
+        owner = self._object_index.get(object_index)
+        if owner is None:
+            raise Exception("找不到要添加元素的物件")
+        for element in elements:
+            if element.id in self._element_index:
+                raise Exception("元素{}已经存在".format(element.id))
+        owner.elements.extend(elements)
+        self._register_elements(elements, owner)
+        return elements
+
+    # 按id批量删除元素，同一个物件的元素一次性从列表中移除
+    @instrumented('remove_elements')
+    def remove_elements(self, element_ids: Iterable):
+        removed_by_owner = {}
+        for element_id in element_ids:
+            element, owner = self._element_index.get(element_id, (None, None))
+            if owner is None:
+                raise Exception("找不到要删除的元素{}".format(element_id))
+            removed_by_owner.setdefault(id(owner), (owner, set()))[1].add(id(element))
+        for owner, removed in removed_by_owner.values():
+            kept = [each for each in owner.elements if id(each) not in removed]
+            removed_elements = [each for each in owner.elements if id(each) in removed]
+            owner.elements[:] = kept
+            for element in removed_elements:
+                self._unregister_element(element.id)
+
+    # 修改元素的geometry/type/group_list/has_shadow，所属物件不变，同步空间索引、属性索引和聚合缓存
+    @instrumented('update_element')
+    def update_element(self, element_id, **values):
+        element, owner = self._element_index.get(element_id, (None, None))
+        if element is None:
+            raise Exception("找不到要修改的元素{}".format(element_id))
+        for key in values:
+            if key not in ('geometry', 'type', 'group_list', 'has_shadow', 'shadow'):
+                raise Exception("元素的{}属性不能修改".format(key))
+        for key, value in values.items():
+            setattr(element, key, value)
+        self._invalidate_subtree_cache(owner.index)
+        self._invalidate_attribute_index()
+        if self._spatial_index is not None:
+            self._spatial_index.remove(element_id)
+            self._spatial_index.add(element)
+        if self._geometry_pyramid is not None:
+            self._geometry_pyramid.add(element)
+        if self._shadow_engine is not None:
+            self._shadow_engine.invalidate()
+        self._invalidate_massing(owner.index, footprint=True)
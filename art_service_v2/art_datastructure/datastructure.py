@@ -6,7 +6,7 @@ from dataclasses import dataclass, field
 from typing import *
 from shapely.geometry import Point, LineString, Polygon
 
-from treelib import Tree, Node
+from art_datastructure.hierarchy import Hierarchy
 
 
 class GlobalTree:
@@ -124,7 +124,7 @@ def assemble_tree(data_elements:List[DataElement], data_objects:dict):
     group_info = list(set(filter(lambda each: len(each)>0, group_info)))
 
     # 先构造一个全局的树，包含所有的树结构和层级
-    global_tree = Tree() # 全局树
+    global_tree = Hierarchy() # 全局树
     global_tree.create_node("global_tree", "root")
     # 组装树
     for each in group_info:
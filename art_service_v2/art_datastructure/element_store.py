@@ -0,0 +1,220 @@
+"""
+@ART DataElement的列式存储
+所有元素的属性按列存放在numpy数组里：一个几何数组、图层编码(图层名放在一张小表里)、
+扁平的编组数组(每行记录起点和长度)、定长16字节的id数组；
+ElementView是只有两个slot的轻量视图，对外保持DataElement的属性接口
+"""
+import os
+from uuid import UUID
+from typing import *
+import numpy as np
+from shapely.geometry import Point, LineString, Polygon
+
+# 初始容量，之后按2倍扩容
+INITIAL_CAPACITY = 1024
+
+
+class ElementStore:
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        capacity = max(capacity, 1)
+        self.size = 0  # 已使用的行数，行号分配之后不再回收
+        self.geometries = np.full(capacity, None, dtype=object)
+        self.layer_codes = np.zeros(capacity, dtype=np.int32)
+        self.ids = np.zeros(capacity, dtype='S16')
+        self.has_shadow = np.zeros(capacity, dtype=bool)
+        # 第i行的编组是 group_flat[group_start[i]:group_start[i]+group_count[i]]，-1表示None
+        self.group_start = np.zeros(capacity, dtype=np.int64)
+        self.group_count = np.full(capacity, -1, dtype=np.int32)
+        self.group_flat = np.zeros(capacity, dtype=np.int32)
+        self.group_owner = np.zeros(capacity, dtype=np.int32)  # group_flat中每一项属于哪一行，-1表示已作废
+        self.group_size = 0
+        self.layer_table = []  # 图层编码 -> 图层名
+        self._layer_codes = {}  # 图层名 -> 图层编码
+        self.shadows = {}  # 阴影很少，按行号稀疏存放
+
+    def __len__(self):
+        return self.size
+
+    # 按2倍扩容一组列
+    def _grow(self, columns: List[str], needed: int):
+        for name in columns:
+            column = getattr(self, name)
+            if needed <= len(column):
+                continue
+            capacity = max(needed, len(column) * 2)
+            grown = np.full(capacity, None, dtype=object) if column.dtype == object else \
+                np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            if name == 'group_count':
+                grown[len(column):] = -1
+            setattr(self, name, grown)
+
+    # 图层名 -> 编码
+    def layer_code(self, layer: str) -> int:
+        code = self._layer_codes.get(layer)
+        if code is None:
+            code = len(self.layer_table)
+            self.layer_table.append(layer)
+            self._layer_codes[layer] = code
+        return code
+
+    # 写入第row行的编组，旧的编组段作废
+    def _set_group_list(self, row: int, group_list):
+        count = self.group_count[row]
+        if count > 0:
+            start = self.group_start[row]
+            self.group_owner[start:start + count] = -1
+        if group_list is None:
+            self.group_count[row] = -1
+            return
+        group_list = tuple(group_list)
+        start = self.group_size
+        self._grow(['group_flat', 'group_owner'], start + len(group_list))
+        self.group_flat[start:start + len(group_list)] = group_list
+        self.group_owner[start:start + len(group_list)] = row
+        self.group_start[row] = start
+        self.group_count[row] = len(group_list)
+        self.group_size = start + len(group_list)
+
+    def extend(self, geometries: Sequence, layers: Sequence[str], group_lists: Sequence,
+               ids: Sequence[UUID] = None) -> List['ElementView']:
+        """
+        批量追加元素
+        :param geometries: 几何列表
+        :param layers: 图层名列表
+        :param group_lists: 编组列表
+        :param ids: 元素id，不传时随机生成(不走uuid1的时钟锁)
+        :return: 新元素的视图
+        """
+        count = len(geometries)
+        start, end = self.size, self.size + count
+        self._grow(['geometries', 'layer_codes', 'ids', 'has_shadow', 'group_start', 'group_count'], end)
+        geometry_column = np.empty(count, dtype=object)
+        geometry_column[:] = list(geometries)
+        self.geometries[start:end] = geometry_column
+        self.layer_codes[start:end] = [self.layer_code(layer) for layer in layers]
+        if ids is None:
+            self.ids[start:end] = np.frombuffer(os.urandom(16 * count), dtype='S16')
+        else:
+            self.ids[start:end] = [each.bytes for each in ids]
+        # 编组一次性写进扁平数组
+        group_lists = [tuple(each) if each is not None else None for each in group_lists]
+        lengths = np.array([len(each) if each is not None else -1 for each in group_lists], dtype=np.int32)
+        flat = [index for each in group_lists if each is not None for index in each]
+        flat_start = self.group_size
+        self._grow(['group_flat', 'group_owner'], flat_start + len(flat))
+        self.group_flat[flat_start:flat_start + len(flat)] = flat
+        self.group_owner[flat_start:flat_start + len(flat)] = np.repeat(np.arange(start, end, dtype=np.int32),
+                                                                        np.maximum(lengths, 0))
+        self.group_start[start:end] = flat_start + np.concatenate(([0], np.cumsum(np.maximum(lengths, 0))[:-1]))
+        self.group_count[start:end] = lengths
+        self.group_size = flat_start + len(flat)
+        self.size = end
+        return [ElementView(self, row) for row in range(start, end)]
+
+    # 追加一个元素
+    def append(self, geometry=None, type: str = "", group_list: tuple = None, id: UUID = None) -> 'ElementView':
+        return self.extend([geometry], [type], [group_list], None if id is None else [id])[0]
+
+    # 第row行的视图
+    def view(self, row: int) -> 'ElementView':
+        if not 0 <= row < self.size:
+            raise IndexError(row)
+        return ElementView(self, row)
+
+    # 向量化扫描: 属于指定图层的行号
+    def rows_with_layer(self, *layers: str) -> np.ndarray:
+        codes = [self._layer_codes[layer] for layer in layers if layer in self._layer_codes]
+        return np.flatnonzero(np.isin(self.layer_codes[:self.size], codes))
+
+    # 向量化扫描: 编组中包含group_index的行号
+    def rows_in_group(self, group_index: int) -> np.ndarray:
+        flat = slice(0, self.group_size)
+        owners = self.group_owner[flat][self.group_flat[flat] == group_index]
+        return np.unique(owners[owners >= 0])
+
+    # 各行的图层名
+    def layer_names(self) -> np.ndarray:
+        return np.array(self.layer_table, dtype=object)[self.layer_codes[:self.size]]
+
+
+class ElementView:
+    """
+    ElementStore中一行的视图，属性与DataElement一致(geometry/shadow/id/type/group_list/has_shadow)
+    """
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: ElementStore, row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @property
+    def geometry(self) -> Union[Point, LineString, Polygon]:
+        return self._store.geometries[self._row]
+
+    @geometry.setter
+    def geometry(self, value):
+        self._store.geometries[self._row] = value
+
+    @property
+    def shadow(self) -> Polygon:
+        return self._store.shadows.get(self._row)
+
+    @shadow.setter
+    def shadow(self, value):
+        if value is None:
+            self._store.shadows.pop(self._row, None)
+        else:
+            self._store.shadows[self._row] = value
+
+    @property
+    def id(self) -> UUID:
+        return UUID(bytes=bytes(self._store.ids[self._row]).ljust(16, b'\0'))
+
+    @id.setter
+    def id(self, value: UUID):
+        self._store.ids[self._row] = value.bytes
+
+    @property
+    def type(self) -> str:
+        return self._store.layer_table[self._store.layer_codes[self._row]]
+
+    @type.setter
+    def type(self, value: str):
+        self._store.layer_codes[self._row] = self._store.layer_code(value)
+
+    @property
+    def group_list(self) -> tuple:
+        count = int(self._store.group_count[self._row])
+        if count < 0:
+            return None
+        start = int(self._store.group_start[self._row])
+        return tuple(self._store.group_flat[start:start + count].tolist())
+
+    @group_list.setter
+    def group_list(self, value: tuple):
+        self._store._set_group_list(self._row, value)
+
+    @property
+    def has_shadow(self) -> bool:
+        return bool(self._store.has_shadow[self._row])
+
+    @has_shadow.setter
+    def has_shadow(self, value: bool):
+        self._store.has_shadow[self._row] = value
+
+    def __eq__(self, other):
+        if isinstance(other, ElementView):
+            return self._store is other._store and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    def __repr__(self):
+        return (f'ElementView(geometry={self.geometry!r}, id={self.id!r}, type={self.type!r}, '
+                f'group_list={self.group_list!r}, has_shadow={self.has_shadow!r})')
@@ -0,0 +1,144 @@
+"""
+@ART DataElement几何的多级简化(LOD金字塔)
+每一级对应一个简化容差(图纸单位)，第0级是原始几何；某一级第一次使用时对所有元素批量做保持拓扑的简化，
+只保存顶点数确实减少了的几何，没有变化的元素直接使用原始几何，不复制；
+增删改元素时只对已经建好的各级简化这些元素，金字塔始终和元素索引一致，不需要整体重建；
+按视口比例(每像素对应的图纸长度)选择误差不超过PIXEL_TOLERANCE个像素的最粗一级
+"""
+from typing import *
+import numpy as np
+import shapely
+
+# 各级的简化容差(图纸单位)，第0级为原始几何
+LOD_TOLERANCES = (0.0, 0.05, 0.25, 1.0, 4.0)
+# 简化误差允许的像素数
+PIXEL_TOLERANCE = 0.5
+# 顶点数不超过这个值的几何不做简化(三角形轮廓的4个点)
+MIN_SIMPLIFY_COORDS = 4
+# 先用普通Douglas-Peucker简化再检查结果的类型(shapely的type id): 线、多边形
+_LINE_TYPE, _POLYGON_TYPE = 1, 3
+
+
+def _simplify_preserving_topology(geometries: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    保持拓扑的批量简化: GEOS的保持拓扑简化比普通简化慢一个数量级，所以先对线和多边形做普通简化，
+    只有结果变成无效/空的多边形、改变了洞的数量、或者原本不自交的线变得自交时，才对这些几何按保持拓扑重新简化；
+    多部件几何直接按保持拓扑简化
+    :param geometries: 几何数组
+    :param tolerance: 简化容差
+    :return: 简化后的几何数组
+    """
+    type_ids = shapely.get_type_id(geometries)
+    lines = type_ids == _LINE_TYPE
+    polygons = type_ids == _POLYGON_TYPE
+    fast = lines | polygons
+    simplified = np.empty(len(geometries), dtype=object)
+    simplified[fast] = shapely.simplify(geometries[fast], tolerance, preserve_topology=False)
+    broken = ~fast
+    broken[fast] = shapely.is_empty(simplified[fast]) | (shapely.get_type_id(simplified[fast]) != type_ids[fast])
+    broken[polygons] |= ~shapely.is_valid(simplified[polygons]) | (
+            shapely.get_num_interior_rings(simplified[polygons]) != shapely.get_num_interior_rings(geometries[polygons]))
+    broken[lines] |= shapely.is_simple(geometries[lines]) & ~shapely.is_simple(simplified[lines])
+    if broken.any():
+        simplified[broken] = shapely.simplify(geometries[broken], tolerance, preserve_topology=True)
+    return simplified
+
+
+class GeometryPyramid:
+    def __init__(self, element_index: dict, tolerances: Sequence[float] = LOD_TOLERANCES):
+        """
+        :param element_index: DataTemplate的元素索引 元素id -> (DataElement, DataObject)
+        :param tolerances: 各级的简化容差，从小到大，第一个必须是0
+        """
+        if len(tolerances) == 0 or tolerances[0] != 0 or list(tolerances) != sorted(tolerances):
+            raise Exception("LOD容差必须从0开始从小到大排列")
+        self._element_index = element_index
+        self.tolerances = tuple(tolerances)
+        self._levels = {}  # 级别 -> {元素id: 简化后的几何}，只包括顶点数减少了的元素
+
+    def __len__(self):
+        return len(self.tolerances)
+
+    # 整体重建(元素索引被整体替换之后调用)
+    def invalidate(self):
+        self._levels = {}
+
+    # 批量简化，返回顶点数减少了的 元素id -> 简化后的几何
+    def _simplify(self, element_ids: list, geometries: np.ndarray, tolerance: float) -> dict:
+        if len(geometries) == 0:
+            return {}
+        counts = shapely.get_num_coordinates(geometries)
+        candidates = np.flatnonzero(counts > MIN_SIMPLIFY_COORDS)
+        simplified = _simplify_preserving_topology(geometries[candidates], tolerance)
+        reduced = shapely.get_num_coordinates(simplified) < counts[candidates]
+        return {element_ids[i]: geometry for i, geometry in zip(candidates[reduced].tolist(),
+                                                                simplified[reduced].tolist())}
+
+    # 某一级的简化结果，第一次使用时批量计算
+    def _level(self, level: int) -> dict:
+        simplified = self._levels.get(level)
+        if simplified is None:
+            elements = [element for element, _ in self._element_index.values() if element.geometry is not None]
+            simplified = self._simplify([element.id for element in elements],
+                                        np.array([element.geometry for element in elements], dtype=object),
+                                        self.tolerances[level])
+            self._levels[level] = simplified
+        return simplified
+
+    # 预先计算各级(默认全部)，之后的查询只读不写，可以在多个线程中并发使用
+    def build(self, levels: Iterable[int] = None):
+        for level in range(1, len(self.tolerances)) if levels is None else levels:
+            if level > 0:
+                self._level(level)
+
+    # 新增元素(同一个id再次加入时视为替换)，只更新已经建好的级别
+    def add(self, element):
+        self.extend([element])
+
+    # 批量新增元素
+    def extend(self, elements: list):
+        if not self._levels:
+            return
+        for simplified in self._levels.values():
+            for element in elements:
+                simplified.pop(element.id, None)
+        elements = [element for element in elements if element.geometry is not None]
+        element_ids = [element.id for element in elements]
+        geometries = np.array([element.geometry for element in elements], dtype=object)
+        for level, simplified in self._levels.items():
+            simplified.update(self._simplify(element_ids, geometries, self.tolerances[level]))
+
+    # 删除元素
+    def remove(self, element_id):
+        for simplified in self._levels.values():
+            simplified.pop(element_id, None)
+
+    # 视口比例对应的级别: 误差不超过PIXEL_TOLERANCE个像素的最粗一级
+    def level_for_scale(self, units_per_pixel: float) -> int:
+        allowed = max(units_per_pixel, 0.0) * PIXEL_TOLERANCE
+        return max(level for level, tolerance in enumerate(self.tolerances) if tolerance <= allowed)
+
+    # 一个元素在某一级的几何
+    def geometry(self, element, level: int):
+        if level == 0:
+            return element.geometry
+        return self._level(level).get(element.id, element.geometry)
+
+    def simplified(self, hits: List[Tuple], level: int) -> List[Tuple]:
+        """
+        把查询结果换成某一级的几何
+        :param hits: [(DataElement, DataObject)]
+        :param level: 级别
+        :return: [(简化后的几何, DataElement, DataObject)]
+        """
+        if level == 0:
+            return [(element.geometry, element, owner) for element, owner in hits]
+        simplified = self._level(level)
+        return [(simplified.get(element.id, element.geometry), element, owner) for element, owner in hits]
+
+    # 某一级所有元素的几何 -> (元素列表, 几何数组)，用于统计每一级的数据量
+    def level_geometries(self, level: int) -> Tuple[list, np.ndarray]:
+        elements = [element for element, _ in self._element_index.values() if element.geometry is not None]
+        simplified = self._level(level) if level > 0 else {}
+        return elements, np.array([simplified.get(element.id, element.geometry) for element in elements],
+                                  dtype=object)
@@ -0,0 +1,426 @@
+"""
+@ART 数组化的层级树
+节点按位置编号，父节点存成整数数组(-1表示没有父节点，-2表示已删除)；
+子节点用CSR形式存放(indptr/indices，同一父节点下按tag排序)，再做一次先序遍历得到每个节点的进入/离开区间(Euler tour)：
+  - 祖先判断: entry[a] <= entry[d] < exit[a]，O(1)
+  - 子树: 先序数组中的一段连续切片 order[entry[n]:exit[n]]
+  - 深度: depth数组
+增删移动只改父节点数组和每个节点的子节点列表并标记失效，CSR和区间在下一次整体查询时统一重建，批量修改只重建一次；
+查子节点、删除子树这类局部操作直接走子节点列表，不触发重建；
+和treelib一样，children/is_branch按添加(移入)的顺序返回子节点，expand_tree/show按tag排序；
+对外保留DataTemplate/DataObject用到的treelib接口(create_node/remove_node/move_node/children/parent/subtree/show...)
+"""
+from uuid import uuid1
+from typing import *
+import numpy as np
+
+NO_PARENT = -1
+REMOVED = -2
+
+
+class HierarchyNode:
+    """
+    树中的一个节点，属性和treelib的Node一致(identifier/tag/data)
+    """
+    __slots__ = ('identifier', 'tag', 'data', '_position')
+
+    def __init__(self, tag=None, identifier=None, data=None, position: int = -1):
+        self.identifier = identifier
+        self.tag = tag
+        self.data = data
+        self._position = position
+
+    def __lt__(self, other):
+        return self.tag < other.tag
+
+    def __repr__(self):
+        return f'Node(tag={self.tag!r}, identifier={self.identifier!r}, data={self.data!r})'
+
+
+class Hierarchy:
+    def __init__(self):
+        self.root = None  # 根节点的identifier
+        self._nodes = {}  # identifier -> HierarchyNode
+        self._slots = []  # 位置 -> HierarchyNode，删除后为None
+        self._parents = []  # 位置 -> 父节点位置
+        self._children = []  # 位置 -> 子节点位置列表(增量维护，按添加或移入的顺序)
+        self._removed = 0  # 已删除的位置数量
+        self._dirty = False  # CSR和区间是否需要重建
+        self._indptr = self._indices = None
+        self._order = self._entry = self._exit = self._depth = None
+
+    @classmethod
+    def from_parents(cls, identifiers: Sequence, parents: Sequence[int], tags: Sequence = None,
+                     data: Sequence = None) -> 'Hierarchy':
+        """
+        由父节点位置数组直接建树，父节点可以排在子节点后面
+        :param identifiers: 节点id
+        :param parents: 每个节点的父节点位置，-1表示根节点(只能有一个)
+        :param tags: 节点标签，默认和id相同
+        :param data: 节点数据
+        :return: Hierarchy
+        """
+        tree = cls()
+        parents = [int(each) for each in parents]
+        for position, identifier in enumerate(identifiers):
+            if identifier in tree._nodes:
+                raise Exception("节点{}已经存在".format(identifier))
+            tag = identifier if tags is None or tags[position] is None else tags[position]
+            node = HierarchyNode(tag, identifier, None if data is None else data[position], position)
+            tree._slots.append(node)
+            tree._nodes[identifier] = node
+            if parents[position] == NO_PARENT:
+                if tree.root is not None:
+                    raise Exception("树中已经有根节点{}".format(tree.root))
+                tree.root = identifier
+        tree._parents = parents
+        tree._children = [[] for _ in parents]
+        for position, parent in enumerate(parents):
+            if parent >= 0:
+                tree._children[parent].append(position)
+        tree._dirty = True
+        return tree
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, identifier):
+        return identifier in self._nodes
+
+    def __getitem__(self, identifier) -> HierarchyNode:
+        return self._nodes[identifier]
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __str__(self):
+        return self.show(stdout=False)
+
+    @property
+    def nodes(self) -> Dict[Any, HierarchyNode]:
+        return self._nodes
+
+    def size(self) -> int:
+        return len(self._nodes)
+
+    def contains(self, identifier) -> bool:
+        return identifier in self._nodes
+
+    def get_node(self, identifier) -> Optional[HierarchyNode]:
+        return self._nodes.get(identifier)
+
+    def all_nodes(self) -> List[HierarchyNode]:
+        return list(self._nodes.values())
+
+    def all_nodes_itr(self) -> Iterator[HierarchyNode]:
+        return iter(self._nodes.values())
+
+    def _position(self, identifier) -> int:
+        node = self._nodes.get(identifier)
+        if node is None:
+            raise Exception("树中没有节点{}".format(identifier))
+        return node._position
+
+    # ---------- 修改: 只改父节点数组 ----------
+
+    def create_node(self, tag=None, identifier=None, parent=None, data=None) -> HierarchyNode:
+        """
+        添加节点
+        :param tag: 显示用的标签，默认和identifier相同
+        :param identifier: 节点id，默认生成uuid
+        :param parent: 父节点id，为None时作为根节点
+        :param data: 节点数据
+        :return: 新节点
+        """
+        if identifier is None:
+            identifier = str(uuid1())
+        if identifier in self._nodes:
+            raise Exception("节点{}已经存在".format(identifier))
+        if parent is None:
+            if self.root is not None:
+                raise Exception("树中已经有根节点{}".format(self.root))
+            parent_position = NO_PARENT
+        else:
+            parent_position = self._position(parent)
+        node = HierarchyNode(identifier if tag is None else tag, identifier, data, len(self._slots))
+        self._slots.append(node)
+        self._parents.append(parent_position)
+        self._children.append([])
+        if parent_position >= 0:
+            self._children[parent_position].append(node._position)
+        self._nodes[identifier] = node
+        if parent is None:
+            self.root = identifier
+        self._dirty = True
+        return node
+
+    # 删除节点以及它的整个子树，返回删除的节点数量
+    def remove_node(self, identifier) -> int:
+        position = self._position(identifier)
+        positions, stack = [], [position]
+        while stack:
+            current = stack.pop()
+            positions.append(current)
+            stack.extend(self._children[current])
+        parent = self._parents[position]
+        if parent >= 0:
+            self._children[parent].remove(position)
+        for current in positions:
+            node = self._slots[current]
+            del self._nodes[node.identifier]
+            self._slots[current] = None
+            self._parents[current] = REMOVED
+            self._children[current] = []
+        self._removed += len(positions)
+        if identifier == self.root:
+            self.root = None
+        self._dirty = True
+        return len(positions)
+
+    # 把source(连同子树)挂到destination下面
+    def move_node(self, source, destination):
+        source_position = self._position(source)
+        destination_position = self._position(destination)
+        # 沿destination的父节点链往上找，碰到source说明会形成环
+        position = destination_position
+        while position >= 0:
+            if position == source_position:
+                raise Exception("不能把节点{}移动到它自己的子树{}下".format(source, destination))
+            position = self._parents[position]
+        old_parent = self._parents[source_position]
+        if old_parent != destination_position:
+            if old_parent >= 0:
+                self._children[old_parent].remove(source_position)
+            self._children[destination_position].append(source_position)
+            self._parents[source_position] = destination_position
+            self._dirty = True
+
+    # ---------- 重建CSR和Euler tour区间 ----------
+
+    # 删除的位置超过一半时重新编号
+    def _compact(self):
+        alive = [position for position, node in enumerate(self._slots) if node is not None]
+        remap = np.full(len(self._slots), REMOVED, dtype=np.int64)
+        remap[alive] = np.arange(len(alive))
+        self._slots = [self._slots[position] for position in alive]
+        self._parents = [int(remap[self._parents[position]]) if self._parents[position] >= 0 else NO_PARENT
+                         for position in alive]
+        self._children = [[int(remap[child]) for child in self._children[position]] for position in alive]
+        for position, node in enumerate(self._slots):
+            node._position = position
+        self._removed = 0
+
+    # 每个位置的tag排名，同一父节点下的子节点按它排序；tag不能比较时退回创建顺序
+    def _tag_rank(self) -> np.ndarray:
+        alive = [position for position, node in enumerate(self._slots) if node is not None]
+        try:
+            alive.sort(key=lambda position: (type(self._slots[position].tag).__name__, self._slots[position].tag))
+        except TypeError:
+            alive.sort()
+        rank = np.zeros(len(self._slots), dtype=np.int64)
+        rank[alive] = np.arange(len(alive))
+        return rank
+
+    # 一个位置的子节点，顺序和CSR一致(按tag，tag相同时按位置)
+    def _sorted_children(self, position: int) -> List[int]:
+        slots = self._slots
+        try:
+            return sorted(self._children[position],
+                          key=lambda child: (type(slots[child].tag).__name__, slots[child].tag, child))
+        except TypeError:
+            return sorted(self._children[position])
+
+    def _rebuild(self):
+        if not self._dirty:
+            return
+        if self._removed * 2 > len(self._slots):
+            self._compact()
+        count = len(self._slots)
+        parents = np.asarray(self._parents, dtype=np.int64)
+        # CSR: 有父节点的位置按(父节点, tag)排序
+        children = np.flatnonzero(parents >= 0)
+        children = children[np.lexsort((self._tag_rank()[children], parents[children]))]
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parents[children], minlength=count), out=indptr[1:])
+        # 先序遍历得到entry，子树大小得到exit
+        order = []
+        if self.root is not None:
+            indptr_list, children_list = indptr.tolist(), children.tolist()
+            stack = [self._nodes[self.root]._position]
+            while stack:
+                position = stack.pop()
+                order.append(position)
+                stack.extend(reversed(children_list[indptr_list[position]:indptr_list[position + 1]]))
+        order = np.asarray(order, dtype=np.int64)
+        entry = np.full(count, -1, dtype=np.int64)
+        entry[order] = np.arange(len(order))
+        size = [1] * count
+        depth = [0] * count
+        parent_list = self._parents
+        for position in order.tolist():
+            parent = parent_list[position]
+            if parent >= 0:
+                depth[position] = depth[parent] + 1
+        for position in reversed(order.tolist()):
+            parent = parent_list[position]
+            if parent >= 0:
+                size[parent] += size[position]
+        self._indptr, self._indices = indptr, children
+        self._order, self._entry = order, entry
+        self._exit = entry + np.asarray(size, dtype=np.int64)
+        self._depth = np.asarray(depth, dtype=np.int64)
+        self._dirty = False
+
+    # 一个节点的整个子树的位置(先序)，重建可能重新编号，所以先重建再取位置
+    def _subtree_positions(self, identifier) -> np.ndarray:
+        self._rebuild()
+        position = self._position(identifier)
+        return self._order[self._entry[position]:self._exit[position]]
+
+    # ---------- 数组接口 ----------
+
+    # 节点在数组中的位置(重建后可能变化)
+    def position(self, identifier) -> int:
+        self._rebuild()
+        return self._position(identifier)
+
+    @property
+    def parent_array(self) -> np.ndarray:
+        self._rebuild()
+        return np.asarray(self._parents, dtype=np.int64)
+
+    @property
+    def entry(self) -> np.ndarray:
+        self._rebuild()
+        return self._entry
+
+    @property
+    def exit(self) -> np.ndarray:
+        self._rebuild()
+        return self._exit
+
+    @property
+    def depth_array(self) -> np.ndarray:
+        self._rebuild()
+        return self._depth
+
+    # 先序遍历的位置数组，每个子树都是其中连续的一段
+    @property
+    def order(self) -> np.ndarray:
+        self._rebuild()
+        return self._order
+
+    # ancestor是否是descendant的祖先(不含自己)
+    def is_ancestor(self, ancestor, descendant) -> bool:
+        self._rebuild()
+        a, d = self._position(ancestor), self._position(descendant)
+        return a != d and self._entry[a] <= self._entry[d] < self._exit[a]
+
+    # 子树中所有节点的id(先序，包含自己)
+    def subtree_identifiers(self, identifier) -> List:
+        slots = self._slots
+        return [slots[position].identifier for position in self._subtree_positions(identifier).tolist()]
+
+    # ---------- treelib兼容的查询接口 ----------
+
+    def parent(self, identifier) -> Optional[HierarchyNode]:
+        parent = self._parents[self._position(identifier)]
+        return self._slots[parent] if parent >= 0 else None
+
+    # 子节点id，按添加或移入的顺序(和treelib一致，走子节点列表，不触发重建)
+    def is_branch(self, identifier) -> List:
+        return [self._slots[child].identifier for child in self._children[self._position(identifier)]]
+
+    # 每个节点在父节点的子节点列表中的序号 -> {identifier: 序号}，根节点不在其中
+    def sibling_ranks(self) -> dict:
+        slots = self._slots
+        return {slots[child].identifier: rank for children in self._children for rank, child in enumerate(children)}
+
+    # 子节点id，按tag排序，和expand_tree的先序一致
+    def sorted_children(self, identifier) -> List:
+        return [self._slots[child].identifier for child in self._sorted_children(self._position(identifier))]
+
+    def children(self, identifier) -> List[HierarchyNode]:
+        return [self._nodes[child] for child in self.is_branch(identifier)]
+
+    def leaves(self, identifier=None) -> List[HierarchyNode]:
+        identifier = self.root if identifier is None else identifier
+        if identifier is None:
+            return []
+        positions = self._subtree_positions(identifier)
+        leaf = self._indptr[positions + 1] == self._indptr[positions]
+        return [self._slots[position] for position in positions[leaf].tolist()]
+
+    # 节点的层级(根为0)
+    def level(self, identifier) -> int:
+        self._rebuild()
+        return int(self._depth[self._position(identifier)])
+
+    # 不传node时为整棵树的最大层级
+    def depth(self, node=None) -> int:
+        if node is not None:
+            return self.level(node.identifier if isinstance(node, HierarchyNode) else node)
+        self._rebuild()
+        return int(self._depth[self._order].max()) if len(self._order) else 0
+
+    def expand_tree(self, nid=None, filter: Callable = None, **kwargs) -> Iterator:
+        """
+        先序遍历子树的节点id(子节点按tag排序)
+        :param nid: 起点，默认根节点
+        :param filter: 节点过滤函数，返回False时跳过该节点以及它的子树
+        :return: 节点id的迭代器
+        """
+        nid = self.root if nid is None else nid
+        if nid is None:
+            return
+        self._rebuild()
+        start = self._position(nid)
+        order, slots = self._order, self._slots
+        cursor, end = int(self._entry[start]), int(self._exit[start])
+        while cursor < end:
+            node = slots[order[cursor]]
+            if filter is not None and not filter(node):
+                cursor = int(self._exit[order[cursor]])
+                continue
+            yield node.identifier
+            cursor += 1
+
+    # 复制出以nid为根的子树
+    def subtree(self, nid) -> 'Hierarchy':
+        tree = Hierarchy()
+        positions = self._subtree_positions(nid).tolist()
+        for position in positions:
+            node = self._slots[position]
+            parent = None if position == positions[0] else self._slots[self._parents[position]].identifier
+            tree.create_node(node.tag, node.identifier, parent=parent, data=node.data)
+        # 先序是按tag排的，子节点列表按原来的顺序
+        remap = {position: i for i, position in enumerate(positions)}
+        tree._children = [[remap[child] for child in self._children[position]] for position in positions]
+        return tree
+
+    def show(self, nid=None, stdout: bool = True) -> str:
+        """
+        以treelib的格式画出树
+        :param nid: 起点，默认根节点
+        :param stdout: 是否直接打印
+        :return: 画出的字符串
+        """
+        nid = self.root if nid is None else nid
+        lines = []
+        if nid is not None:
+            stack = [(nid, '', None)]
+            while stack:
+                identifier, prefix, is_last = stack.pop()
+                if is_last is None:
+                    lines.append(str(self._nodes[identifier].tag))
+                    child_prefix = ''
+                else:
+                    lines.append(prefix + ('└── ' if is_last else '├── ') + str(self._nodes[identifier].tag))
+                    child_prefix = prefix + ('    ' if is_last else '│   ')
+                children = self.sorted_children(identifier)
+                for i in range(len(children) - 1, -1, -1):
+                    stack.append((children[i], child_prefix, i == len(children) - 1))
+        text = ''.join(line + '\n' for line in lines)
+        if stdout:
+            print(text)
+        return text
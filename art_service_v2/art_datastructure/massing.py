@@ -0,0 +1,255 @@
+"""
+@ART 建筑体量指标: 基底面积、建筑面积(基底面积×层数)、体积(基底面积×高度)、容积率和建筑密度
+每个DataObject自己元素中的Polygon求并集得到基底轮廓，按物件缓存，只有物件的元素增删改之后才重新计算；
+缺失的轮廓一次性批量整理: 只有一个Polygon的物件直接使用它，多个Polygon的物件才求并集，面积统一向量化计算；
+物件的数值指标按data_objects的顺序排成数组，在树中按深度从下往上逐层累加到父节点，一遍得到所有子树的汇总；
+物件高度/层数修改之后只更新它自己那一行再重新累加；物件增删、移动之后重新编号，都不重新计算其他物件的轮廓
+"""
+from dataclasses import dataclass, field
+from typing import *
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
+
+# 指标数组的列
+_AREA, _GFA, _VOLUME, _BUILDINGS = range(4)
+
+
+@dataclass
+class MassingMetrics:
+    """
+    一个物件(或者它的整个子树)的体量指标
+    """
+    footprint_area: float = field(default=0.0)  # 基底面积
+    gross_floor_area: float = field(default=0.0)  # 建筑面积 = 基底面积 × 层数
+    volume: float = field(default=0.0)  # 体积 = 基底面积 × 高度
+    building_count: int = field(default=0)  # 有基底轮廓的物件数量
+
+
+@dataclass
+class SiteReport:
+    """
+    整个场地的指标
+    """
+    site_area: float = field(default=0.0)  # 用地面积
+    totals: MassingMetrics = field(default_factory=MassingMetrics)
+    floor_area_ratio: float = field(default=0.0)  # 容积率 = 总建筑面积 / 用地面积
+    coverage_ratio: float = field(default=0.0)  # 建筑密度 = 总基底面积 / 用地面积
+
+
+# 数组的一行转成MassingMetrics
+def _as_metrics(row: np.ndarray) -> MassingMetrics:
+    return MassingMetrics(footprint_area=float(row[_AREA]), gross_floor_area=float(row[_GFA]),
+                          volume=float(row[_VOLUME]), building_count=int(row[_BUILDINGS]))
+
+
+class MassingEngine:
+    def __init__(self, template, layers: Iterable[str] = None):
+        """
+        :param template: DataTemplate
+        :param layers: 作为基底轮廓的图层，None时物件中所有的Polygon都算
+        """
+        self.template = template
+        self.layers = None if layers is None else frozenset(layers)
+        self._footprints = {}  # 物件index -> (DataObject, 基底轮廓, 面积)，没有轮廓时为(DataObject, None, 0.0)
+        # 行: data_objects的顺序，None表示物件增删或者树结构改变，需要重新编号
+        self._objects = None  # 行号 -> DataObject
+        self._rows = {}  # 物件index -> 行号
+        self._columns = None  # 行号 -> (面积, 层数, 高度)
+        self._tree_rows = None  # 在树中的行号
+        self._positions = None  # 这些行在树中的位置
+        self._levels = []  # 从深到浅每一层的(树中位置, 父节点位置)
+        self._position_count = 0
+        self._dirty = set()  # 需要重新读取面积/层数/高度的物件index
+        self._own = None  # 行号 -> 物件自己的指标，None表示需要重新累加
+        self._totals = None  # 行号 -> 子树汇总的指标(不在树中的物件等于自己的指标)
+        self._extent_area = None  # 所有元素总外包框的面积
+        self._reports = {}  # (用地面积, 用地图层) -> SiteReport
+
+    def invalidate(self, object_index=None, footprint: bool = False):
+        """
+        标记失效，场地指标总是重新计算
+        :param object_index: 属性(高度/层数)或者元素改变的物件，None表示物件增删或者树结构改变
+        :param footprint: 物件的元素改变，基底轮廓需要重新计算
+        """
+        if object_index is None:
+            self._objects = None
+        else:
+            self._dirty.add(object_index)
+            if footprint:
+                self._footprints.pop(object_index, None)
+                self._extent_area = None
+        self._own = None
+        self._reports.clear()
+
+    # 计算缺失的基底轮廓(物件index被别的物件复用时也重新计算)
+    def _compute_footprints(self, objects: List):
+        footprints = self._footprints
+        missing = [each for each in objects
+                   if each.index not in footprints or footprints[each.index][0] is not each]
+        if not missing:
+            return
+        polygons, owners = [], []
+        for row, each in enumerate(missing):
+            for element in each.elements:
+                geometry = element.geometry
+                if isinstance(geometry, (Polygon, MultiPolygon)) and (self.layers is None or
+                                                                     element.type in self.layers):
+                    polygons.append(geometry)
+                    owners.append(row)
+        polygons = np.array(polygons, dtype=object)
+        owners = np.asarray(owners, dtype=np.int64)
+        if len(polygons):
+            keep = ~shapely.is_empty(polygons)
+            polygons, owners = polygons[keep], owners[keep]
+            invalid = ~shapely.is_valid(polygons)
+            if invalid.any():
+                polygons[invalid] = shapely.make_valid(polygons[invalid])
+        shapes = np.full(len(missing), None, dtype=object)
+        counts = np.bincount(owners, minlength=len(missing))
+        single = counts[owners] == 1
+        shapes[owners[single]] = polygons[single]
+        # 多个Polygon的物件按物件分组求并集
+        multiple = np.flatnonzero(counts > 1)
+        if len(multiple):
+            order = np.argsort(owners, kind='stable')
+            starts = np.searchsorted(owners[order], multiple)
+            for row, start in zip(multiple.tolist(), starts.tolist()):
+                shapes[row] = shapely.union_all(polygons[order[start:start + counts[row]]])
+        areas = np.zeros(len(missing), dtype=np.float64)
+        has_footprint = counts > 0
+        areas[has_footprint] = shapely.area(shapes[has_footprint])
+        for each, shape, area in zip(missing, shapes.tolist(), areas.tolist()):
+            footprints[each.index] = (each, shape, area)
+
+    # 重新编号: 行号、树中的位置和每一层的父子关系
+    def _rebuild_rows(self):
+        template = self.template
+        objects = list(template.data_objects or [])
+        self._compute_footprints(objects)
+        self._rows = {each.index: row for row, each in enumerate(objects)}
+        # 删除的物件不再保留轮廓
+        for index in [index for index in self._footprints if index not in self._rows]:
+            del self._footprints[index]
+        self._columns = np.array([(self._footprints[each.index][2], each.floor, each.height) for each in objects],
+                                 dtype=np.float64).reshape(len(objects), 3)
+        self._positions = np.empty(0, dtype=np.int64)
+        self._tree_rows = np.empty(0, dtype=np.int64)
+        self._levels = []
+        self._position_count = 0
+        tree = template.tree
+        if tree is not None and tree.root is not None and len(objects):
+            # 先让树完成重建(可能重新编号)，再记录位置
+            tree.order
+            rows, positions = [], []
+            for row, each in enumerate(objects):
+                if tree.contains(each.index):
+                    rows.append(row)
+                    positions.append(tree.position(each.index))
+            self._tree_rows = np.asarray(rows, dtype=np.int64)
+            self._positions = np.asarray(positions, dtype=np.int64)
+            parents = tree.parent_array
+            order = tree.order
+            order_depth = tree.depth_array[order]
+            for level in range(int(order_depth.max()), 0, -1):
+                nodes = order[order_depth == level]
+                self._levels.append((nodes, parents[nodes]))
+            self._position_count = len(parents)
+        self._objects = objects
+        self._dirty.clear()
+
+    # 数组准备好: 需要时重新编号，只重新读取改变的物件，再累加
+    def _refresh(self):
+        if self._objects is None:
+            self._rebuild_rows()
+        elif self._dirty:
+            changed = [self._objects[self._rows[index]] for index in self._dirty if index in self._rows]
+            self._compute_footprints(changed)
+            for each in changed:
+                self._columns[self._rows[each.index]] = (self._footprints[each.index][2], each.floor, each.height)
+            self._dirty.clear()
+        if self._own is not None:
+            return
+        area, floor, height = self._columns.T
+        own = np.zeros((len(self._objects), 4), dtype=np.float64)
+        own[:, _AREA] = area
+        own[:, _GFA] = area * floor
+        own[:, _VOLUME] = area * height
+        own[:, _BUILDINGS] = area > 0
+        totals = own.copy()
+        if len(self._tree_rows):
+            # 按深度从深到浅，每一层一次性加到父节点上
+            by_position = np.zeros((self._position_count, 4), dtype=np.float64)
+            by_position[self._positions] = own[self._tree_rows]
+            for nodes, parents in self._levels:
+                np.add.at(by_position, parents, by_position[nodes])
+            totals[self._tree_rows] = by_position[self._positions]
+        self._own, self._totals = own, totals
+
+    def _row(self, object_index) -> int:
+        self._refresh()
+        row = self._rows.get(object_index)
+        if row is None:
+            raise Exception("找不到物件{}".format(object_index))
+        return row
+
+    # 物件自己元素的基底轮廓，没有Polygon时为None
+    def footprint(self, object_index):
+        self._row(object_index)
+        return self._footprints[object_index][1]
+
+    # 物件自己(不含下级)的指标
+    def object_metrics(self, object_index) -> MassingMetrics:
+        row = self._row(object_index)
+        return _as_metrics(self._own[row])
+
+    # 物件子树汇总的指标
+    def subtree_metrics(self, object_index) -> MassingMetrics:
+        row = self._row(object_index)
+        return _as_metrics(self._totals[row])
+
+    # 所有物件子树汇总的指标 -> {物件index: MassingMetrics}
+    def all_subtree_metrics(self) -> Dict[int, MassingMetrics]:
+        self._refresh()
+        return {each.index: _as_metrics(row) for each, row in zip(self._objects, self._totals)}
+
+    # 用地图层中所有Polygon并集的面积
+    def _layer_area(self, site_layer: str) -> float:
+        polygons = [element.geometry for element, _ in self.template._element_index.values()
+                    if element.type == site_layer and isinstance(element.geometry, (Polygon, MultiPolygon))]
+        if not polygons:
+            raise Exception("用地图层{}中没有闭合轮廓".format(site_layer))
+        return float(shapely.area(shapely.union_all(shapely.make_valid(np.array(polygons, dtype=object)))))
+
+    # 所有元素总外包框的面积，元素几何改变之前一直使用
+    def _extent(self) -> float:
+        if self._extent_area is None:
+            geometries = [element.geometry for element, _ in self.template._element_index.values()
+                          if element.geometry is not None]
+            min_x, min_y, max_x, max_y = shapely.total_bounds(np.array(geometries, dtype=object)) \
+                if geometries else (0.0, 0.0, 0.0, 0.0)
+            self._extent_area = float((max_x - min_x) * (max_y - min_y))
+        return self._extent_area
+
+    def site_report(self, site_area: float = None, site_layer: str = None) -> SiteReport:
+        """
+        整个场地的指标，结果缓存到下一次修改
+        :param site_area: 用地面积
+        :param site_layer: 用地红线所在的图层，没有给出site_area时用它的面积；都没有时用所有元素总外包框的面积
+        :return: SiteReport
+        """
+        key = (site_area, site_layer)
+        report = self._reports.get(key)
+        if report is not None:
+            return report
+        self._refresh()
+        if site_area is None and site_layer is not None:
+            site_area = self._layer_area(site_layer)
+        if site_area is None:
+            site_area = self._extent()
+        totals = _as_metrics(self._own.sum(axis=0))
+        report = SiteReport(site_area=site_area, totals=totals,
+                            floor_area_ratio=totals.gross_floor_area / site_area if site_area > 0 else 0.0,
+                            coverage_ratio=totals.footprint_area / site_area if site_area > 0 else 0.0)
+        self._reports[key] = report
+        return report
@@ -0,0 +1,140 @@
+"""
+@ART 分阶段的耗时/数量/内存统计
+Read3dmFile和DataTemplate都带一个metrics属性，默认为None，这时插桩只多一次属性判断；
+传入MetricsCollector之后，每个阶段或者操作结束时记录一条StageMetric(耗时、处理数量、峰值内存)，
+并调用可选的回调(比如写日志或者上报监控)
+"""
+import functools
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import *
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageMetric:
+    name: str  # 阶段或者操作名
+    wall_time: float = 0.0  # 耗时(秒)
+    count: int = None  # 处理的对象数量
+    peak_memory: int = None  # 阶段内相对开始时的峰值内存(字节)，只在track_memory=True时统计
+    extra: dict = field(default_factory=dict)  # 其他信息
+
+
+# 默认回调: 写debug日志
+def log_metric(metric: StageMetric):
+    logger.debug('%s: %.6fs count=%s peak_memory=%s', metric.name, metric.wall_time, metric.count,
+                 metric.peak_memory)
+
+
+class MetricsCollector:
+    def __init__(self, track_memory: bool = False, callback: Callable[[StageMetric], Any] = None,
+                 keep_records: bool = True):
+        """
+        :param track_memory: 是否用tracemalloc统计每个阶段的峰值内存(开销较大，排查问题时再打开)
+        :param callback: 每个阶段结束时调用，参数是StageMetric
+        :param keep_records: 是否把每条记录保存在records里(长时间运行的服务可以关掉，只看summary)
+        """
+        self.track_memory = track_memory
+        self.callback = callback
+        self.keep_records = keep_records
+        self.records = []  # type: List[StageMetric]
+        self._summary = {}  # 阶段名 -> 汇总
+        self._memory_stack = []  # 嵌套阶段的[开始时的内存, 已观察到的绝对峰值]
+        self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name: str, count: int = None) -> Iterator[StageMetric]:
+        """
+        统计一个阶段，with块中可以给返回的StageMetric设置count/extra
+        :param name: 阶段名
+        :param count: 处理的对象数量
+        :return: StageMetric
+        """
+        metric = StageMetric(name=name, count=count)
+        if self.track_memory:
+            self._enter_memory()
+        start = time.perf_counter()
+        try:
+            yield metric
+        finally:
+            metric.wall_time = time.perf_counter() - start
+            if self.track_memory:
+                metric.peak_memory = self._exit_memory()
+            self.record(metric)
+
+    # 进入一个阶段: 把当前峰值记到外层阶段上，再重置峰值
+    def _enter_memory(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._memory_stack.append([current, current])
+
+    # 离开一个阶段: 返回相对开始时的峰值，并把绝对峰值传给外层阶段
+    def _exit_memory(self) -> int:
+        start, observed = self._memory_stack.pop()
+        peak = max(observed, tracemalloc.get_traced_memory()[1])
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        elif self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return peak - start
+
+    # 记录一条统计
+    def record(self, metric: StageMetric):
+        if self.keep_records:
+            self.records.append(metric)
+        summary = self._summary.get(metric.name)
+        if summary is None:
+            summary = self._summary[metric.name] = {'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'count': None,
+                                                    'peak_memory': None}
+        summary['calls'] += 1
+        summary['total_s'] += metric.wall_time
+        summary['max_s'] = max(summary['max_s'], metric.wall_time)
+        if metric.count is not None:
+            summary['count'] = (summary['count'] or 0) + metric.count
+        if metric.peak_memory is not None:
+            summary['peak_memory'] = max(summary['peak_memory'] or 0, metric.peak_memory)
+        if self.callback is not None:
+            self.callback(metric)
+
+    # 按阶段名汇总 -> {阶段名: {calls, total_s, max_s, count, peak_memory}}
+    def summary(self) -> Dict[str, dict]:
+        return {name: dict(each) for name, each in self._summary.items()}
+
+    def clear(self):
+        self.records.clear()
+        self._summary.clear()
+
+
+def instrumented(name: str, count: Callable[[Any], int] = None):
+    """
+    给方法加上统计: 对象的metrics为None时直接调用原方法
+    :param name: 操作名
+    :param count: 根据返回值计算处理数量的函数
+    :return: 装饰器
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return func(self, *args, **kwargs)
+            with metrics.stage(name) as metric:
+                result = func(self, *args, **kwargs)
+                if count is not None:
+                    metric.count = count(result)
+                return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,207 @@
+"""
+@ART 建筑阴影计算
+把每个DataObject下的Polygon轮廓按物件高度沿太阳光方向拉伸，得到地面上的阴影：
+阴影 = 轮廓 ∪ 平移后的轮廓 ∪ 每条边扫过的四边形，凸轮廓直接等于 凸包(轮廓顶点 ∪ 平移后的顶点)；
+轮廓的边和坐标在第一次计算时整理成numpy数组，之后每个时刻只做数组运算，
+凸轮廓的阴影用一次批量凸包得到，只有凹轮廓或带洞的轮廓才逐个求并集
+"""
+import math
+from datetime import datetime, timezone
+from typing import *
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+# 太阳高度角低于这个值(度)时认为没有有效阴影
+MIN_SUN_ALTITUDE = 0.5
+
+
+def solar_position(when: datetime, latitude: float, longitude: float) -> Tuple[float, float]:
+    """
+    计算太阳位置(NOAA简化公式)
+    :param when: 时刻，不带时区时按UTC处理
+    :param latitude: 纬度(度，北为正)
+    :param longitude: 经度(度，东为正)
+    :return: (方位角, 高度角)，方位角从正北顺时针计，单位都是度
+    """
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc)
+    hour = when.hour + when.minute / 60 + when.second / 3600
+    gamma = 2 * math.pi / 365 * (when.timetuple().tm_yday - 1 + (hour - 12) / 24)
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+                                 - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * math.cos(gamma) + 0.070257 * math.sin(gamma)
+                   - 0.006758 * math.cos(2 * gamma) + 0.000907 * math.sin(2 * gamma)
+                   - 0.002697 * math.cos(3 * gamma) + 0.00148 * math.sin(3 * gamma))
+    true_solar_minutes = hour * 60 + equation_of_time + 4 * longitude
+    hour_angle = math.radians(true_solar_minutes / 4 - 180)
+    lat = math.radians(latitude)
+    cos_zenith = math.sin(lat) * math.sin(declination) + math.cos(lat) * math.cos(declination) * math.cos(hour_angle)
+    altitude = 90 - math.degrees(math.acos(max(-1.0, min(1.0, cos_zenith))))
+    azimuth = math.degrees(math.atan2(math.sin(hour_angle),
+                                      math.cos(hour_angle) * math.sin(lat) - math.tan(declination) * math.cos(lat)))
+    return (azimuth + 180) % 360, altitude
+
+
+class ShadowEngine:
+    def __init__(self, template, north_angle: float = 0.0):
+        """
+        :param template: DataTemplate
+        :param north_angle: 正北方向相对于+Y轴的角度(逆时针，度)
+        """
+        self.template = template
+        self.north_angle = north_angle
+        self._prepared = None
+        self._written = []  # 上一次写回了阴影的DataElement
+
+    # 重新整理轮廓(物件高度或几何改变之后调用)
+    def invalidate(self):
+        self._prepared = None
+
+    # 整理所有有高度的物件下的Polygon轮廓
+    def _prepare(self) -> dict:
+        if self._prepared is not None:
+            return self._prepared
+        elements, owners, heights = [], [], []
+        for element, owner in self.template._element_index.values():
+            if isinstance(element.geometry, Polygon) and not element.geometry.is_empty and owner.height > 0:
+                elements.append(element)
+                owners.append(owner)
+                heights.append(owner.height)
+        footprints = np.array([element.geometry for element in elements], dtype=object)
+        heights = np.asarray(heights, dtype=np.float64)
+        # 所有环(外环和内环)的坐标，以及每个坐标属于哪个轮廓
+        rings = shapely.get_rings(footprints) if len(footprints) else np.empty(0, dtype=object)
+        ring_owner = np.repeat(np.arange(len(footprints)), shapely.get_num_interior_rings(footprints) + 1) \
+            if len(footprints) else np.empty(0, dtype=np.int64)
+        ring_coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+        # 环上相邻的两个点组成一条边(环是闭合的，最后一个点等于第一个点)
+        same_ring = ring_index[1:] == ring_index[:-1]
+        edge_start = ring_coords[:-1][same_ring]
+        edge_end = ring_coords[1:][same_ring]
+        edge_footprint = ring_owner[ring_index[:-1][same_ring]]
+        # 凸轮廓(没有内环且面积等于凸包面积)
+        convex = np.zeros(len(footprints), dtype=bool)
+        if len(footprints):
+            convex = (shapely.get_num_interior_rings(footprints) == 0) & np.isclose(
+                shapely.area(footprints), shapely.area(shapely.convex_hull(footprints)), rtol=1e-9, atol=0)
+        convex_coords, convex_coord_footprint = shapely.get_coordinates(
+            shapely.get_exterior_ring(footprints[convex]), return_index=True)
+        convex_coord_footprint = np.flatnonzero(convex)[convex_coord_footprint]
+        concave = np.flatnonzero(~convex)
+        _, concave_coord_footprint = shapely.get_coordinates(footprints[concave], return_index=True)
+        concave_coord_footprint = concave[concave_coord_footprint]
+        concave_edges = ~convex[edge_footprint]
+        # 轮廓按所属物件分组
+        object_keys = [owner.index for owner in owners]
+        self._prepared = {
+            'elements': elements,
+            'owners': owners,
+            'footprints': footprints,
+            'heights': heights,
+            'convex': convex,
+            'convex_coords': convex_coords,
+            'convex_coord_footprint': convex_coord_footprint,
+            'concave': concave,
+            'concave_coord_footprint': concave_coord_footprint,
+            'edge_start': edge_start[concave_edges],
+            'edge_end': edge_end[concave_edges],
+            'edge_footprint': edge_footprint[concave_edges],
+            'object_keys': object_keys,
+        }
+        return self._prepared
+
+    # 清除上一次写回、这次不再覆盖的阴影(太阳落山，或者物件高度变成0)
+    def _clear_written(self, keep: list = ()):
+        keep = set(map(id, keep))
+        for element in self._written:
+            if id(element) not in keep:
+                element.shadow = None
+                element.has_shadow = False
+        self._written = []
+
+    # 单位高度的阴影偏移向量(方向背离太阳，长度为1/tan(高度角))
+    def shadow_vector(self, azimuth: float, altitude: float) -> np.ndarray:
+        azimuth_rad = math.radians(azimuth)
+        direction = np.array([-math.sin(azimuth_rad), -math.cos(azimuth_rad)])
+        north = math.radians(self.north_angle)
+        rotation = np.array([[math.cos(north), -math.sin(north)], [math.sin(north), math.cos(north)]])
+        return rotation @ direction / math.tan(math.radians(altitude))
+
+    def compute(self, azimuth: float, altitude: float, write_back: bool = True) -> Dict[int, Any]:
+        """
+        计算一个太阳位置下的阴影
+        :param azimuth: 太阳方位角，从正北顺时针(度)
+        :param altitude: 太阳高度角(度)
+        :param write_back: 是否把每个轮廓的阴影写回DataElement.shadow/has_shadow，没有阴影时清除上一次写回的结果
+        :return: 物件index -> 该物件所有轮廓阴影的并集
+        """
+        prepared = self._prepare()
+        if altitude < MIN_SUN_ALTITUDE or len(prepared['elements']) == 0:
+            if write_back:
+                self._clear_written()
+            return {}
+        offsets = np.outer(prepared['heights'], self.shadow_vector(azimuth, altitude))  # 每个轮廓的平移量
+        element_shadows = np.full(len(prepared['footprints']), None, dtype=object)
+
+        # 凸轮廓: 原顶点和平移后的顶点一起求凸包，一次批量完成
+        if prepared['convex'].any():
+            coords = prepared['convex_coords']
+            owner = prepared['convex_coord_footprint']
+            point_owner = np.concatenate((owner, owner))
+            # multipoints的indices要求递增，这里按轮廓序号排序后再创建
+            order = np.argsort(point_owner, kind='stable')
+            points = shapely.multipoints(np.concatenate((coords, coords + offsets[owner]))[order],
+                                         indices=point_owner[order],
+                                         out=np.full(len(prepared['footprints']), None, dtype=object))
+            element_shadows[prepared['convex']] = shapely.convex_hull(points[prepared['convex']])
+
+        # 凹轮廓: 轮廓 ∪ 平移后的轮廓 ∪ 每条边扫过的四边形
+        concave = prepared['concave']
+        if len(concave):
+            coord_offsets = offsets[prepared['concave_coord_footprint']]
+            moved = shapely.transform(prepared['footprints'][concave], lambda coords: coords + coord_offsets)
+            # 去掉和光线平行的退化四边形
+            start, end = prepared['edge_start'], prepared['edge_end']
+            edge_offsets = offsets[prepared['edge_footprint']]
+            edge = end - start
+            swept = np.abs(edge[:, 0] * edge_offsets[:, 1] - edge[:, 1] * edge_offsets[:, 0]) > 1e-12
+            quad_coords = np.stack([start, end, end + edge_offsets, start + edge_offsets, start], axis=1)[swept]
+            quads = shapely.polygons(quad_coords)
+            quad_footprint = prepared['edge_footprint'][swept]
+            # 按轮廓分组求并集
+            order = np.argsort(quad_footprint, kind='stable')
+            quad_groups = np.split(quads[order], np.searchsorted(quad_footprint[order], concave[1:]))
+            for i, moved_footprint, quad_group in zip(concave, moved, quad_groups):
+                parts = np.concatenate(([prepared['footprints'][i], moved_footprint], quad_group))
+                element_shadows[i] = shapely.union_all(parts)
+
+        # 再按物件求并集
+        grouped = {}
+        for key, shadow in zip(prepared['object_keys'], element_shadows):
+            grouped.setdefault(key, []).append(shadow)
+        object_shadows = {key: shadows[0] if len(shadows) == 1 else shapely.union_all(shadows)
+                          for key, shadows in grouped.items()}
+
+        if write_back:
+            self._clear_written(prepared['elements'])
+            for element, shadow in zip(prepared['elements'], element_shadows):
+                element.shadow = shadow
+                element.has_shadow = True
+            self._written = list(prepared['elements'])
+        return object_shadows
+
+    def compute_sun_path(self, times: Iterable[datetime], latitude: float,
+                         longitude: float) -> Dict[datetime, Dict[int, Any]]:
+        """
+        计算一组时刻的阴影(不写回DataElement)
+        :param times: 时刻列表
+        :param latitude: 纬度
+        :param longitude: 经度
+        :return: 时刻 -> (物件index -> 阴影)
+        """
+        result = {}
+        for when in times:
+            azimuth, altitude = solar_position(when, latitude, longitude)
+            result[when] = self.compute(azimuth, altitude, write_back=False)
+        return result
@@ -0,0 +1,343 @@
+"""
+@ART DataTemplate的二进制快照
+文件布局(小端):
+  [0:32)  文件头: 魔数(8) 版本(uint32) 保留(uint32) 目录偏移(uint64) 目录长度(uint64)
+  [64:)   各个数组，按64字节对齐依次存放
+  目录     json，记录每个数组的dtype/shape/偏移，以及图层表、物件名字和标注等字符串
+几何拆成坐标缓冲区 + 两级偏移(元素 -> 部件(点/线/环)，部件 -> 坐标)，其他类型的几何存WKB；
+读取时把整个文件内存映射，元素存进SnapshotElementStore，几何第一次访问时才创建，
+DataTemplate也是第一次访问TemplateSnapshot.template时才组装
+"""
+import json
+import mmap
+import struct
+from uuid import UUID
+from typing import *
+import numpy as np
+import shapely
+from shapely.geometry import Point, LineString, LinearRing, Polygon
+from art_datastructure.data_structure import DataObject, DataTemplate
+from art_datastructure.element_store import ElementStore, ElementView
+from art_datastructure.hierarchy import Hierarchy, NO_PARENT
+
+SNAPSHOT_MAGIC = b'ARTSNAP\0'
+SNAPSHOT_VERSION = 1
+HEADER_FORMAT = '<8sIIQQ'
+DATA_START = 64
+ALIGNMENT = 64
+
+# 元素几何的类型编码
+KIND_NONE = 0
+KIND_POINT = 1
+KIND_LINESTRING = 2
+KIND_LINEARRING = 3
+KIND_POLYGON = 4
+KIND_WKB = 5
+# shapely的类型id -> 几何类型编码
+_TYPE_ID_KINDS = {0: KIND_POINT, 1: KIND_LINESTRING, 2: KIND_LINEARRING, 3: KIND_POLYGON}
+
+# 物件父节点位置的特殊值: 挂在根节点下 / 不在树中
+PARENT_ROOT = -1
+PARENT_NONE = -2
+
+
+# 把一组几何拆成 类型编码、坐标缓冲区、部件偏移、坐标偏移 以及WKB
+def _encode_geometries(geometries: np.ndarray) -> Dict[str, np.ndarray]:
+    count = len(geometries)
+    type_ids = shapely.get_type_id(geometries)
+    kinds = np.full(count, KIND_WKB, dtype=np.int8)
+    kinds[type_ids == -1] = KIND_NONE
+    for type_id, kind in _TYPE_ID_KINDS.items():
+        kinds[type_ids == type_id] = kind
+    # 空几何和带z坐标的几何也存WKB，坐标缓冲区只放二维坐标
+    kinds[(kinds != KIND_NONE) & (shapely.is_empty(geometries) | shapely.has_z(geometries))] = KIND_WKB
+    polygons = kinds == KIND_POLYGON
+    simple = np.isin(kinds, (KIND_POINT, KIND_LINESTRING, KIND_LINEARRING))
+    # 每个元素的部件数: 多边形是外环+内环，点和线是自己
+    part_counts = np.zeros(count, dtype=np.int64)
+    part_counts[simple] = 1
+    part_counts[polygons] = shapely.get_num_interior_rings(geometries[polygons]) + 1
+    part_offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(part_counts, out=part_offsets[1:])
+    parts = np.empty(part_offsets[-1], dtype=object)
+    parts[part_offsets[:-1][simple]] = geometries[simple]
+    # get_rings按多边形顺序返回外环和内环，正好填满多边形占的连续部件位置
+    polygon_parts = np.repeat(polygons, part_counts)
+    parts[polygon_parts] = shapely.get_rings(geometries[polygons])
+    coords = shapely.get_coordinates(parts)
+    coord_offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum(shapely.get_num_coordinates(parts), out=coord_offsets[1:])
+    # 其余类型存WKB
+    wkb_lengths = np.zeros(count, dtype=np.int64)
+    wkb_items = shapely.to_wkb(geometries[kinds == KIND_WKB]).tolist()
+    wkb_lengths[kinds == KIND_WKB] = [len(each) for each in wkb_items]
+    wkb_offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(wkb_lengths, out=wkb_offsets[1:])
+    return {
+        'geometry_kinds': kinds,
+        'coords': np.ascontiguousarray(coords, dtype=np.float64),
+        'part_offsets': part_offsets,
+        'coord_offsets': coord_offsets,
+        'wkb': np.frombuffer(b''.join(wkb_items), dtype=np.uint8),
+        'wkb_offsets': wkb_offsets,
+    }
+
+
+def save_snapshot(template: DataTemplate, file_path: str):
+    """
+    把DataTemplate写成二进制快照(阴影不保存，需要时重新计算)
+    :param template: DataTemplate
+    :param file_path: 输出文件
+    :return:
+    """
+    data_objects = list(template.data_objects or [])
+    object_positions = {id(each): position for position, each in enumerate(data_objects)}
+    elements = [element for each in data_objects for element in each.elements]
+    element_counts = np.array([len(each.elements) for each in data_objects], dtype=np.int64)
+    object_element_offsets = np.zeros(len(data_objects) + 1, dtype=np.int64)
+    np.cumsum(element_counts, out=object_element_offsets[1:])
+
+    # 元素: 几何、id、图层编码、编组
+    geometries = np.empty(len(elements), dtype=object)
+    geometries[:] = [each.geometry for each in elements]
+    arrays = _encode_geometries(geometries)
+    layer_table, layer_codes = [], {}
+    for each in elements:
+        if each.type not in layer_codes:
+            layer_codes[each.type] = len(layer_table)
+            layer_table.append(each.type)
+    arrays['element_layers'] = np.array([layer_codes[each.type] for each in elements], dtype=np.int32)
+    arrays['element_ids'] = np.array([each.id.bytes for each in elements], dtype='S16')
+    group_lists = [each.group_list for each in elements]
+    arrays['group_count'] = np.array([len(each) if each is not None else -1 for each in group_lists], dtype=np.int32)
+    arrays['group_start'] = np.zeros(len(elements), dtype=np.int64)
+    if len(elements):
+        arrays['group_start'][1:] = np.cumsum(np.maximum(arrays['group_count'], 0))[:-1]
+    arrays['group_flat'] = np.array([index for each in group_lists if each is not None for index in each],
+                                    dtype=np.int32)
+
+    # 物件: 数值属性按列存，父节点存成物件位置
+    tree = template.tree
+    parents = np.full(len(data_objects), PARENT_NONE, dtype=np.int64)
+    for position, each in enumerate(data_objects):
+        if tree is not None and tree.contains(each.index) and tree[each.index].data is each:
+            parent = tree.parent(each.index)
+            if parent is None:
+                continue
+            parents[position] = PARENT_ROOT if parent.identifier == tree.root else \
+                object_positions.get(id(parent.data), PARENT_NONE)
+    arrays['object_index'] = np.array([each.index for each in data_objects], dtype=np.int64)
+    arrays['object_ids'] = np.array([each.id.bytes for each in data_objects], dtype='S16')
+    arrays['object_floor'] = np.array([each.floor for each in data_objects], dtype=np.int64)
+    arrays['object_height'] = np.array([each.height for each in data_objects], dtype=np.float64)
+    arrays['object_zorder'] = np.array([each.zorder for each in data_objects], dtype=np.int64)
+    arrays['object_parent'] = parents
+    # 在兄弟节点中的序号，载入时按它恢复子节点顺序
+    sibling_ranks = tree.sibling_ranks() if tree is not None else {}
+    arrays['object_sibling'] = np.array([sibling_ranks.get(each.index, 0) if parents[position] != PARENT_NONE else 0
+                                         for position, each in enumerate(data_objects)], dtype=np.int64)
+    arrays['object_element_offsets'] = object_element_offsets
+
+    directory = {
+        'arrays': {},
+        'layer_table': layer_table,
+        'object_names': [each.name for each in data_objects],
+        'object_annotations': [each.annotations for each in data_objects],
+        'object_attributes': [each.attributes for each in data_objects],
+        'root': tree.root if tree is not None else None,
+        'root_tag': tree[tree.root].tag if tree is not None and tree.root is not None else None,
+        'bounds': shapely.total_bounds(geometries).tolist() if len(elements) else None,
+    }
+    with open(file_path, 'wb') as f:
+        f.write(b'\0' * DATA_START)
+        for name, array in arrays.items():
+            offset = f.tell()
+            if offset % ALIGNMENT:
+                f.write(b'\0' * (ALIGNMENT - offset % ALIGNMENT))
+                offset = f.tell()
+            array = np.ascontiguousarray(array)
+            f.write(array.tobytes())
+            directory['arrays'][name] = [array.dtype.str, list(array.shape), offset]
+        directory_offset = f.tell()
+        encoded = json.dumps(directory, ensure_ascii=False).encode('utf-8')
+        f.write(encoded)
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, directory_offset, len(encoded)))
+
+
+class LazyGeometryArray:
+    """
+    按需创建几何的列，接口只覆盖ElementStore/ElementView用到的部分(取单个、切片、赋值、长度)
+    """
+    dtype = np.dtype(object)
+
+    def __init__(self, snapshot: 'TemplateSnapshot', capacity: int):
+        self._snapshot = snapshot
+        self._decoded = {}  # 行号 -> 已创建或者被赋值的几何
+        self._capacity = capacity
+
+    def __len__(self):
+        return self._capacity
+
+    def resize(self, capacity: int):
+        self._capacity = capacity
+
+    def _get(self, row: int):
+        geometry = self._decoded.get(row)
+        if geometry is None and row not in self._decoded and row < self._snapshot.element_count:
+            geometry = self._snapshot.geometry(row)
+            self._decoded[row] = geometry
+        return geometry
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self._get(int(key))
+        rows = range(self._capacity)[key] if isinstance(key, slice) else np.asarray(key).tolist()
+        result = np.empty(len(rows), dtype=object)
+        result[:] = [self._get(row) for row in rows]
+        return result
+
+    def __setitem__(self, key, value):
+        if isinstance(key, (int, np.integer)):
+            self._decoded[int(key)] = value
+            return
+        rows = range(self._capacity)[key] if isinstance(key, slice) else np.asarray(key).tolist()
+        for row, geometry in zip(rows, value):
+            self._decoded[row] = geometry
+
+    def __array__(self, dtype=None, copy=None):
+        return self[:]
+
+
+class SnapshotElementStore(ElementStore):
+    """
+    列直接来自快照文件的内存映射(写时复制)，几何第一次访问时创建；追加元素时才把列复制到内存中扩容
+    """
+
+    def __init__(self, snapshot: 'TemplateSnapshot'):
+        count = snapshot.element_count
+        self.size = count
+        self.geometries = LazyGeometryArray(snapshot, count)
+        self.layer_codes = snapshot.arrays['element_layers']
+        self.ids = snapshot.arrays['element_ids']
+        self.has_shadow = np.zeros(count, dtype=bool)
+        self.group_start = snapshot.arrays['group_start']
+        self.group_count = snapshot.arrays['group_count']
+        self.group_flat = snapshot.arrays['group_flat']
+        self.group_owner = np.repeat(np.arange(count, dtype=np.int32), np.maximum(self.group_count, 0))
+        self.group_size = len(self.group_flat)
+        self.layer_table = list(snapshot.directory['layer_table'])
+        self._layer_codes = {layer: code for code, layer in enumerate(self.layer_table)}
+        self.shadows = {}
+
+    def _grow(self, columns: List[str], needed: int):
+        if 'geometries' in columns and needed > len(self.geometries):
+            self.geometries.resize(max(needed, len(self.geometries) * 2))
+        super()._grow([name for name in columns if name != 'geometries'], needed)
+
+
+class TemplateSnapshot:
+    def __init__(self, file_path: str):
+        """
+        打开快照: 只读文件头和目录并映射各个数组，不创建任何物件和几何
+        :param file_path: 快照文件
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, _, directory_offset, directory_length = struct.unpack_from(HEADER_FORMAT, self._buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise Exception("{}不是DataTemplate快照文件".format(file_path))
+        if version != SNAPSHOT_VERSION:
+            raise Exception("不支持的快照版本{}".format(version))
+        self.directory = json.loads(bytes(self._buffer[directory_offset:directory_offset + directory_length]))
+        self.arrays = {}
+        for name, (dtype, shape, offset) in self.directory['arrays'].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            self.arrays[name] = np.frombuffer(self._buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+        self._template = None
+
+    @property
+    def element_count(self) -> int:
+        return len(self.arrays['geometry_kinds'])
+
+    @property
+    def object_count(self) -> int:
+        return len(self.arrays['object_index'])
+
+    # 所有元素的总外包框(min_x, min_y, max_x, max_y)，不需要创建几何
+    @property
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        bounds = self.directory['bounds']
+        return tuple(bounds) if bounds is not None else None
+
+    # 创建第row个元素的几何
+    def geometry(self, row: int):
+        arrays = self.arrays
+        kind = arrays['geometry_kinds'][row]
+        if kind == KIND_NONE:
+            return None
+        if kind == KIND_WKB:
+            start, end = arrays['wkb_offsets'][row:row + 2]
+            return shapely.from_wkb(arrays['wkb'][start:end].tobytes())
+        part_start, part_end = arrays['part_offsets'][row:row + 2]
+        coord_offsets = arrays['coord_offsets']
+        coords = arrays['coords']
+        rings = [coords[coord_offsets[part]:coord_offsets[part + 1]] for part in range(part_start, part_end)]
+        if kind == KIND_POINT:
+            return Point(rings[0][0])
+        if kind == KIND_LINESTRING:
+            return LineString(rings[0])
+        if kind == KIND_LINEARRING:
+            return LinearRing(rings[0])
+        return Polygon(rings[0], rings[1:])
+
+    # 第一次访问时组装DataTemplate，元素是SnapshotElementStore的视图
+    @property
+    def template(self) -> DataTemplate:
+        if self._template is not None:
+            return self._template
+        arrays, directory = self.arrays, self.directory
+        store = SnapshotElementStore(self)
+        views = [ElementView(store, row) for row in range(self.element_count)]
+        offsets = arrays['object_element_offsets'].tolist()
+        data_objects = []
+        placeholder = Hierarchy()  # 先共用一个空树，避免每个DataObject各建一棵
+        for position, (index, object_id, floor, height, zorder) in enumerate(zip(
+                arrays['object_index'].tolist(), arrays['object_ids'].tolist(), arrays['object_floor'].tolist(),
+                arrays['object_height'].tolist(), arrays['object_zorder'].tolist())):
+            data_objects.append(DataObject(
+                elements=views[offsets[position]:offsets[position + 1]], id=UUID(bytes=object_id.ljust(16, b'\0')),
+                index=index, name=directory['object_names'][position], floor=floor, height=height,
+                global_tree=placeholder, annotations=directory['object_annotations'][position], zorder=zorder,
+                attributes=dict(directory['object_attributes'][position])))
+        # 层级: 根节点放在第0个位置，物件的父节点位置整体后移一位
+        tree = None
+        if directory['root'] is not None:
+            parents = arrays['object_parent']
+            in_tree = np.flatnonzero(parents != PARENT_NONE)
+            # from_parents按位置顺序排列子节点，先按兄弟序号稳定排序(旧快照没有序号时按物件顺序)
+            if 'object_sibling' in arrays:
+                in_tree = in_tree[np.argsort(arrays['object_sibling'][in_tree], kind='stable')]
+            tree_position = np.zeros(len(data_objects), dtype=np.int64)
+            tree_position[in_tree] = np.arange(1, len(in_tree) + 1)
+            tree_parents = np.where(parents[in_tree] == PARENT_ROOT, 0, tree_position[parents[in_tree]])
+            tree = Hierarchy.from_parents(
+                [directory['root']] + [data_objects[position].index for position in in_tree.tolist()],
+                [NO_PARENT] + tree_parents.tolist(), tags=[directory['root_tag']] + [None] * len(in_tree),
+                data=[None] + [data_objects[position] for position in in_tree.tolist()])
+            for each in data_objects:
+                each.global_tree = tree
+        self._template = DataTemplate(tree=tree, data_objects=data_objects, element_store=store)
+        return self._template
+
+
+# 打开快照(立即返回)
+def open_snapshot(file_path: str) -> TemplateSnapshot:
+    return TemplateSnapshot(file_path)
+
+
+# 打开快照并组装DataTemplate
+def load_snapshot(file_path: str) -> DataTemplate:
+    return TemplateSnapshot(file_path).template
@@ -0,0 +1,164 @@
+"""
+@ART DataElement几何的空间索引
+基于shapely的STRtree。STRtree建好之后不能修改，所以增删元素先记在补丁里：
+新增的元素放在pending里做向量化的暴力判断，删除的元素在结果里过滤掉，补丁太大时再整体重建
+"""
+import math
+from typing import *
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import box
+
+# 补丁超过 max(REBUILD_MIN_PATCH, 元素数量 * REBUILD_RATIO) 时重建STRtree
+REBUILD_MIN_PATCH = 64
+REBUILD_RATIO = 0.1
+
+
+class SpatialIndex:
+    def __init__(self, element_index: dict):
+        """
+        :param element_index: DataTemplate的元素索引 元素id -> (DataElement, DataObject)
+        """
+        self._element_index = element_index
+        self._tree = None
+        self._elements = []  # STRtree中第i个几何对应的DataElement
+        self._positions = {}  # 元素id -> 在STRtree中的位置
+        self._removed = set()  # 已经删除但还在STRtree里的位置
+        self._pending = {}  # 建树之后新增的元素 元素id -> DataElement
+        self._total_bounds = None  # 建树时所有几何的总外包框，没有几何时为None
+        self._dirty = True
+
+    def __len__(self):
+        self._refresh()
+        return len(self._elements) - len(self._removed) + len(self._pending)
+
+    # 下次查询时整体重建
+    def invalidate(self):
+        self._dirty = True
+
+    # 新增元素(同一个id再次加入时视为替换)
+    def add(self, element):
+        if self._dirty or element.geometry is None:
+            return
+        position = self._positions.pop(element.id, None)
+        if position is not None:
+            self._removed.add(position)
+        self._pending[element.id] = element
+
+    # 删除元素
+    def remove(self, element_id):
+        if self._dirty:
+            return
+        if self._pending.pop(element_id, None) is None and element_id in self._positions:
+            self._removed.add(self._positions.pop(element_id))
+
+    def _rebuild(self):
+        self._elements = [element for element, _ in self._element_index.values() if element.geometry is not None]
+        self._positions = {element.id: i for i, element in enumerate(self._elements)}
+        self._tree = STRtree([element.geometry for element in self._elements])
+        self._removed = set()
+        self._pending = {}
+        self._total_bounds = tuple(shapely.total_bounds(self._tree.geometries).tolist()) if self._elements else None
+        self._dirty = False
+
+    # 没有任何可查询的几何
+    def _empty(self) -> bool:
+        return len(self._elements) == len(self._removed) and not self._pending
+
+    def _refresh(self):
+        patch_size = len(self._pending) + len(self._removed)
+        if self._dirty or patch_size > max(REBUILD_MIN_PATCH, len(self._elements) * REBUILD_RATIO):
+            self._rebuild()
+
+    # STRtree结果去掉已删除的，再加上pending中满足条件的
+    def _collect(self, tree_hits: np.ndarray, pending_test: Callable) -> List[Tuple]:
+        if self._empty():
+            return []
+        elements = self._elements
+        removed = self._removed
+        hits = [elements[i] for i in tree_hits.tolist() if i not in removed]
+        if self._pending:
+            pending = list(self._pending.values())
+            mask = pending_test(np.array([element.geometry for element in pending], dtype=object))
+            hits.extend(element for element, hit in zip(pending, mask) if hit)
+        element_index = self._element_index
+        return [element_index[element.id] for element in hits]
+
+    # 外包框与bbox相交的元素
+    def query_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Tuple]:
+        self._refresh()
+        query_box = box(min_x, min_y, max_x, max_y)
+        return self._collect(self._tree.query(query_box),
+                             lambda geometries: shapely.intersects(shapely.envelope(geometries), query_box))
+
+    # 一次查询一组外包框(n行min_x, min_y, max_x, max_y，比如一个缩放级别的所有瓦片)，STRtree批量查询
+    # -> (每个结果对应的外包框序号, [(DataElement, DataObject)])
+    def query_bboxes(self, bounds: np.ndarray) -> Tuple[np.ndarray, List[Tuple]]:
+        self._refresh()
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        if self._empty():
+            return np.empty(0, dtype=np.int64), []
+        boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+        box_indexes, tree_indexes = self._tree.query(boxes)
+        if self._removed:
+            keep = ~np.isin(tree_indexes, np.fromiter(self._removed, dtype=np.int64, count=len(self._removed)))
+            box_indexes, tree_indexes = box_indexes[keep], tree_indexes[keep]
+        elements = self._elements
+        hits = [elements[i] for i in tree_indexes.tolist()]
+        if self._pending:
+            pending = list(self._pending.values())
+            pending_tree = STRtree(shapely.envelope(np.array([element.geometry for element in pending], dtype=object)))
+            pending_boxes, pending_indexes = pending_tree.query(boxes)
+            box_indexes = np.concatenate((box_indexes, pending_boxes))
+            hits.extend(pending[i] for i in pending_indexes.tolist())
+        element_index = self._element_index
+        return box_indexes, [element_index[element.id] for element in hits]
+
+    # 与geometry相交的元素
+    def query_intersects(self, geometry) -> List[Tuple]:
+        self._refresh()
+        return self._collect(self._tree.query(geometry, predicate='intersects'),
+                             lambda geometries: shapely.intersects(geometries, geometry))
+
+    # 与geometry距离不超过distance的元素
+    def query_within_distance(self, geometry, distance: float) -> List[Tuple]:
+        self._refresh()
+        return self._collect(self._tree.query(geometry, predicate='dwithin', distance=distance),
+                             lambda geometries: shapely.dwithin(geometries, geometry, distance))
+
+    # 离geometry最近的k个元素，按距离从近到远排列
+    def query_nearest(self, geometry, k: int = 1) -> List[Tuple]:
+        self._refresh()
+        if k <= 0 or self._empty():
+            return []
+        live = len(self._elements) - len(self._removed) + len(self._pending)
+        # 所有元素的总外包框，半径超过 到外包框的距离+对角线 时一定能包含全部元素
+        bounds = self._bounds()
+        bounds_box = box(*bounds)
+        max_radius = shapely.distance(geometry, bounds_box) + math.hypot(bounds[2] - bounds[0],
+                                                                          bounds[3] - bounds[1])
+        # 初始半径: 最近元素的距离，或者按元素密度估计的间距
+        radius = math.hypot(bounds[2] - bounds[0], bounds[3] - bounds[1]) / math.sqrt(live)
+        if len(self._elements) > 0:
+            _, distance = self._tree.query_nearest(geometry, return_distance=True, all_matches=False)
+            radius = max(radius, float(distance[0]))
+        radius = max(radius, 1e-9)
+        while True:
+            candidates = self.query_within_distance(geometry, radius)
+            if len(candidates) >= k or radius >= max_radius:
+                break
+            radius *= 2
+        distances = shapely.distance(np.array([element.geometry for element, _ in candidates], dtype=object),
+                                     geometry)
+        order = np.argsort(distances, kind='stable')[:k]
+        return [candidates[i] for i in order.tolist()]
+
+    # 总外包框: 建树时的外包框再并上pending，删除的元素不收缩(只会偏大，不影响正确性)
+    def _bounds(self) -> Tuple[float, float, float, float]:
+        bounds = [self._total_bounds] if len(self._elements) > 0 else []
+        if self._pending:
+            pending = np.array([element.geometry for element in self._pending.values()], dtype=object)
+            bounds.append(tuple(shapely.total_bounds(pending).tolist()))
+        return (min(each[0] for each in bounds), min(each[1] for each in bounds),
+                max(each[2] for each in bounds), max(each[3] for each in bounds))
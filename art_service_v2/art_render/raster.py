@@ -0,0 +1,202 @@
+"""
+@ART 用numpy做的简单光栅化(不依赖图形库)，坐标都是像素坐标，y轴向下
+  - 填充: 扫描线 + 奇偶规则，所有多边形的边一次性展开成(多边形, 行, 交点x)，排序后两两配对成区间，
+          区间端点写进差分数组再按行累加得到覆盖的像素
+  - 描边: 线段先裁剪到画布附近(Liang-Barsky)，按长度等距采样落到像素上，线宽大于1时再做方形膨胀
+  - 画布是预乘alpha的float32 RGBA，最后转成uint8，PNG用zlib编码
+没有抗锯齿，一个像素是否被覆盖只看像素中心
+"""
+import struct
+import zlib
+from typing import *
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def parse_color(value) -> Optional[Tuple[float, float, float, float]]:
+    """
+    解析颜色
+    :param value: '#RGB'/'#RRGGBB'/'#RRGGBBAA'/'r,g,b[,a]'/[r, g, b(, a)]，分量是0-255；空字符串或None表示不画
+    :return: 0-1的(r, g, b, a)，不画时为None
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith('#'):
+            text = text[1:]
+            if len(text) == 3:
+                text = ''.join(each * 2 for each in text)
+            if len(text) not in (6, 8):
+                raise Exception("无法解析颜色{}".format(value))
+            parts = [int(text[i:i + 2], 16) for i in range(0, len(text), 2)]
+        else:
+            parts = [float(each) for each in text.split(',')]
+    else:
+        parts = [float(each) for each in value]
+    if len(parts) == 3:
+        parts.append(255)
+    if len(parts) != 4:
+        raise Exception("无法解析颜色{}".format(value))
+    return tuple(min(max(each / 255.0, 0.0), 1.0) for each in parts)
+
+
+def new_canvas(width: int, height: int) -> np.ndarray:
+    return np.zeros((height, width, 4), dtype=np.float32)
+
+
+# 在mask覆盖的像素上叠加颜色(预乘alpha的source-over)
+def blend(canvas: np.ndarray, mask: np.ndarray, color: Tuple[float, float, float, float]):
+    if not mask.any():
+        return
+    alpha = color[3]
+    source = np.array([color[0] * alpha, color[1] * alpha, color[2] * alpha, alpha], dtype=np.float32)
+    if alpha >= 1.0:
+        canvas[mask] = source
+    else:
+        canvas[mask] = source + canvas[mask] * (1.0 - alpha)
+
+
+def fill_mask(edge_start: np.ndarray, edge_end: np.ndarray, edge_polygon: np.ndarray, width: int,
+              height: int) -> np.ndarray:
+    """
+    多边形填充的覆盖范围
+    :param edge_start: 所有环上每条边的起点(像素坐标)
+    :param edge_end: 终点
+    :param edge_polygon: 每条边属于第几个多边形(同一个多边形的外环和洞一起按奇偶规则)
+    :return: height×width的bool数组
+    """
+    mask = np.zeros((height, width), dtype=bool)
+    if len(edge_start) == 0:
+        return mask
+    x0, y0 = edge_start[:, 0], edge_start[:, 1]
+    x1, y1 = edge_end[:, 0], edge_end[:, 1]
+    # 每条边穿过的行: 行中心y+0.5在[min(y0,y1), max(y0,y1))中，水平边不穿过任何行
+    first = np.clip(np.ceil(np.minimum(y0, y1) - 0.5), 0, height).astype(np.int64)
+    stop = np.clip(np.ceil(np.maximum(y0, y1) - 0.5), 0, height).astype(np.int64)
+    counts = np.maximum(stop - first, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return mask
+    edge = np.repeat(np.arange(len(counts)), counts)
+    rows = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + first[edge]
+    dy = y1[edge] - y0[edge]
+    xs = x0[edge] + (rows + 0.5 - y0[edge]) * (x1[edge] - x0[edge]) / dy
+    # 同一个多边形同一行的交点按x排序，相邻两个组成一个区间(闭合环和每一行的交点数一定是偶数)
+    order = np.lexsort((xs, rows, edge_polygon[edge]))
+    xs, rows = xs[order], rows[order]
+    left = np.clip(np.ceil(xs[0::2] - 0.5), 0, width).astype(np.int64)
+    right = np.clip(np.ceil(xs[1::2] - 0.5), 0, width).astype(np.int64)
+    span_rows = rows[0::2]
+    valid = right > left
+    # 差分数组: 区间起点+1，终点-1，按行累加之后大于0的像素被覆盖
+    stride = width + 1
+    size = height * stride
+    difference = np.bincount(span_rows[valid] * stride + left[valid], minlength=size) - \
+        np.bincount(span_rows[valid] * stride + right[valid], minlength=size)
+    mask[:] = np.cumsum(difference.reshape(height, stride), axis=1)[:, :width] > 0
+    return mask
+
+
+# 把线段裁剪到[low, high]的正方形范围(Liang-Barsky) -> (起点, 终点, 是否保留)
+def clip_segments(start: np.ndarray, end: np.ndarray, low: float, high: float):
+    delta = end - start
+    t0 = np.zeros(len(start))
+    t1 = np.ones(len(start))
+    keep = np.ones(len(start), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for axis in (0, 1):
+            for p, q in ((-delta[:, axis], start[:, axis] - low), (delta[:, axis], high - start[:, axis])):
+                parallel = p == 0
+                keep &= ~(parallel & (q < 0))
+                ratio = q / p
+                t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+                t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+    keep &= t0 <= t1
+    return start + t0[:, None] * delta, start + t1[:, None] * delta, keep
+
+
+def stroke_mask(segment_start: np.ndarray, segment_end: np.ndarray, width: int, height: int,
+                line_width: float = 1.0) -> np.ndarray:
+    """
+    线段描边的覆盖范围
+    :param segment_start: 线段起点(像素坐标)
+    :param segment_end: 线段终点
+    :param line_width: 线宽(像素)
+    :return: height×width的bool数组
+    """
+    mask = np.zeros((height, width), dtype=bool)
+    if len(segment_start) == 0:
+        return mask
+    pad = line_width + 1
+    start, end, keep = clip_segments(segment_start, segment_end, -pad, max(width, height) + pad)
+    start, end = start[keep], end[keep]
+    if len(start) == 0:
+        return mask
+    # 每条线段按像素长度等距采样
+    counts = np.ceil(np.abs(end - start).max(axis=1)).astype(np.int64) + 1
+    segment = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    ratio = step / np.maximum(counts[segment] - 1, 1)
+    points = start[segment] + ratio[:, None] * (end[segment] - start[segment])
+    columns = np.floor(points[:, 0]).astype(np.int64)
+    rows = np.floor(points[:, 1]).astype(np.int64)
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+    mask[rows[inside], columns[inside]] = True
+    return dilate(mask, int(round(line_width)))
+
+
+# 方形膨胀到size个像素宽
+def dilate(mask: np.ndarray, size: int) -> np.ndarray:
+    if size <= 1:
+        return mask
+    before = (size - 1) // 2
+    after = size - 1 - before
+    height, width = mask.shape
+    padded = np.pad(mask, ((before, after), (before, after)))
+    result = np.zeros_like(mask)
+    for dy in range(size):
+        for dx in range(size):
+            result |= padded[dy:dy + height, dx:dx + width]
+    return result
+
+
+# 点画成size个像素宽的方块
+def point_mask(points: np.ndarray, width: int, height: int, size: int = 3) -> np.ndarray:
+    mask = np.zeros((height, width), dtype=bool)
+    if len(points) == 0:
+        return mask
+    columns = np.floor(points[:, 0]).astype(np.int64)
+    rows = np.floor(points[:, 1]).astype(np.int64)
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+    mask[rows[inside], columns[inside]] = True
+    return dilate(mask, size)
+
+
+# 预乘alpha的float画布转成普通的uint8 RGBA
+def to_rgba(canvas: np.ndarray) -> np.ndarray:
+    alpha = canvas[..., 3:4]
+    # 没画过的像素颜色是0，除以一个很小的数仍然是0
+    rgba = canvas * (255 / np.maximum(alpha, 1e-6))
+    rgba[..., 3:4] = alpha * 255
+    rgba += 0.5
+    return rgba.clip(0, 255, out=rgba).astype(np.uint8)
+
+
+def encode_png(rgba: np.ndarray, level: int = 6) -> bytes:
+    """
+    编码成PNG(8位RGBA，不做行过滤)
+    :param rgba: height×width×4的uint8数组
+    :param level: zlib压缩级别
+    :return: PNG文件内容
+    """
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # 每行开头一个字节的过滤类型0
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (PNG_SIGNATURE + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + chunk(b'IEND', b''))
@@ -0,0 +1,477 @@
+"""
+@ART 离线瓦片渲染: 按style.json的图层样式把DataTemplate渲染成XYZ瓦片金字塔(PNG)
+  - 网格: 覆盖所有元素的正方形，边长取2的整数次幂并对齐，第z级分成2^z×2^z块
+  - 选元素: 每一级所有瓦片的外包框(按线宽外扩)一次批量查询DataTemplate的空间索引
+  - 几何: 按这一级的比例从GeometryPyramid取简化后的几何，误差不超过半个像素
+  - 顺序: 按(图层zorder, 物件zorder, 元素顺序)绘制，连续的同一样式的元素一起先填充再描边
+  - 缓存: 瓦片的键是 渲染参数 + 瓦片内按绘制顺序每个元素的摘要(几何WKB、样式、zorder)的哈希，
+          按内容寻址，元素改变之后只有包含它的瓦片的键会变，其他瓦片直接命中缓存
+  - 并行: 需要渲染的瓦片分块交给进程池，子进程初始化时收到一次所有几何的WKB，之后每个任务只传元素行号，
+          渲染结果由子进程直接写进缓存
+TextDot标注不是DataElement，不在瓦片中
+用法: python -m art_render.tile_renderer <3dm文件> [--zooms 0 5] [--out tiles] [--cache-dir .tile_cache]
+                                         [--workers N] [--style style.json]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import *
+import numpy as np
+import shapely
+from art_3dm_reader.rhino_reader_constant import STYLE_JSON_PATH
+from art_datastructure.data_structure import DataTemplate
+from art_render.raster import (blend, encode_png, fill_mask, new_canvas, parse_color, point_mask, stroke_mask,
+                               to_rgba)
+
+# 渲染方式变化时修改，旧的瓦片缓存自然失效
+RENDER_VERSION = 1
+TILE_SIZE = 256
+# 每个进程任务包含的瓦片数
+TILES_PER_TASK = 16
+# style.json中图层没有填充也没有描边颜色时的描边颜色
+DEFAULT_STROKE_COLOR = '#000000'
+# shapely的type id
+_POINT_TYPE, _LINE_TYPE, _RING_TYPE, _POLYGON_TYPE = 0, 1, 2, 3
+
+
+@dataclass(frozen=True)
+class LayerStyle:
+    """
+    一个图层的样式，颜色是0-1的(r, g, b, a)，None表示不画
+    """
+    fill_color: Optional[tuple] = field(default=None)
+    stroke_color: Optional[tuple] = field(default=None)
+    stroke_width: float = field(default=1.0)  # 像素
+    zorder: int = field(default=0)
+
+    # 影响渲染结果的内容，用于瓦片缓存的键
+    @property
+    def cache_key(self) -> bytes:
+        return repr((self.fill_color, self.stroke_color, self.stroke_width, self.zorder)).encode('utf-8')
+
+
+DEFAULT_STYLE = LayerStyle(stroke_color=parse_color(DEFAULT_STROKE_COLOR))
+
+
+# style.json中一个图层的样式(OBJ_STYLE_TEMPLATE里的键是zordor，两种拼写都认)
+def layer_style(record: dict) -> LayerStyle:
+    fill_color = parse_color(record.get('fill_color'))
+    stroke_color = parse_color(record.get('stroke_color'))
+    if fill_color is None and stroke_color is None:
+        stroke_color = DEFAULT_STYLE.stroke_color
+    return LayerStyle(fill_color=fill_color, stroke_color=stroke_color,
+                      stroke_width=float(record.get('stroke_width') or 1.0),
+                      zorder=int(record.get('zorder', record.get('zordor')) or 0))
+
+
+# create_style_json为一个3dm文件生成的style.json的路径
+def style_json_path(file_path: str) -> str:
+    return f"{STYLE_JSON_PATH}/{file_path.split('/')[-1].split('.')[0]}.json"
+
+
+def load_layer_styles(styles: Union[str, dict, None]) -> Dict[str, LayerStyle]:
+    """
+    读取图层样式
+    :param styles: style.json的路径，或者已经读出来的 图层名->样式字典，None时所有图层使用默认样式
+    :return: 图层名 -> LayerStyle
+    """
+    if styles is None:
+        return {}
+    if isinstance(styles, str):
+        with open(styles, 'r', encoding='utf-8') as f:
+            styles = json.load(f)
+    return {layer: each if isinstance(each, LayerStyle) else layer_style(each) for layer, each in styles.items()}
+
+
+@dataclass(frozen=True)
+class TileGrid:
+    """
+    正方形的瓦片网格: 第z级把[min_x, min_x + size]×[min_y, min_y + size]分成2^z×2^z块，
+    x从左往右、y从上往下编号(和XYZ瓦片一致)
+    """
+    min_x: float = field(default=0.0)
+    min_y: float = field(default=0.0)
+    size: float = field(default=1.0)
+    tile_size: int = field(default=TILE_SIZE)
+
+    @classmethod
+    def covering(cls, bounds: Sequence[float], tile_size: int = TILE_SIZE) -> 'TileGrid':
+        """
+        覆盖bounds的网格，原点对齐到step(不超过范围1/8的2的整数次幂)的整数倍，边长是step的2的整数次幂倍，
+        元素范围小幅变化时网格不变(瓦片缓存仍然有效)
+        :param bounds: (min_x, min_y, max_x, max_y)
+        :param tile_size: 瓦片像素大小
+        :return: TileGrid
+        """
+        min_x, min_y, max_x, max_y = bounds
+        step = 2.0 ** (math.floor(math.log2(max(max_x - min_x, max_y - min_y, 1e-9))) - 3)
+        origin_x = math.floor(min_x / step) * step
+        origin_y = math.floor(min_y / step) * step
+        span = max(max_x - origin_x, max_y - origin_y, step)
+        size = step * 2.0 ** math.ceil(math.log2(span / step))
+        return cls(min_x=origin_x, min_y=origin_y, size=size, tile_size=tile_size)
+
+    # 第zoom级每个像素对应的图纸长度
+    def units_per_pixel(self, zoom: int) -> float:
+        return self.size / 2 ** zoom / self.tile_size
+
+    # 一块瓦片的范围 -> (min_x, min_y, max_x, max_y)
+    def tile_bounds(self, zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+        span = self.size / 2 ** zoom
+        top = self.min_y + self.size - y * span
+        return self.min_x + x * span, top - span, self.min_x + (x + 1) * span, top
+
+    # 与bounds相交的瓦片编号范围 -> (x0, y0, x1, y1)，包含两端
+    def tile_range(self, zoom: int, bounds: Sequence[float]) -> Tuple[int, int, int, int]:
+        count = 2 ** zoom
+        span = self.size / count
+        min_x, min_y, max_x, max_y = bounds
+
+        def clamp(value: float) -> int:
+            return min(max(int(math.floor(value)), 0), count - 1)
+
+        top = self.min_y + self.size
+        return (clamp((min_x - self.min_x) / span), clamp((top - max_y) / span),
+                clamp((max_x - self.min_x) / span), clamp((top - min_y) / span))
+
+
+class TileCache:
+    def __init__(self, cache_dir: str):
+        """
+        按内容寻址的瓦片缓存: 键是瓦片内容的哈希，文件放在 cache_dir/键的前两位/键.png
+        :param cache_dir: 缓存文件夹
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.png')
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    # 写入缓存: 临时文件写完再原子替换，多个进程同时写同一个键也不会读到半个文件
+    def put(self, key: str, data: bytes):
+        folder = os.path.join(self.cache_dir, key[:2])
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # 读取缓存，没有命中返回None
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+@dataclass
+class RenderResult:
+    """
+    一次渲染的结果
+    """
+    tiles: Dict[Tuple[int, int, int], str] = field(default_factory=dict)  # (z, x, y) -> 缓存中的PNG路径，没有元素的瓦片不生成
+    rendered: int = field(default=0)  # 实际渲染的瓦片数
+    cached: int = field(default=0)  # 命中缓存的瓦片数
+    plan_seconds: float = field(default=0.0)  # 选元素和计算缓存键的时间
+    render_seconds: float = field(default=0.0)
+
+
+class _TileWorker:
+    def __init__(self, grid: TileGrid, styles: List[LayerStyle], style_of: np.ndarray,
+                 geometries: Dict[int, np.ndarray], cache_dir: str):
+        """
+        :param grid: 瓦片网格
+        :param styles: 样式表
+        :param style_of: 元素行号 -> 样式表中的序号
+        :param geometries: 简化级别 -> 每一行元素在这一级的几何
+        :param cache_dir: 瓦片缓存文件夹
+        """
+        self.grid = grid
+        self.styles = styles
+        self.style_of = style_of
+        self.geometries = geometries
+        self.cache = TileCache(cache_dir)
+
+    # 渲染一块瓦片，rows按绘制顺序
+    def render(self, zoom: int, x: int, y: int, level: int, rows: np.ndarray) -> bytes:
+        grid = self.grid
+        size = grid.tile_size
+        min_x, _, _, max_y = grid.tile_bounds(zoom, x, y)
+        scale = 1.0 / grid.units_per_pixel(zoom)
+        origin = np.array([min_x, max_y])
+        flip = np.array([scale, -scale])
+        canvas = new_canvas(size, size)
+        geometries = self.geometries[level][rows]
+        style_rows = self.style_of[rows]
+        # 连续的同一样式的元素一起画
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(style_rows)) + 1))
+        stops = np.append(starts[1:], len(rows))
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            style = self.styles[style_rows[start]]
+            parts = shapely.get_parts(geometries[start:stop])
+            type_ids = shapely.get_type_id(parts)
+            # 多边形的所有环的边，填充和描边共用
+            polygons = parts[type_ids == _POLYGON_TYPE]
+            edge_start = edge_end = np.empty((0, 2))
+            if len(polygons):
+                rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+                coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+                pixels = (coords - origin) * flip
+                same_ring = ring_index[1:] == ring_index[:-1]
+                edge_start, edge_end = pixels[:-1][same_ring], pixels[1:][same_ring]
+                if style.fill_color is not None:
+                    blend(canvas, fill_mask(edge_start, edge_end, ring_polygon[ring_index[:-1][same_ring]], size,
+                                            size), style.fill_color)
+            if style.stroke_color is None:
+                continue
+            lines = parts[(type_ids == _LINE_TYPE) | (type_ids == _RING_TYPE)]
+            if len(lines):
+                coords, line_index = shapely.get_coordinates(lines, return_index=True)
+                pixels = (coords - origin) * flip
+                same_line = line_index[1:] == line_index[:-1]
+                edge_start = np.concatenate((edge_start, pixels[:-1][same_line]))
+                edge_end = np.concatenate((edge_end, pixels[1:][same_line]))
+            blend(canvas, stroke_mask(edge_start, edge_end, size, size, style.stroke_width), style.stroke_color)
+            points = parts[type_ids == _POINT_TYPE]
+            if len(points):
+                pixels = (shapely.get_coordinates(points) - origin) * flip
+                blend(canvas, point_mask(pixels, size, size, max(3, int(round(style.stroke_width)))),
+                      style.stroke_color)
+        return encode_png(to_rgba(canvas))
+
+    # 渲染一组瓦片并写进缓存 -> 每块瓦片PNG的字节数
+    def run(self, jobs: List[tuple]) -> List[int]:
+        sizes = []
+        for key, zoom, x, y, level, rows in jobs:
+            data = self.render(zoom, x, y, level, rows)
+            self.cache.put(key, data)
+            sizes.append(len(data))
+        return sizes
+
+
+# 子进程中的_TileWorker，由进程池的initializer创建
+_worker = None
+
+
+# 子进程初始化: 解码一次所有几何，各简化级别只替换有变化的行
+def _init_worker(grid: TileGrid, styles: List[LayerStyle], style_of: np.ndarray, base_wkb: np.ndarray,
+                 level_wkb: Dict[int, Tuple[np.ndarray, np.ndarray]], cache_dir: str):
+    global _worker
+    base = shapely.from_wkb(base_wkb)
+    geometries = {}
+    for level, (rows, wkb) in level_wkb.items():
+        geometries[level] = base.copy()
+        geometries[level][rows] = shapely.from_wkb(wkb)
+    _worker = _TileWorker(grid, styles, style_of, geometries, cache_dir)
+
+
+def _render_in_worker(jobs: List[tuple]) -> List[int]:
+    return _worker.run(jobs)
+
+
+class TileRenderer:
+    def __init__(self, template: DataTemplate, styles: Union[str, dict] = None, cache_dir: str = '.tile_cache',
+                 grid: TileGrid = None, max_workers: int = None):
+        """
+        :param template: DataTemplate
+        :param styles: style.json路径或者图层样式字典，见load_layer_styles
+        :param cache_dir: 瓦片缓存文件夹
+        :param grid: 瓦片网格，默认覆盖所有元素(TileGrid.covering)
+        :param max_workers: 渲染进程数，默认为cpu核数，1时在当前进程中渲染
+        """
+        self.template = template
+        self.styles = load_layer_styles(styles)
+        self.cache = TileCache(cache_dir)
+        self.grid = grid
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    # 整理所有元素: 行号、样式、绘制顺序
+    def _prepare(self) -> dict:
+        hits = [(element, owner) for element, owner in self.template._element_index.values()
+                if element.geometry is not None]
+        style_table, style_codes = [], {}
+        style_of = np.empty(len(hits), dtype=np.int64)
+        layer_zorder = np.empty(len(hits), dtype=np.int64)
+        object_zorder = np.empty(len(hits), dtype=np.int64)
+        for row, (element, owner) in enumerate(hits):
+            style = self.styles.get(element.type, DEFAULT_STYLE)
+            code = style_codes.get(style)
+            if code is None:
+                code = style_codes[style] = len(style_table)
+                style_table.append(style)
+            style_of[row] = code
+            layer_zorder[row] = style.zorder
+            object_zorder[row] = owner.zorder
+        # 绘制顺序: 图层zorder，再物件zorder，再元素顺序
+        order = np.lexsort((np.arange(len(hits)), object_zorder, layer_zorder))
+        rank = np.empty(len(hits), dtype=np.int64)
+        rank[order] = np.arange(len(hits))
+        bounds = shapely.total_bounds(np.array([element.geometry for element, _ in hits], dtype=object)) \
+            if hits else np.zeros(4)
+        return {'hits': hits, 'row_of': {element.id: row for row, (element, _) in enumerate(hits)},
+                'styles': style_table, 'style_of': style_of, 'object_zorder': object_zorder, 'rank': rank,
+                'bounds': tuple(bounds.tolist()), 'geometries': {}, 'digests': {}}
+
+    # 某个简化级别每一行的几何和摘要(几何WKB + 样式 + 物件zorder)
+    def _level_geometries(self, prepared: dict, level: int) -> np.ndarray:
+        if level not in prepared['geometries']:
+            pyramid = self.template.geometry_pyramid
+            geometries = np.array([geometry for geometry, _, _ in pyramid.simplified(prepared['hits'], level)],
+                                  dtype=object)
+            style_keys = [style.cache_key for style in prepared['styles']]
+            digests = bytearray()
+            for wkb, style, zorder in zip(shapely.to_wkb(geometries).tolist(), prepared['style_of'].tolist(),
+                                          prepared['object_zorder'].tolist()):
+                digest = hashlib.blake2b(wkb, digest_size=16)
+                digest.update(style_keys[style])
+                digest.update(zorder.to_bytes(8, 'little', signed=True))
+                digests += digest.digest()
+            prepared['geometries'][level] = geometries
+            prepared['digests'][level] = np.frombuffer(bytes(digests), dtype=np.uint8).reshape(-1, 16)
+        return prepared['geometries'][level]
+
+    # 一个缩放级别的所有非空瓦片 -> [(缓存键, z, x, y, 简化级别, 按绘制顺序的行号)]
+    def _plan_zoom(self, prepared: dict, grid: TileGrid, zoom: int) -> List[tuple]:
+        units_per_pixel = grid.units_per_pixel(zoom)
+        level = self.template.geometry_pyramid.level_for_scale(units_per_pixel)
+        self._level_geometries(prepared, level)
+        x0, y0, x1, y1 = grid.tile_range(zoom, prepared['bounds'])
+        xs, ys = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1), indexing='ij')
+        xs, ys = xs.ravel(), ys.ravel()
+        span = grid.size / 2 ** zoom
+        # 按最大线宽外扩，边界外的线描边时也会画进瓦片
+        pad = (max([style.stroke_width for style in prepared['styles']] + [1.0]) / 2 + 2) * units_per_pixel
+        top = grid.min_y + grid.size
+        tile_bounds = np.stack((grid.min_x + xs * span - pad, top - (ys + 1) * span - pad,
+                                grid.min_x + (xs + 1) * span + pad, top - ys * span + pad), axis=1)
+        tile_indexes, hits = self.template.spatial_index.query_bboxes(tile_bounds)
+        row_of = prepared['row_of']
+        rows = np.array([row_of[element.id] for element, _ in hits], dtype=np.int64)
+        order = np.lexsort((prepared['rank'][rows], tile_indexes))
+        tile_indexes, rows = tile_indexes[order], rows[order]
+        splits = np.flatnonzero(np.diff(tile_indexes)) + 1
+        digests = prepared['digests'][level]
+        jobs = []
+        for tile_rows, tile in zip(np.split(rows, splits), tile_indexes[np.concatenate(([0], splits))].tolist()
+                                   if len(rows) else []):
+            x, y = int(xs[tile]), int(ys[tile])
+            digest = hashlib.blake2b(repr((RENDER_VERSION, grid, zoom, x, y, level)).encode('utf-8'), digest_size=20)
+            digest.update(digests[tile_rows].tobytes())
+            jobs.append((digest.hexdigest(), zoom, x, y, level, tile_rows))
+        return jobs
+
+    # 在当前进程或者进程池中渲染
+    def _run(self, prepared: dict, jobs: List[tuple]):
+        # 元素多的瓦片先渲染，进程之间更均衡
+        jobs = sorted(jobs, key=lambda job: -len(job[5]))
+        if self.max_workers <= 1 or len(jobs) <= TILES_PER_TASK:
+            _TileWorker(self.grid_for(prepared), prepared['styles'], prepared['style_of'], prepared['geometries'],
+                        self.cache.cache_dir).run(jobs)
+            return
+        base = prepared['geometries'][0] if 0 in prepared['geometries'] else self._level_geometries(prepared, 0)
+        level_wkb = {}
+        for level, geometries in prepared['geometries'].items():
+            changed = np.flatnonzero([each is not original for each, original in zip(geometries, base)])
+            level_wkb[level] = (changed, shapely.to_wkb(geometries[changed]))
+        chunks = [jobs[i:i + TILES_PER_TASK] for i in range(0, len(jobs), TILES_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                 initargs=(self.grid_for(prepared), prepared['styles'], prepared['style_of'],
+                                           shapely.to_wkb(base), level_wkb, self.cache.cache_dir)) as executor:
+            for _ in executor.map(_render_in_worker, chunks):
+                pass
+
+    # 使用的网格
+    def grid_for(self, prepared: dict) -> TileGrid:
+        if self.grid is None:
+            self.grid = TileGrid.covering(prepared['bounds'])
+        return self.grid
+
+    def render(self, zooms: Iterable[int], out_dir: str = None) -> RenderResult:
+        """
+        渲染一组缩放级别的所有非空瓦片，缓存中已有的瓦片不再渲染
+        :param zooms: 缩放级别
+        :param out_dir: 给出时把瓦片放到 out_dir/z/x/y.png
+        :return: RenderResult
+        """
+        result = RenderResult()
+        start = time.perf_counter()
+        prepared = self._prepare()
+        if not prepared['hits']:
+            return result
+        grid = self.grid_for(prepared)
+        jobs = []
+        for zoom in zooms:
+            for job in self._plan_zoom(prepared, grid, zoom):
+                result.tiles[job[1:4]] = self.cache.path(job[0])
+                if job[0] in self.cache:
+                    result.cached += 1
+                else:
+                    jobs.append(job)
+        # 同样内容的瓦片只渲染一次
+        jobs = list({job[0]: job for job in jobs}.values())
+        result.plan_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        if jobs:
+            self._run(prepared, jobs)
+        result.rendered = len(jobs)
+        result.render_seconds = time.perf_counter() - start
+        if out_dir is not None:
+            export_tiles(result, out_dir)
+        return result
+
+
+def export_tiles(result: RenderResult, out_dir: str):
+    """
+    把缓存中的瓦片放到 out_dir/z/x/y.png，能建硬链接时不复制
+    :param result: RenderResult
+    :param out_dir: 输出文件夹
+    """
+    for (zoom, x, y), path in result.tiles.items():
+        target = pathlib.Path(out_dir, str(zoom), str(x), f'{y}.png')
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            target.unlink()
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+
+
+def main():
+    from art_3dm_reader.rhino_file_reader import Read3dmFile
+    parser = argparse.ArgumentParser(description='瓦片渲染')
+    parser.add_argument('file_path')
+    parser.add_argument('--zooms', type=int, nargs=2, default=[0, 5], metavar=('MIN', 'MAX'))
+    parser.add_argument('--out', default=None, help='瓦片输出文件夹(z/x/y.png)')
+    parser.add_argument('--cache-dir', default='.tile_cache')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--style', default=None, help='style.json，默认使用读取时生成的style.json')
+    args = parser.parse_args()
+    template = Read3dmFile(args.file_path).read_3dm_file()
+    style = args.style or style_json_path(args.file_path)
+    renderer = TileRenderer(template, style if os.path.exists(style) else None, cache_dir=args.cache_dir,
+                            max_workers=args.workers)
+    result = renderer.render(range(args.zooms[0], args.zooms[1] + 1), out_dir=args.out)
+    print(f'tiles={len(result.tiles)}  rendered={result.rendered}  cached={result.cached}  '
+          f'plan={result.plan_seconds:.2f}s  render={result.render_seconds:.2f}s')
+
+
+if __name__ == "__main__":
+    main()
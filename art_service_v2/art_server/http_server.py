@@ -0,0 +1,338 @@
+"""
+@ART 基于asyncio的本地HTTP/JSON服务(只用标准库)，查询逻辑在TemplateService里
+接口:
+  GET    /health                          服务状态
+  GET    /metrics                         各接口和读取阶段的耗时汇总
+  GET    /templates                       已加载的模板
+  POST   /templates                       加载3dm文件 body: {"path": ..., "reload": false}
+  DELETE /templates/{id}                  卸载模板
+  GET    /templates/{id}/objects/{key}    按index(纯数字)或者名字查找物件
+  GET    /templates/{id}/objects          筛选物件 ?name=&layer=&min_height=&max_height=&min_floor=&max_floor=&within=&limit=
+  GET    /templates/{id}/spatial          空间查询 ?bbox=x0,y0,x1,y1 或者 ?wkt=&predicate=intersects|dwithin|nearest&distance=&k=
+                                          &geometry=0 不返回几何, &limit=, &scale=每像素的图纸长度(返回简化几何)
+  GET    /templates/{id}/export           导出整个模板为GeoJSON(分块传输) ?geometry_format=coordinates|wkb
+用法: python -m art_server.http_server [--host 127.0.0.1] [--port 8765] [--workers N] [--threads N] [--cache-dir DIR]
+                                       [--preload a.3dm b.3dm]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+from contextlib import nullcontext
+from typing import *
+from urllib.parse import urlsplit, parse_qs, unquote
+from art_datastructure.metrics import MetricsCollector
+from art_server.template_service import TemplateService, TemplateNotFound, DEFAULT_LIMIT
+
+try:  # 安装了orjson时用它编码/解码，快很多
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20
+EXPORT_READ_BYTES = 1 << 16
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            return _loads(self.body)
+        except ValueError:
+            raise HttpError(400, "请求体不是合法的json")
+
+    # 查询参数，按convert转换类型，转换失败返回400
+    def param(self, name: str, convert: Callable = str, default=None):
+        value = self.query.get(name)
+        if value is None or value == '':
+            return default
+        try:
+            return convert(value)
+        except ValueError:
+            raise HttpError(400, "参数{}的值{}不合法".format(name, value))
+
+
+def _flag(value: str) -> bool:
+    return value.lower() not in ('0', 'false', 'no')
+
+
+class ArtHttpServer:
+    def __init__(self, service: TemplateService, host: str = '127.0.0.1', port: int = 8765):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.metrics = service.metrics
+        self._server = None
+        # (方法, 路径正则, 处理函数, 统计名)
+        self._routes = [
+            ('GET', re.compile(r'^/health$'), self.handle_health, 'health'),
+            ('GET', re.compile(r'^/metrics$'), self.handle_metrics, 'metrics'),
+            ('GET', re.compile(r'^/templates$'), self.handle_list, 'list'),
+            ('POST', re.compile(r'^/templates$'), self.handle_load, 'load'),
+            ('DELETE', re.compile(r'^/templates/(?P<template_id>[^/]+)$'), self.handle_unload, 'unload'),
+            ('GET', re.compile(r'^/templates/(?P<template_id>[^/]+)/objects/(?P<key>[^/]+)$'), self.handle_find,
+             'find'),
+            ('GET', re.compile(r'^/templates/(?P<template_id>[^/]+)/objects$'), self.handle_filter, 'filter'),
+            ('GET', re.compile(r'^/templates/(?P<template_id>[^/]+)/spatial$'), self.handle_spatial, 'spatial'),
+            ('GET', re.compile(r'^/templates/(?P<template_id>[^/]+)/export$'), self.handle_export, 'export'),
+        ]
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # port=0时取实际分配的端口
+        logger.info('art_service listening on http://%s:%s', self.host, self.port)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:  # close()之后serve_forever被取消
+                pass
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # 一个连接上按顺序处理请求(keep-alive)，直到对方关闭或者请求Connection: close
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._write_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                await self._dispatch(request, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise HttpError(400, "请求行不合法")
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Length不合法")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "请求体超过{}字节".format(MAX_BODY_BYTES))
+        body = await reader.readexactly(length) if length > 0 else b''
+        return Request(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool):
+        handler, arguments, name = None, None, 'not_found'
+        path_matched = False
+        for method, pattern, route_handler, route_name in self._routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            path_matched = True
+            if method == request.method:
+                handler, arguments, name = route_handler, {key: unquote(value) for key, value in
+                                                           match.groupdict().items()}, route_name
+                break
+        stage = self.metrics.stage('http_' + name) if self.metrics is not None else nullcontext()
+        with stage:
+            try:
+                if handler is None:
+                    raise HttpError(405 if path_matched else 404, "{} {} 不存在".format(request.method, request.path))
+                await handler(request, writer, keep_alive, **arguments)
+            except HttpError as e:
+                await self._write_json(writer, e.status, {'error': str(e)}, keep_alive)
+            except (TemplateNotFound, FileNotFoundError) as e:
+                await self._write_json(writer, 404, {'error': str(e)}, keep_alive)
+            except ValueError as e:
+                await self._write_json(writer, 400, {'error': str(e)}, keep_alive)
+            except ConnectionError:
+                raise
+            except Exception as e:
+                logger.exception('处理请求%s %s出错', request.method, request.path)
+                await self._write_json(writer, 500, {'error': f'{type(e).__name__}: {e}'}, keep_alive)
+
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str], keep_alive: bool) -> bytes:
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        lines.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _write_json(self, writer: asyncio.StreamWriter, status: int, data, keep_alive: bool):
+        body = _dumps(data)
+        writer.write(self._head(status, {'Content-Type': 'application/json; charset=utf-8',
+                                         'Content-Length': str(len(body))}, keep_alive) + body)
+        await writer.drain()
+
+    # 接口
+
+    async def handle_health(self, request: Request, writer, keep_alive: bool):
+        await self._write_json(writer, 200, dict(status='ok', **self.service.status()), keep_alive)
+
+    async def handle_metrics(self, request: Request, writer, keep_alive: bool):
+        summary = self.metrics.summary() if self.metrics is not None else {}
+        await self._write_json(writer, 200, summary, keep_alive)
+
+    async def handle_list(self, request: Request, writer, keep_alive: bool):
+        await self._write_json(writer, 200, {'templates': self.service.list_templates()}, keep_alive)
+
+    async def handle_load(self, request: Request, writer, keep_alive: bool):
+        body = request.json()
+        file_path = body.get('path') or request.param('path')
+        if not file_path:
+            raise HttpError(400, "缺少3dm文件路径path")
+        reload = bool(body.get('reload')) or request.param('reload', _flag, False)
+        loaded = await self.service.load(file_path, reload=reload)
+        await self._write_json(writer, 200, loaded.info(), keep_alive)
+
+    async def handle_unload(self, request: Request, writer, keep_alive: bool, template_id: str):
+        self.service.unload(template_id)
+        await self._write_json(writer, 200, {'id': template_id, 'unloaded': True}, keep_alive)
+
+    async def handle_find(self, request: Request, writer, keep_alive: bool, template_id: str, key: str):
+        template = self.service.get(template_id).template
+        key = int(key) if re.fullmatch(r'-?[0-9]+', key) else key
+        objects = await self.service.run_in_thread(self.service.find_objects, template, key)
+        if not objects:
+            raise HttpError(404, "没有找到物件{}".format(key))
+        await self._write_json(writer, 200, {'objects': objects}, keep_alive)
+
+    async def handle_filter(self, request: Request, writer, keep_alive: bool, template_id: str):
+        template = self.service.get(template_id).template
+        result = await self.service.run_in_thread(lambda: self.service.filter_objects(
+            template, name=request.param('name'), layer=request.param('layer'),
+            min_height=request.param('min_height', float), max_height=request.param('max_height', float),
+            min_floor=request.param('min_floor', int), max_floor=request.param('max_floor', int),
+            within=request.param('within', int), limit=request.param('limit', int, DEFAULT_LIMIT)))
+        await self._write_json(writer, 200, result, keep_alive)
+
+    async def handle_spatial(self, request: Request, writer, keep_alive: bool, template_id: str):
+        template = self.service.get(template_id).template
+        bbox = request.param('bbox', lambda value: [float(each) for each in value.split(',')])
+        predicate = request.param('predicate', default='bbox' if bbox is not None else 'intersects')
+        result = await self.service.run_in_thread(lambda: self.service.spatial_query(
+            template, predicate, bbox=bbox, wkt=request.param('wkt'), distance=request.param('distance', float, 0.0),
+            k=request.param('k', int, 1), with_geometry=request.param('geometry', _flag, True),
+            limit=request.param('limit', int, DEFAULT_LIMIT), scale=request.param('scale', float)))
+        await self._write_json(writer, 200, result, keep_alive)
+
+    # 先在线程里导出到临时文件，再分块传输，内存只和导出的批大小有关
+    async def handle_export(self, request: Request, writer, keep_alive: bool, template_id: str):
+        template = self.service.get(template_id).template
+        geometry_format = request.param('geometry_format', default='coordinates')
+        if geometry_format not in ('coordinates', 'wkb'):
+            raise HttpError(400, "geometry_format只能是coordinates或者wkb")
+        path = await self.service.run_in_thread(self.service.export_to_file, template, geometry_format)
+        try:
+            writer.write(self._head(200, {'Content-Type': 'application/geo+json; charset=utf-8',
+                                          'Transfer-Encoding': 'chunked'}, keep_alive))
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = await self.service.run_in_thread(f.read, EXPORT_READ_BYTES)
+                    if not chunk:
+                        break
+                    writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                    await writer.drain()
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        finally:
+            os.remove(path)
+
+
+async def serve(host: str, port: int, service: TemplateService, preload: List[str] = ()):
+    server = ArtHttpServer(service, host, port)
+    await server.start()
+    # SIGTERM/SIGINT时停止监听并正常退出(父进程可能把SIGTERM设成了忽略，这里显式注册)
+    loop = asyncio.get_running_loop()
+    for each in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(each, server._server.close)
+        except (NotImplementedError, RuntimeError):  # Windows不支持
+            pass
+    if preload:
+        results = await asyncio.gather(*(service.load(each) for each in preload), return_exceptions=True)
+        for file_path, result in zip(preload, results):
+            if isinstance(result, Exception):
+                logger.error('预加载%s失败: %s', file_path, result)
+            else:
+                logger.info('预加载%s -> %s', file_path, result.template_id)
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='art_service本地HTTP/JSON服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认为cpu核数')
+    parser.add_argument('--threads', type=int, default=4, help='组装和查询用的线程数')
+    parser.add_argument('--cache-dir', default=None, help='解析缓存文件夹')
+    parser.add_argument('--columnar', action='store_true', help='用列式存储组装DataTemplate')
+    parser.add_argument('--preload', nargs='*', default=[], help='启动时加载的3dm文件')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    service = TemplateService(max_workers=args.workers, query_threads=args.threads, cache_dir=args.cache_dir,
+                              columnar=args.columnar, metrics=MetricsCollector(keep_records=False))
+    try:
+        asyncio.run(serve(args.host, args.port, service, args.preload))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+@ART 常驻内存的DataTemplate服务
+3dm解析(rhino3dm+shapely转换)放进进程池，组装DataTemplate和查询放进线程池，事件循环本身不做重计算；
+同一个文件的并发加载共享一次解析，文件修改(mtime变化)之后下次加载重新解析。
+服务只读: 加载完成时预先建好树的数组、空间索引、属性索引和几何的各级简化，之后的查询不修改DataTemplate
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import *
+import shapely
+from shapely.geometry import mapping
+from art_3dm_reader.batch_reader import _parse_in_worker
+from art_3dm_reader.data_to_json.data_json_exchange import export_template_json
+from art_3dm_reader.parse_result import unpack_parse_result
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+from art_datastructure.data_structure import DataObject, DataTemplate
+from art_datastructure.metrics import MetricsCollector
+
+# 查询结果默认最多返回的条数
+DEFAULT_LIMIT = 1000
+SPATIAL_PREDICATES = ('bbox', 'intersects', 'dwithin', 'nearest')
+
+
+class TemplateNotFound(Exception):
+    pass
+
+
+@dataclass
+class LoadedTemplate:
+    """
+    一个已经加载的文件
+    """
+    template_id: str = field(default="")
+    file_path: str = field(default="")
+    template: DataTemplate = field(default=None)
+    mtime_ns: int = field(default=0)  # 解析时文件的mtime，用来判断文件是否修改过
+    parse_seconds: float = field(default=0.0)  # 子进程中解析+转换的时间
+    build_seconds: float = field(default=0.0)  # 组装DataTemplate+预建索引的时间
+    loaded_at: float = field(default=0.0)
+
+    def info(self) -> dict:
+        return {'id': self.template_id, 'path': self.file_path, 'objects': len(self.template.data_objects),
+                'elements': len(self.template._element_index), 'parse_s': self.parse_seconds,
+                'build_s': self.build_seconds, 'loaded_at': self.loaded_at}
+
+
+# 文件路径 -> 模板id
+def template_id_of(file_path: str) -> str:
+    return hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:12]
+
+
+# 物件的json记录，bounds/element_count是整个子树的
+def object_record(template: DataTemplate, one_object: DataObject) -> dict:
+    tree = template.tree
+    parent, children = None, []
+    if tree is not None and tree.contains(one_object.index):
+        parent = tree.parent(one_object.index).identifier
+        children = list(tree.is_branch(one_object.index))
+    return {'index': one_object.index, 'name': one_object.name, 'parent': parent, 'children': children,
+            'floor': one_object.floor, 'height': one_object.height, 'annotations': one_object.annotations,
+            'attributes': one_object.attributes, 'zorder': one_object.zorder,
+            'element_count': one_object.element_count(), 'bounds': one_object.bounds()}
+
+
+# 元素的json记录，geometry为GeoJSON格式
+# geometry不为None时用它代替元素的几何(简化后的几何)
+def element_record(element, owner: DataObject, with_geometry: bool = True, geometry=None) -> dict:
+    record = {'id': str(element.id), 'layer': element.type, 'object': owner.index}
+    if with_geometry:
+        geometry = element.geometry if geometry is None else geometry
+        record['geometry'] = mapping(geometry) if geometry is not None else None
+    return record
+
+
+# 子进程解析之后在线程里组装DataTemplate，并预建查询要用的索引
+def _build_template(file_path: str, packed: dict, columnar: bool, metrics: MetricsCollector) -> DataTemplate:
+    template = Read3dmFile(file_path, columnar=columnar, metrics=metrics, style_json=False).build_data_template(
+        unpack_parse_result(packed))
+    template.tree.order  # 先序数组在第一次访问时才建
+    len(template.spatial_index)  # STRtree在第一次访问时才建
+    len(template.attribute_index)  # 属性索引在第一次访问时才建
+    template.geometry_pyramid.build()  # 各级简化在第一次按比例查询时才算
+    return template
+
+
+class TemplateService:
+    def __init__(self, max_workers: int = None, query_threads: int = 4, cache_dir: str = None,
+                 columnar: bool = False, metrics: MetricsCollector = None):
+        """
+        :param max_workers: 解析进程数，默认为cpu核数
+        :param query_threads: 组装和查询用的线程数
+        :param cache_dir: 解析缓存文件夹，None时不缓存
+        :param columnar: 是否用列式存储组装DataTemplate
+        :param metrics: 请求和读取阶段的统计，None时不统计
+        """
+        self.cache_dir = cache_dir
+        self.columnar = columnar
+        self.metrics = metrics
+        self._process_pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+        self._thread_pool = ThreadPoolExecutor(max_workers=max(query_threads, 1))
+        self._templates = {}  # 模板id -> LoadedTemplate
+        self._loading = {}  # 模板id -> 正在进行的加载任务
+
+    # 在线程池中执行一个同步函数
+    async def run_in_thread(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._thread_pool, func, *args)
+
+    async def load(self, file_path: str, reload: bool = False) -> LoadedTemplate:
+        """
+        加载一个3dm文件，已经加载且文件没有修改时直接返回；同一个文件的并发加载共享同一次解析
+        :param file_path: 3dm文件路径
+        :param reload: 是否强制重新解析
+        :return: LoadedTemplate
+        """
+        file_path = os.path.abspath(file_path)
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError("找不到3dm文件{}".format(file_path))
+        template_id = template_id_of(file_path)
+        loaded = self._templates.get(template_id)
+        if loaded is not None and not reload and loaded.mtime_ns == os.stat(file_path).st_mtime_ns:
+            return loaded
+        task = self._loading.get(template_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(template_id, file_path))
+            self._loading[template_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(template_id, None))
+        # shield: 某个请求被取消(比如客户端断开)时不取消共享的解析
+        return await asyncio.shield(task)
+
+    async def _load(self, template_id: str, file_path: str) -> LoadedTemplate:
+        loop = asyncio.get_running_loop()
+        mtime_ns = os.stat(file_path).st_mtime_ns
+        packed, parse_seconds = await loop.run_in_executor(self._process_pool, _parse_in_worker, file_path,
+                                                           self.cache_dir)
+        start = time.perf_counter()
+        template = await self.run_in_thread(_build_template, file_path, packed, self.columnar, self.metrics)
+        loaded = LoadedTemplate(template_id=template_id, file_path=file_path, template=template, mtime_ns=mtime_ns,
+                                parse_seconds=parse_seconds, build_seconds=time.perf_counter() - start,
+                                loaded_at=time.time())
+        self._templates[template_id] = loaded
+        return loaded
+
+    def get(self, template_id: str) -> LoadedTemplate:
+        loaded = self._templates.get(template_id)
+        if loaded is None:
+            raise TemplateNotFound("没有加载id为{}的模板".format(template_id))
+        return loaded
+
+    def unload(self, template_id: str):
+        if self._templates.pop(template_id, None) is None:
+            raise TemplateNotFound("没有加载id为{}的模板".format(template_id))
+
+    def list_templates(self) -> List[dict]:
+        return [each.info() for each in self._templates.values()]
+
+    def status(self) -> dict:
+        return {'templates': len(self._templates), 'loading': len(self._loading)}
+
+    def close(self):
+        self._process_pool.shutdown(wait=True, cancel_futures=True)
+        self._thread_pool.shutdown(wait=True, cancel_futures=True)
+
+    # 以下查询都是同步函数，由调用方放进线程池执行
+
+    @staticmethod
+    def find_objects(template: DataTemplate, key: Union[int, str]) -> List[dict]:
+        """
+        按index或者名字查找物件
+        :param key: int时按index查找，str时返回所有同名物件
+        :return: 物件记录列表
+        """
+        if isinstance(key, int):
+            found = template.find_object(key)
+            objects = [found] if found is not None else []
+        else:
+            objects = template.find_objects_by_name(key)
+        return [object_record(template, each) for each in objects]
+
+    @staticmethod
+    def filter_objects(template: DataTemplate, name: str = None, layer: str = None, min_height: float = None,
+                       max_height: float = None, min_floor: int = None, max_floor: int = None, within: int = None,
+                       limit: int = DEFAULT_LIMIT) -> dict:
+        """
+        按条件筛选物件，条件之间是"且"的关系，走DataTemplate的属性索引
+        :param name: 名字，包含*?[时按通配符匹配
+        :param layer: 物件自己的元素中有该图层的
+        :param min_height/max_height/min_floor/max_floor: 闭区间
+        :param within: 只在该物件的子树(包含自己)中筛选
+        :param limit: 最多返回的条数
+        :return: {'total': 满足条件的数量, 'objects': 物件记录列表}
+        """
+        height = None if min_height is None and max_height is None else (min_height, max_height)
+        floor = None if min_floor is None and max_floor is None else (min_floor, max_floor)
+        matched = template.query_objects(height=height, floor=floor, name=name, layer=layer, within=within)
+        return {'total': len(matched), 'objects': [object_record(template, each) for each in matched[:limit]]}
+
+    @staticmethod
+    def spatial_query(template: DataTemplate, predicate: str, bbox: Sequence[float] = None, wkt: str = None,
+                      distance: float = 0.0, k: int = 1, with_geometry: bool = True,
+                      limit: int = DEFAULT_LIMIT, scale: float = None) -> dict:
+        """
+        空间查询
+        :param predicate: 'bbox'(外包框相交)/'intersects'/'dwithin'/'nearest'
+        :param bbox: predicate为bbox时的(min_x, min_y, max_x, max_y)
+        :param wkt: 其他predicate的查询几何
+        :param distance: dwithin的距离
+        :param k: nearest的数量
+        :param with_geometry: 结果是否带几何
+        :param limit: 最多返回的条数
+        :param scale: 视口每个像素对应的图纸长度，给出时返回该比例下的简化几何
+        :return: {'total': 命中数量, 'elements': 元素记录列表}，给出scale时还有'lod': 使用的简化级别
+        """
+        if predicate not in SPATIAL_PREDICATES:
+            raise ValueError("不支持的空间查询{}".format(predicate))
+        if predicate == 'bbox':
+            if bbox is None or len(bbox) != 4:
+                raise ValueError("bbox查询需要min_x,min_y,max_x,max_y")
+            hits = template.query_bbox(*bbox)
+        else:
+            if wkt is None:
+                raise ValueError("{}查询需要wkt几何".format(predicate))
+            geometry = shapely.from_wkt(wkt)
+            if predicate == 'intersects':
+                hits = template.query_intersects(geometry)
+            elif predicate == 'dwithin':
+                hits = template.query_within_distance(geometry, distance)
+            else:
+                hits = template.query_nearest(geometry, k)
+        if scale is None or not with_geometry:
+            return {'total': len(hits),
+                    'elements': [element_record(element, owner, with_geometry) for element, owner in hits[:limit]]}
+        level = template.geometry_pyramid.level_for_scale(scale)
+        simplified = template.geometry_pyramid.simplified(hits[:limit], level)
+        return {'total': len(hits), 'lod': level,
+                'elements': [element_record(element, owner, geometry=geometry)
+                             for geometry, element, owner in simplified]}
+
+    @staticmethod
+    def export_to_file(template: DataTemplate, geometry_format: str = 'coordinates') -> str:
+        """
+        把整个模板导出成GeoJSON临时文件，调用方负责删除
+        :return: 临时文件路径
+        """
+        handle, path = tempfile.mkstemp(suffix='.json', prefix='art_export_')
+        os.close(handle)
+        try:
+            export_template_json(template, path, geometry_format=geometry_format)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
@@ -0,0 +1,43 @@
+"""
+assemble_tree的回归测试: site_plan_example_1.3dm组装出的树要和原来treelib实现的结果完全一致，
+基准数据tests/data/site_plan_example_1_tree.json由改写之前的代码(treelib)生成
+"""
+import json
+import os
+import pytest
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT_DIR, 'tests', 'data', 'site_plan_example_1_tree.json')
+
+
+@pytest.fixture(scope='module')
+def baseline() -> dict:
+    with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def tree(baseline, tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('style'))  # style.json写到临时文件夹
+    try:
+        return Read3dmFile(os.path.join(ROOT_DIR, baseline['source'])).read_3dm_file().tree
+    finally:
+        os.chdir(cwd)
+
+
+def test_same_nodes(tree, baseline):
+    assert tree.root == baseline['root']
+    assert set(tree.nodes) == {baseline['root']} | {node['id'] for node in baseline['nodes']}
+
+
+def test_root_children_order(tree, baseline):
+    assert tree.is_branch(tree.root) == baseline['root_children']
+
+
+def test_parents_children_and_depth(tree, baseline):
+    for node in baseline['nodes']:
+        assert tree.parent(node['id']).identifier == node['parent'], node
+        assert [child.identifier for child in tree.children(node['id'])] == node['children'], node
+        assert tree.depth(node['id']) == node['depth'], node
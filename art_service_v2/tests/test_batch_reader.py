@@ -0,0 +1,54 @@
+import os
+from art_3dm_reader.batch_reader import read_3dm_files
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PATH = os.path.join(ROOT_DIR, 'test_files', '3dm_files', 'site_plan_example_1.3dm')
+
+
+def test_batch_read_without_style_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = list(read_3dm_files([SAMPLE_PATH], max_workers=1))
+    assert results[0].error is None and results[0].template.data_objects
+    # 批量读取默认不生成style.json
+    assert not list(tmp_path.glob('*.json'))
+
+
+def test_batch_read_style_json_opt_in(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = list(read_3dm_files([SAMPLE_PATH], max_workers=1, style_json=True))
+    assert results[0].error is None
+    assert (tmp_path / 'site_plan_example_1.json').exists()
+
+
+def test_batch_read_survives_worker_crash(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    crash_path = str(tmp_path / 'crash.3dm')
+    parse = Read3dmFile.parse_3dm_file
+
+    # 模拟rhino3dm在损坏的文件上直接让进程退出(子进程是fork出来的，继承这里的替换)
+    def parse_or_crash(self):
+        if self.file_path == crash_path:
+            os._exit(1)
+        return parse(self)
+
+    monkeypatch.setattr(Read3dmFile, 'parse_3dm_file', parse_or_crash)
+    file_paths = [SAMPLE_PATH, crash_path, SAMPLE_PATH, SAMPLE_PATH]
+    results = list(read_3dm_files(file_paths, max_workers=2, max_in_flight=3))
+    assert sorted(result.file_path for result in results) == sorted(file_paths)
+    for result in results:
+        if result.file_path == crash_path:
+            assert result.template is None and 'BrokenProcessPool' in result.error
+        else:
+            assert result.error is None and result.template is not None
+
+
+def test_batch_read_uses_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    first = list(read_3dm_files([SAMPLE_PATH], max_workers=1, cache_dir=cache_dir))
+    assert first[0].error is None
+    assert os.listdir(cache_dir)
+    second = list(read_3dm_files([SAMPLE_PATH], max_workers=1, cache_dir=cache_dir))
+    assert second[0].error is None
+    assert len(second[0].template.data_objects) == len(first[0].template.data_objects)
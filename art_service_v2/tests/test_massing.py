@@ -0,0 +1,29 @@
+from shapely.geometry import box
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+
+
+# 物件1下面挂着物件0，物件0有一个10×10的轮廓
+def build_template() -> DataTemplate:
+    element = DataElement(geometry=box(0, 0, 10, 10), type='building', group_list=(0, 1))
+    objects = {0: DataObject(elements=[element], index=0, floor=3, height=9.0), 1: DataObject(index=1)}
+    return DataTemplate().assemble_tree([element], objects)
+
+
+def test_object_massing_on_cold_template():
+    template = build_template()
+    metrics = template.object_massing(1)
+    assert metrics.footprint_area == 100
+    assert metrics.gross_floor_area == 300
+    assert metrics.volume == 900
+
+
+def test_object_metrics_on_cold_engine():
+    assert build_template().massing_engine.object_metrics(0).gross_floor_area == 300
+
+
+def test_object_massing_after_update():
+    template = build_template()
+    assert template.object_massing(1).gross_floor_area == 300
+    template.update_object(0, floor=5)
+    assert template.object_massing(1).gross_floor_area == 500
+    assert template.massing_engine.object_metrics(0).gross_floor_area == 500
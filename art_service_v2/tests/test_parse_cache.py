@@ -0,0 +1,44 @@
+import os
+import pickle
+import pytest
+from art_3dm_reader.parse_cache import CACHE_SUFFIX, ParseCache
+from art_3dm_reader.rhino_file_reader import Read3dmFile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PATH = os.path.join(ROOT_DIR, 'test_files', '3dm_files', 'site_plan_example_1.3dm')
+
+
+class Missing:
+    pass
+
+
+# 各种读不回来的缓存文件: 写了一半、其他版本写的(类已经不存在)、不是pickle
+def broken_entries() -> dict:
+    whole = pickle.dumps({'objects': list(range(1000))}, protocol=pickle.HIGHEST_PROTOCOL)
+    stale = pickle.dumps(Missing(), protocol=pickle.HIGHEST_PROTOCOL).replace(b'Missing', b'Vanish')
+    return {'truncated': whole[:len(whole) // 2], 'stale_class': stale,
+            'stale_module': stale.replace(b'test_parse_cache', b'gone_module_xyz'), 'garbage': b'not a pickle',
+            'empty': b''}
+
+
+@pytest.mark.parametrize('name', list(broken_entries()))
+def test_broken_entry_is_a_miss(tmp_path, name):
+    cache = ParseCache(str(tmp_path))
+    path = tmp_path / ('key' + CACHE_SUFFIX)
+    path.write_bytes(broken_entries()[name])
+    assert cache.get('key') is None
+    assert not path.exists()
+
+
+def test_parse_with_broken_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    expected = Read3dmFile(SAMPLE_PATH, style_json=False).parse_3dm_file()
+    Read3dmFile(SAMPLE_PATH, cache=cache, style_json=False).parse_3dm_file()
+    [name] = os.listdir(cache.cache_dir)
+    with open(os.path.join(cache.cache_dir, name), 'r+b') as f:
+        f.truncate(os.path.getsize(f.name) // 2)
+    parsed = Read3dmFile(SAMPLE_PATH, cache=cache, style_json=False).parse_3dm_file()
+    assert {key: len(value) for key, value in parsed.items()} == {key: len(value) for key, value in expected.items()}
+    # 损坏的文件被删掉，重新解析之后写入了新的缓存
+    assert cache.get(name[:-len(CACHE_SUFFIX)]) is not None
@@ -0,0 +1,67 @@
+import struct
+import zlib
+import numpy as np
+import pytest
+from art_render.raster import (PNG_SIGNATURE, blend, encode_png, fill_mask, new_canvas, parse_color, stroke_mask,
+                               to_rgba)
+
+
+# 环的坐标 -> (起点, 终点)
+def ring_edges(*rings) -> tuple:
+    starts, ends = [], []
+    for ring in rings:
+        points = np.array(ring + [ring[0]], dtype=float)
+        starts.append(points[:-1])
+        ends.append(points[1:])
+    return np.concatenate(starts), np.concatenate(ends)
+
+
+def test_parse_color():
+    assert parse_color('#f00') == (1.0, 0.0, 0.0, 1.0)
+    assert parse_color('#00ff0080') == (0.0, 1.0, 0.0, 128 / 255)
+    assert parse_color('0,0,255') == (0.0, 0.0, 1.0, 1.0)
+    assert parse_color([255, 255, 255, 0]) == (1.0, 1.0, 1.0, 0.0)
+    assert parse_color('') is None and parse_color(None) is None
+    with pytest.raises(Exception):
+        parse_color('#12345')
+
+
+def test_fill_mask_with_hole():
+    start, end = ring_edges([(2, 2), (8, 2), (8, 8), (2, 8)], [(4, 4), (6, 4), (6, 6), (4, 6)])
+    mask = fill_mask(start, end, np.zeros(len(start), dtype=np.int64), 10, 10)
+    expected = np.zeros((10, 10), dtype=bool)
+    expected[2:8, 2:8] = True
+    expected[4:6, 4:6] = False  # 同一个多边形的洞按奇偶规则不填
+    assert np.array_equal(mask, expected)
+    # 两个多边形重叠的部分各自填充，不会互相抵消
+    start, end = ring_edges([(0, 0), (6, 0), (6, 6), (0, 6)], [(3, 3), (9, 3), (9, 9), (3, 9)])
+    mask = fill_mask(start, end, np.repeat([0, 1], 4), 10, 10)
+    assert mask[4, 4] and mask[1, 1] and mask[8, 8] and not mask[1, 8]
+
+
+def test_stroke_mask():
+    start, end = np.array([[0.5, 5.5], [-100.0, 2.5]]), np.array([[9.5, 5.5], [100.0, 2.5]])
+    mask = stroke_mask(start, end, 10, 10)
+    assert mask[5].all() and mask[2].all()  # 画布外的部分被裁掉，画布内的仍然连续
+    assert mask.sum() == 20
+    assert stroke_mask(start[:1], end[:1], 10, 10, line_width=3)[4:7].all()
+
+
+def test_blend_and_png():
+    canvas = new_canvas(4, 2)
+    everything = np.ones((2, 4), dtype=bool)
+    blend(canvas, everything, (1.0, 0.0, 0.0, 1.0))
+    half = np.zeros((2, 4), dtype=bool)
+    half[:, 2:] = True
+    blend(canvas, half, (0.0, 0.0, 1.0, 0.5))
+    rgba = to_rgba(canvas)
+    assert rgba[0, 0].tolist() == [255, 0, 0, 255]
+    assert rgba[0, 3].tolist() == [128, 0, 128, 255]
+    assert to_rgba(new_canvas(1, 1))[0, 0].tolist() == [0, 0, 0, 0]
+    data = encode_png(rgba)
+    assert data.startswith(PNG_SIGNATURE)
+    width, height = struct.unpack('>II', data[16:24])
+    assert (width, height) == (4, 2)
+    idat_length, = struct.unpack('>I', data[33:37])
+    raw = np.frombuffer(zlib.decompress(data[41:41 + idat_length]), dtype=np.uint8).reshape(2, 17)
+    assert np.array_equal(raw[:, 1:].reshape(2, 4, 4), rgba)
@@ -0,0 +1,43 @@
+from shapely.geometry import box
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+
+
+# 一个10×10、高10的物件
+def build_template() -> DataTemplate:
+    element = DataElement(geometry=box(0, 0, 10, 10), type='building', group_list=(0,))
+    objects = {0: DataObject(elements=[element], index=0, floor=3, height=10.0)}
+    return DataTemplate().assemble_tree([element], objects)
+
+
+def test_shadow_follows_height_update():
+    template = build_template()
+    assert abs(template.compute_shadows(180, 45)[0].area - 200) < 1e-6
+    template.update_object(0, height=20.0)
+    assert abs(template.compute_shadows(180, 45)[0].area - 300) < 1e-6
+    assert abs(template.data_objects[0].elements[0].shadow.area - 300) < 1e-6
+
+
+def test_shadow_cleared_after_sunset():
+    template = build_template()
+    element = template.data_objects[0].elements[0]
+    template.compute_shadows(180, 45)
+    assert element.has_shadow and element.shadow is not None
+    assert template.compute_shadows(180, 0.0) == {}
+    assert not element.has_shadow and element.shadow is None
+
+
+def test_shadow_cleared_when_height_drops_to_zero():
+    template = build_template()
+    element = template.data_objects[0].elements[0]
+    template.compute_shadows(180, 45)
+    template.update_object(0, height=0.0)
+    assert template.compute_shadows(180, 45) == {}
+    assert not element.has_shadow and element.shadow is None
+
+
+def test_sun_path_keeps_written_shadow():
+    template = build_template()
+    element = template.data_objects[0].elements[0]
+    template.compute_shadows(180, 45)
+    template.shadow_engine.compute(180, 0.0, write_back=False)
+    assert element.has_shadow
@@ -0,0 +1,104 @@
+import numpy as np
+import shapely
+from shapely.geometry import Point, box
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+from art_datastructure.spatial_index import REBUILD_MIN_PATCH, SpatialIndex
+
+
+# 在element_index中放count个1×1的方块，排成一行，间距2
+def make_index(count: int):
+    owner = DataObject(index=0)
+    element_index = {}
+    for i in range(count):
+        element = DataElement(geometry=box(i * 2, 0, i * 2 + 1, 1), type='layer')
+        element_index[element.id] = (element, owner)
+    return SpatialIndex(element_index), element_index, owner
+
+
+def hit_ids(hits) -> set:
+    return {element.id for element, _ in hits}
+
+
+def test_empty_template():
+    template = DataTemplate().assemble_tree([], {0: DataObject(index=0)})
+    assert template.query_bbox(0, 0, 1, 1) == []
+    assert template.query_intersects(box(0, 0, 1, 1)) == []
+    assert template.query_within_distance(Point(0, 0), 10) == []
+    assert template.query_nearest(Point(0, 0), 3) == []
+    assert len(template.spatial_index) == 0
+
+
+def test_add_and_remove_through_pending_patch():
+    index, element_index, owner = make_index(10)
+    assert len(index.query_bbox(0, 0, 100, 1)) == 10
+    added = DataElement(geometry=box(100, 100, 101, 101), type='layer')
+    element_index[added.id] = (added, owner)
+    index.add(added)
+    assert hit_ids(index.query_bbox(99, 99, 102, 102)) == {added.id}
+    assert added.id in index._pending
+    removed = next(iter(element_index))
+    del element_index[removed]
+    index.remove(removed)
+    assert removed not in hit_ids(index.query_bbox(0, 0, 100, 1))
+    assert len(index) == 10
+    # 替换: 同一个id再次加入，旧位置不再命中
+    moved = next(iter(element_index))
+    element = element_index[moved][0]
+    element.geometry = box(200, 0, 201, 1)
+    index.add(element)
+    assert moved not in hit_ids(index.query_bbox(0, 0, 100, 1))
+    assert hit_ids(index.query_bbox(199, 0, 202, 1)) == {moved}
+
+
+def test_rebuild_threshold():
+    index, element_index, owner = make_index(100)
+    len(index)
+    for i in range(REBUILD_MIN_PATCH):
+        element = DataElement(geometry=box(i * 2, 10, i * 2 + 1, 11), type='layer')
+        element_index[element.id] = (element, owner)
+        index.add(element)
+    assert len(index) == 100 + REBUILD_MIN_PATCH
+    assert len(index._pending) == REBUILD_MIN_PATCH  # 没超过阈值，还在补丁里
+    element = DataElement(geometry=box(0, 20, 1, 21), type='layer')
+    element_index[element.id] = (element, owner)
+    index.add(element)
+    assert len(index) == 101 + REBUILD_MIN_PATCH
+    assert not index._pending and len(index._elements) == 101 + REBUILD_MIN_PATCH  # 超过阈值后整体重建
+    assert hit_ids(index.query_bbox(0, 20, 1, 21)) == {element.id}
+
+
+def test_query_nearest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    owner = DataObject(index=0)
+    element_index = {}
+    for x, y in rng.uniform(0, 1000, size=(300, 2)):
+        element = DataElement(geometry=Point(x, y).buffer(rng.uniform(0.5, 5)), type='layer')
+        element_index[element.id] = (element, owner)
+    index = SpatialIndex(element_index)
+    elements = [element for element, _ in element_index.values()]
+    geometries = np.array([element.geometry for element in elements], dtype=object)
+    for x, y in rng.uniform(-200, 1200, size=(20, 2)):
+        query = Point(x, y)
+        distances = shapely.distance(geometries, query)
+        expected = [elements[i].id for i in np.argsort(distances, kind='stable')[:5]]
+        result = index.query_nearest(query, 5)
+        assert [element.id for element, _ in result] == expected
+
+
+def test_query_bboxes_matches_query_bbox():
+    index, element_index, owner = make_index(50)
+    added = DataElement(geometry=box(3, 0, 4, 1), type='layer')
+    element_index[added.id] = (added, owner)
+    index.add(added)
+    removed = next(iter(element_index))
+    del element_index[removed]
+    index.remove(removed)
+    bounds = np.array([[0, 0, 5, 1], [10.5, 0.5, 20, 2], [-10, -10, -5, -5], [0, 0, 200, 1]])
+    box_indexes, hits = index.query_bboxes(bounds)
+    assert len(box_indexes) == len(hits)
+    for i, each in enumerate(bounds):
+        assert {element.id for (element, _), hit in zip(hits, box_indexes) if hit == i} == \
+            hit_ids(index.query_bbox(*each))
+    empty = SpatialIndex({})
+    box_indexes, hits = empty.query_bboxes(bounds)
+    assert len(box_indexes) == 0 and hits == []
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import rhino3dm
+import pytest
+from art_benchmark.bench_server_load import HttpClient
+from art_server.http_server import ArtHttpServer
+from art_server.template_service import TemplateService
+
+
+# 没有可以转换成shapely几何的物件: 空文件，或者只有一个TextDot
+def create_3dm(path: str, with_text_dot: bool) -> str:
+    model = rhino3dm.File3dm()
+    if with_text_dot:
+        model.Objects.AddTextDot('A', rhino3dm.Point3d(1, 2, 0))
+    model.Write(path, 7)
+    return path
+
+
+@pytest.mark.parametrize('with_text_dot', [False, True])
+def test_load_file_without_geometry(tmp_path, monkeypatch, with_text_dot):
+    monkeypatch.chdir(tmp_path)
+    file_path = create_3dm(str(tmp_path / 'empty.3dm'), with_text_dot)
+
+    async def run():
+        service = TemplateService(max_workers=1, query_threads=1)
+        server = ArtHttpServer(service, '127.0.0.1', 0)
+        await server.start()
+        client = HttpClient('127.0.0.1', server.port)
+        try:
+            await client.connect()
+            status, body = await client.request('POST', '/templates', {'path': file_path})
+            assert status == 200, body
+            loaded = json.loads(body)
+            assert loaded['elements'] == 0
+            status, body = await client.request('GET', f'/templates/{loaded["id"]}/spatial?bbox=0,0,10,10')
+            assert status == 200, body
+            assert json.loads(body) == {'total': 0, 'elements': []}
+            status, body = await client.request('GET', f'/templates/{loaded["id"]}/spatial?wkt=POINT(1%202)'
+                                                       f'&predicate=nearest&k=3')
+            assert status == 200, body
+            assert json.loads(body)['total'] == 0
+        finally:
+            await client.close()
+            await server.stop()
+            service.close()
+
+    asyncio.run(run())
+    # 服务只读，加载时不在工作目录写style json
+    assert not list(tmp_path.glob('*.json'))
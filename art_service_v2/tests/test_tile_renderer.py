@@ -0,0 +1,138 @@
+import struct
+import zlib
+import numpy as np
+import shapely
+from shapely.geometry import LineString, box
+from art_datastructure.data_structure import DataElement, DataObject, DataTemplate
+from art_render.tile_renderer import TILES_PER_TASK, TileGrid, TileRenderer
+
+STYLES = {'site': {'fill_color': '#00ff00', 'zorder': 0},
+          'building': {'fill_color': '#ff0000', 'stroke_color': '#000000', 'zorder': 1},
+          'road': {'stroke_color': '#0000ff', 'stroke_width': 3, 'zorder': 2}}
+
+
+# 解码encode_png写出的PNG(8位RGBA，不做行过滤) -> height×width×4
+def decode_png(data: bytes) -> np.ndarray:
+    position, idat = 8, b''
+    while position < len(data):
+        length, = struct.unpack('>I', data[position:position + 4])
+        tag = data[position + 4:position + 8]
+        body = data[position + 8:position + 8 + length]
+        if tag == b'IHDR':
+            width, height = struct.unpack('>II', body[:8])
+        elif tag == b'IDAT':
+            idat += body
+        position += length + 12
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width * 4 + 1)
+    assert not raw[:, 0].any()
+    return raw[:, 1:].reshape(height, width, 4)
+
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# 3×4个街区，每个街区一块场地、一栋楼，第一排的楼中间穿过一条路；物件i的zorder是i % 3
+def build_template(count: int = 12) -> DataTemplate:
+    elements, objects = [], {}
+    for i in range(count):
+        x, y = (i % 4) * 30.0, (i // 4) * 30.0
+        block = [DataElement(geometry=box(x, y, x + 25, y + 25), type='site', group_list=(i,)),
+                 DataElement(geometry=box(x + 5, y + 5, x + 15, y + 20), type='building', group_list=(i,))]
+        objects[i] = DataObject(elements=block, index=i, zorder=i % 3)
+        elements.extend(block)
+    road = DataElement(geometry=LineString([(-5, 12.3), (125, 12.3)]), type='road', group_list=(count,))
+    objects[count] = DataObject(elements=[road], index=count)
+    return DataTemplate().assemble_tree(elements + [road], objects)
+
+
+def test_tile_range_and_bounds_round_trip():
+    grid = TileGrid.covering((-37.5, 12.25, 81.0, 60.0))
+    assert grid.min_x <= -37.5 and grid.min_y <= 12.25
+    assert grid.min_x + grid.size >= 81.0 and grid.min_y + grid.size >= 60.0
+    for zoom in range(4):
+        count = 2 ** zoom
+        span = grid.size / count
+        for x in range(count):
+            for y in range(count):
+                min_x, min_y, max_x, max_y = grid.tile_bounds(zoom, x, y)
+                assert np.isclose(max_x - min_x, span) and np.isclose(max_y - min_y, span)
+                inset = span * 1e-6
+                assert grid.tile_range(zoom, (min_x + inset, min_y + inset, max_x - inset, max_y - inset)) == \
+                    (x, y, x, y)
+        # 整个网格的范围覆盖全部瓦片，网格外的范围夹到边上
+        whole = (grid.min_x, grid.min_y, grid.min_x + grid.size - 1e-9, grid.min_y + grid.size - 1e-9)
+        assert grid.tile_range(zoom, whole) == (0, 0, count - 1, count - 1)
+        assert grid.tile_range(zoom, (grid.min_x - 100, grid.min_y - 100, grid.min_x - 50, grid.min_y - 50)) == \
+            (0, count - 1, 0, count - 1)
+
+
+def test_draw_order(tmp_path):
+    template = build_template()
+    renderer = TileRenderer(template, STYLES, cache_dir=str(tmp_path), max_workers=1)
+    prepared = renderer._prepare()
+    position = {element.id: i for i, (element, _) in enumerate(prepared['hits'])}
+    layer_zorder = {layer: style['zorder'] for layer, style in STYLES.items()}
+    drawn = sorted(prepared['hits'], key=lambda hit: prepared['rank'][position[hit[0].id]])
+    expected = sorted(prepared['hits'], key=lambda hit: (layer_zorder[hit[0].type], hit[1].zorder,
+                                                          position[hit[0].id]))
+    assert [element.id for element, _ in drawn] == [element.id for element, _ in expected]
+    assert [element.type for element, _ in drawn[:12]] == ['site'] * 12
+    assert [owner.zorder for _, owner in drawn[:12]] == sorted(owner.zorder for _, owner in drawn[:12])
+    # 每块瓦片的行号按绘制顺序排列
+    for job in renderer._plan_zoom(prepared, renderer.grid_for(prepared), 2):
+        assert np.all(np.diff(prepared['rank'][job[5]]) > 0)
+    # 后画的覆盖先画的: 楼压住场地，路压住楼
+    grid = TileGrid(min_x=0.0, min_y=0.0, size=32.0, tile_size=64)
+    result = TileRenderer(template, STYLES, cache_dir=str(tmp_path / 'one'), grid=grid, max_workers=1).render([0])
+    pixels = decode_png(read_bytes(result.tiles[(0, 0, 0)]))
+
+    def pixel(x: float, y: float) -> tuple:
+        return tuple(pixels[int((32.0 - y) * 2), int(x * 2)].tolist())
+
+    assert pixel(2.2, 2.2) == (0, 255, 0, 255)
+    assert pixel(10.2, 17.2) == (255, 0, 0, 255)
+    assert pixel(10.2, 12.3) == (0, 0, 255, 255)
+    assert pixel(20.2, 12.3) == (0, 0, 255, 255)
+
+
+def test_edit_changes_only_tiles_containing_element(tmp_path):
+    template = build_template()
+    renderer = TileRenderer(template, STYLES, cache_dir=str(tmp_path), max_workers=1)
+    zooms = range(5)
+    before = renderer.render(zooms)
+    element = next(element for element, _ in template._element_index.values() if element.type == 'building')
+    old_geometry = element.geometry
+    template.update_element(element.id, geometry=shapely.affinity.translate(old_geometry, 0.7, 0.3))
+    after = renderer.render(zooms)
+
+    assert before.tiles.keys() == after.tiles.keys()
+    changed = {tile for tile in before.tiles if before.tiles[tile] != after.tiles[tile]}
+    # 包含这个元素(修改前或修改后，按描边的外扩)的瓦片
+    grid = renderer.grid
+    expected = set()
+    for zoom in zooms:
+        pad = (3 / 2 + 2) * grid.units_per_pixel(zoom)
+        for geometry in (old_geometry, element.geometry):
+            min_x, min_y, max_x, max_y = geometry.bounds
+            x0, y0, x1, y1 = grid.tile_range(zoom, (min_x - pad, min_y - pad, max_x + pad, max_y + pad))
+            expected.update((zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    assert changed == expected & before.tiles.keys()
+    assert 0 < len(changed) < len(before.tiles)
+    assert after.rendered == len(changed) and after.cached == len(after.tiles) - len(changed)
+    # 改回去之后全部命中缓存
+    template.update_element(element.id, geometry=old_geometry)
+    back = renderer.render(zooms)
+    assert back.rendered == 0 and back.tiles == before.tiles
+
+
+def test_process_pool_renders_identical_tiles(tmp_path):
+    template = build_template()
+    zooms = range(5)
+    single = TileRenderer(template, STYLES, cache_dir=str(tmp_path / 'single'), max_workers=1).render(zooms)
+    pooled = TileRenderer(template, STYLES, cache_dir=str(tmp_path / 'pooled'), max_workers=2).render(zooms)
+    assert single.rendered > TILES_PER_TASK  # 多于一个任务时才用进程池
+    assert single.tiles.keys() == pooled.tiles.keys()
+    for tile, path in single.tiles.items():
+        assert read_bytes(path) == read_bytes(pooled.tiles[tile]), tile